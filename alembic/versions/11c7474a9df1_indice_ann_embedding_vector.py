@@ -0,0 +1,72 @@
+"""Indice ANN (HNSW ou IVFFlat) em startups.embedding_vector
+
+Revision ID: 11c7474a9df1
+Revises: 2c27dfefd871
+Create Date: 2026-10-17 10:12:41.503118
+
+"""
+import os
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '11c7474a9df1'
+down_revision: Union[str, Sequence[str], None] = '2c27dfefd871'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Sem índice, o ORDER BY embedding_vector <=> query do SearchEngineVector é um
+# seq scan que calcula a distância de cosseno (1024 dimensões) para cada linha.
+# VECTOR_INDEX_METHOD=hnsw (padrão) ou ivfflat. O IVFFlat precisa de dados na tabela
+# para treinar as listas: rodar depois da importação dos embeddings.
+INDEX_NAME = 'ix_startups_embedding_vector_ann'
+VECTOR_INDEX_METHOD = os.getenv('VECTOR_INDEX_METHOD', 'hnsw').lower()
+# Parâmetros de construção (valores padrão do pgvector)
+HNSW_M = int(os.getenv('VECTOR_HNSW_M', '16'))
+HNSW_EF_CONSTRUCTION = int(os.getenv('VECTOR_HNSW_EF_CONSTRUCTION', '64'))
+# Regra do pgvector: linhas / 1000 até 1M de linhas
+IVFFLAT_LISTS = int(os.getenv('VECTOR_IVFFLAT_LISTS', '100'))
+
+
+def _cosine_ops() -> str:
+    # Classe de operadores do tipo atual da coluna (vector, halfvec ou sparsevec)
+    column_type = op.get_bind().execute(sa.text(
+        "SELECT udt_name FROM information_schema.columns "
+        "WHERE table_name = 'startups' AND column_name = 'embedding_vector'"
+    )).scalar()
+    return f"{column_type or 'vector'}_cosine_ops"
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    ops = _cosine_ops()
+    if VECTOR_INDEX_METHOD == 'hnsw':
+        index_options = {'m': HNSW_M, 'ef_construction': HNSW_EF_CONSTRUCTION}
+    elif VECTOR_INDEX_METHOD == 'ivfflat':
+        index_options = {'lists': IVFFLAT_LISTS}
+    else:
+        raise ValueError(f"VECTOR_INDEX_METHOD inválido: '{VECTOR_INDEX_METHOD}' (use hnsw ou ivfflat)")
+
+    # CREATE INDEX CONCURRENTLY não pode rodar dentro de transação; sem ele a
+    # tabela ficaria bloqueada para escrita durante toda a construção do índice
+    with op.get_context().autocommit_block():
+        op.create_index(
+            INDEX_NAME,
+            'startups',
+            ['embedding_vector'],
+            unique=False,
+            postgresql_using=VECTOR_INDEX_METHOD,
+            postgresql_with=index_options,
+            postgresql_ops={'embedding_vector': ops},
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(INDEX_NAME, table_name='startups', postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,87 @@
+"""Indices por fase_da_startup (btree + ANN parcial por fase)
+
+Revision ID: 5b0e2f7c91d4
+Revises: 11c7474a9df1
+Create Date: 2026-10-17 11:03:27.184590
+
+"""
+import os
+import re
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from unidecode import unidecode
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b0e2f7c91d4'
+down_revision: Union[str, Sequence[str], None] = '11c7474a9df1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Busca vetorial com filtro de fase (ver backend/app/vector_planner.py):
+# - btree em fase_da_startup: a busca exata das fases pequenas só lê as linhas da fase
+# - índice ANN parcial (WHERE fase_da_startup = '<fase>') para as fases mais buscadas,
+#   listadas em VECTOR_PARTIAL_INDEX_PHASES (separadas por vírgula, ex: "Operação,Tração").
+#   O planner detecta esses índices pelo prefixo do nome em pg_indexes.
+PHASE_INDEX_NAME = 'ix_startups_fase_da_startup'
+PARTIAL_INDEX_PREFIX = 'ix_startups_embedding_vector_fase_'
+VECTOR_INDEX_METHOD = os.getenv('VECTOR_INDEX_METHOD', 'hnsw').lower()
+VECTOR_PARTIAL_INDEX_PHASES = [f.strip() for f in os.getenv('VECTOR_PARTIAL_INDEX_PHASES', '').split(',') if f.strip()]
+
+
+def _slug(fase: str) -> str:
+    return re.sub(r'[^a-z0-9]+', '_', unidecode(fase).lower()).strip('_')
+
+
+def _cosine_ops() -> str:
+    # Classe de operadores do tipo atual da coluna (vector, halfvec ou sparsevec)
+    column_type = op.get_bind().execute(sa.text(
+        "SELECT udt_name FROM information_schema.columns "
+        "WHERE table_name = 'startups' AND column_name = 'embedding_vector'"
+    )).scalar()
+    return f"{column_type or 'vector'}_cosine_ops"
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    ops = _cosine_ops()
+    if VECTOR_INDEX_METHOD == 'hnsw':
+        index_options = {'m': 16, 'ef_construction': 64}
+    else:
+        index_options = {'lists': int(os.getenv('VECTOR_IVFFLAT_LISTS', '100'))}
+
+    with op.get_context().autocommit_block():
+        op.create_index(
+            PHASE_INDEX_NAME, 'startups', ['fase_da_startup'],
+            unique=False, postgresql_concurrently=True, if_not_exists=True,
+        )
+        for fase in VECTOR_PARTIAL_INDEX_PHASES:
+            literal = fase.replace("'", "''")
+            op.create_index(
+                PARTIAL_INDEX_PREFIX + _slug(fase),
+                'startups',
+                ['embedding_vector'],
+                unique=False,
+                postgresql_using=VECTOR_INDEX_METHOD,
+                postgresql_with=index_options,
+                postgresql_ops={'embedding_vector': ops},
+                postgresql_where=sa.text(f"fase_da_startup = '{literal}'"),
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Remove todos os índices parciais existentes, não só os da lista atual
+    partial_indexes = op.get_bind().execute(
+        sa.text("SELECT indexname FROM pg_indexes WHERE tablename = 'startups' AND indexname LIKE :prefix"),
+        {'prefix': PARTIAL_INDEX_PREFIX + '%'},
+    ).scalars().all()
+
+    with op.get_context().autocommit_block():
+        for index_name in partial_indexes:
+            op.drop_index(index_name, table_name='startups', postgresql_concurrently=True, if_exists=True)
+        op.drop_index(PHASE_INDEX_NAME, table_name='startups', postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,82 @@
+"""Converte startups.embedding_vector para a representacao de EMBEDDING_STORAGE
+
+Revision ID: 8d3a6c1e4b27
+Revises: 5b0e2f7c91d4
+Create Date: 2026-10-17 12:26:09.771342
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from backend.app.vector_storage import EMBEDDING_DIMENSIONS, EMBEDDING_STORAGE
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d3a6c1e4b27'
+down_revision: Union[str, Sequence[str], None] = '5b0e2f7c91d4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# vector(1024) -> halfvec(1024) ou sparsevec(1024), conforme EMBEDDING_STORAGE
+# (ver backend/app/vector_storage.py). Os índices ANN dependem da classe de
+# operadores do tipo: são removidos, a coluna é convertida (cast do pgvector,
+# reescreve a tabela com lock exclusivo: rodar em janela de manutenção) e os
+# índices são recriados com <tipo>_cosine_ops, com a mesma definição de antes.
+ANN_INDEX_PREFIX = 'ix_startups_embedding_vector_'
+
+
+def _ann_indexes():
+    return op.get_bind().execute(
+        sa.text("SELECT indexname, indexdef FROM pg_indexes WHERE tablename = 'startups' AND indexname LIKE :prefix"),
+        {'prefix': ANN_INDEX_PREFIX + '%'},
+    ).all()
+
+
+def _convert(source: str, target: str):
+    indexes = _ann_indexes()
+    for _, indexdef in indexes:
+        if target == 'sparsevec' and 'USING ivfflat' in indexdef:
+            raise RuntimeError("sparsevec só tem índice HNSW: recrie os índices com VECTOR_INDEX_METHOD=hnsw antes")
+
+    with op.get_context().autocommit_block():
+        for index_name, _ in indexes:
+            op.drop_index(index_name, table_name='startups', postgresql_concurrently=True, if_exists=True)
+
+    op.execute(
+        f"ALTER TABLE startups ALTER COLUMN embedding_vector TYPE {target}({EMBEDDING_DIMENSIONS}) "
+        f"USING embedding_vector::{target}({EMBEDDING_DIMENSIONS})"
+    )
+
+    # O ALTER precisa estar confirmado antes do CREATE INDEX CONCURRENTLY
+    with op.get_context().autocommit_block():
+        for _, indexdef in indexes:
+            op.execute(
+                indexdef
+                .replace('CREATE INDEX', 'CREATE INDEX CONCURRENTLY', 1)
+                .replace(f'{source}_cosine_ops', f'{target}_cosine_ops')
+            )
+
+
+def _current_type() -> str:
+    return op.get_bind().execute(sa.text(
+        "SELECT udt_name FROM information_schema.columns "
+        "WHERE table_name = 'startups' AND column_name = 'embedding_vector'"
+    )).scalar()
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    current = _current_type()
+    if current is None or current == EMBEDDING_STORAGE:
+        return
+    _convert(current, EMBEDDING_STORAGE)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    current = _current_type()
+    if current is None or current == 'vector':
+        return
+    _convert(current, 'vector')
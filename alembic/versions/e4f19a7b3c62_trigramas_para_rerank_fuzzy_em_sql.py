@@ -0,0 +1,58 @@
+"""pg_trgm + indices de trigramas para o re-rank fuzzy em SQL
+
+Revision ID: e4f19a7b3c62
+Revises: 8d3a6c1e4b27
+Create Date: 2026-10-17 14:02:51.338104
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4f19a7b3c62'
+down_revision: Union[str, Sequence[str], None] = '8d3a6c1e4b27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Re-rank fuzzy do SearchEngineVector no próprio SQL (VECTOR_RERANK_MODE=sql):
+# - pg_trgm: similarity()/word_similarity() e os operadores % / <%
+# - startups_normalizar(texto): unaccent + lower, IMMUTABLE para poder ser usada em
+#   índice de expressão (unaccent() sozinha é só STABLE). Mesmo papel do normalizar()
+#   do normalized_fields.py no re-rank em Python.
+# - GIN de trigramas no nome e na tag normalizados: buscam as empresas cujo nome/tag
+#   casam com a query (query <% campo) para somar ao pool de candidatos do ANN.
+#   O contexto (solução + setores) só é pontuado no pool: sem índice.
+NORMALIZE_FUNCTION = 'startups_normalizar'
+TRIGRAM_INDEXES = {
+    'ix_startups_nome_trgm': 'nome_da_empresa',
+    'ix_startups_tag_trgm': 'tag',
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.execute('CREATE EXTENSION IF NOT EXISTS unaccent')
+    op.execute(
+        f"CREATE OR REPLACE FUNCTION {NORMALIZE_FUNCTION}(texto text) RETURNS text "
+        "LANGUAGE sql IMMUTABLE STRICT PARALLEL SAFE AS "
+        "$$ SELECT lower(public.unaccent('public.unaccent'::regdictionary, texto)) $$"
+    )
+
+    with op.get_context().autocommit_block():
+        for index_name, column in TRIGRAM_INDEXES.items():
+            op.execute(
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index_name} ON startups "
+                f"USING gin ({NORMALIZE_FUNCTION}({column}) gin_trgm_ops)"
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for index_name in TRIGRAM_INDEXES:
+            op.drop_index(index_name, table_name='startups', postgresql_concurrently=True, if_exists=True)
+    op.execute(f'DROP FUNCTION IF EXISTS {NORMALIZE_FUNCTION}(text)')
+    # As extensões ficam: outras partes do banco podem depender delas
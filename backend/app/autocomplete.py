@@ -0,0 +1,120 @@
+import threading
+from bisect import bisect_left, insort
+from typing import Iterable, List, Optional
+
+from .normalized_fields import normalizar
+
+# --- AUTOCOMPLETE (ÍNDICE DE PREFIXOS EM MEMÓRIA) ---
+# A caixa de busca do front chama a API a cada tecla. Em vez do TF-IDF + fuzzy,
+# o /empresa/autocomplete responde de um array ordenado de termos normalizados
+# (nome_da_empresa, setor_principal e tag), com busca binária (bisect) pelo prefixo.
+# Cada valor entra inteiro e a partir de cada palavra ("Smart Agro" casa "agro").
+# O crud.py mantém o índice em dia a cada escrita.
+
+# Campos sugeridos
+AUTOCOMPLETE_FIELDS = ("nome_da_empresa", "setor_principal", "tag")
+# Máximo de entradas percorridas por consulta (prefixos curtos + filtro de fase)
+MAX_SCAN = 2000
+
+
+def _terms(value: str) -> List[str]:
+    """
+    O valor normalizado inteiro e os sufixos que começam em cada palavra.
+    """
+    normalized = normalizar(value)
+    if not normalized:
+        return []
+    words = normalized.split()
+    return [" ".join(words[i:]) for i in range(len(words))]
+
+
+class PrefixIndex:
+    """
+    Entradas (termo, campo, id, texto original) ordenadas pelo termo.
+    """
+    def __init__(self):
+        self._entries = []
+        # id -> entradas da empresa (para remover/atualizar) e fase (filtro)
+        self._entries_by_id = {}
+        self._fase_by_id = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def _company_entries(company) -> List[tuple]:
+        entries = []
+        for field in AUTOCOMPLETE_FIELDS:
+            value = getattr(company, field, None)
+            if not value:
+                continue
+            entries.extend((term, field, company.id, value) for term in _terms(value))
+        return entries
+
+    def bulk_load(self, companies: Iterable):
+        entries = []
+        with self._lock:
+            for company in companies:
+                company_entries = self._company_entries(company)
+                self._entries_by_id[company.id] = company_entries
+                self._fase_by_id[company.id] = company.fase_da_startup
+                entries.extend(company_entries)
+            self._entries.extend(entries)
+            self._entries.sort()
+
+    def upsert(self, company):
+        new_entries = self._company_entries(company)
+        with self._lock:
+            self._remove_entries(company.id)
+            for entry in new_entries:
+                insort(self._entries, entry)
+            self._entries_by_id[company.id] = new_entries
+            self._fase_by_id[company.id] = company.fase_da_startup
+
+    def remove(self, company_id: int):
+        with self._lock:
+            self._remove_entries(company_id)
+            self._fase_by_id.pop(company_id, None)
+
+    def _remove_entries(self, company_id: int):
+        for entry in self._entries_by_id.pop(company_id, ()):
+            i = bisect_left(self._entries, entry)
+            if i < len(self._entries) and self._entries[i] == entry:
+                del self._entries[i]
+
+    def suggest(self, prefix: str, fase: Optional[str] = None, limit: int = 10) -> List[dict]:
+        """
+        Sugestões cujo termo começa com o prefixo (normalizado), sem repetição.
+        Nomes de empresa trazem o id; setores e tags aparecem uma vez só.
+        """
+        prefix = normalizar(prefix)
+        if not prefix:
+            return []
+
+        suggestions, seen = [], set()
+        with self._lock:
+            start = bisect_left(self._entries, (prefix,))
+            end = min(len(self._entries), start + MAX_SCAN)
+            for term, field, company_id, value in self._entries[start:end]:
+                if not term.startswith(prefix):
+                    break
+                if fase and self._fase_by_id.get(company_id) != fase:
+                    continue
+                key = (field, company_id if field == "nome_da_empresa" else value)
+                if key in seen:
+                    continue
+                seen.add(key)
+                suggestions.append({
+                    "texto": value,
+                    "campo": field,
+                    "empresa_id": company_id if field == "nome_da_empresa" else None,
+                })
+                if len(suggestions) >= limit:
+                    break
+        return suggestions
+
+
+# --- Variável Global Singleton ---
+# Trocada inteira pelo RebuildCoordinator e atualizada pelo crud.py
+autocomplete_index = PrefixIndex()
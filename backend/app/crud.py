@@ -1,6 +1,41 @@
-from sqlalchemy.orm import Session
-from typing import Optional
+from sqlalchemy.orm import Session, undefer
+from typing import List, Optional
 from . import models, schemas, security, embedding_service # Importamos security para o hashing
+from .search_cache import search_cache
+from .index_rebuild import rebuild_coordinator
+
+# --- Sincronização dos índices de busca em memória ---
+
+def _sync_search_index(db_empresa: models.Empresa, text_changed: bool = True, search_relevant: Optional[bool] = None):
+    """
+    Mantém o índice TF-IDF (search_engine.search_engine_instance), o autocomplete,
+    a matriz do motor vetorial em memória (se ativo) e o cache de resultados em dia
+    com as escritas, sem precisar reiniciar o processo (ver index_rebuild.apply_upsert).
+    `search_relevant` indica se algum campo usado pela busca (textos ou fase) mudou;
+    por padrão segue `text_changed`.
+    Uma falha aqui não desfaz a escrita no banco (que já foi commitada).
+    """
+    if search_relevant is None:
+        search_relevant = text_changed
+    search_cache.invalidate(db_empresa.id, search_relevant=search_relevant)
+    try:
+        rebuild_coordinator.apply_upsert(db_empresa, text_changed=text_changed, search_relevant=search_relevant)
+        # Os outros workers re-leem a empresa do banco (com SEARCH_INDEX_DIR)
+        rebuild_coordinator.share_write(db_empresa.id)
+    except Exception as e:
+        print(f"Aviso: falha ao atualizar o índice de busca: {e}")
+
+def _remove_from_search_index(empresa_id: int):
+    """
+    Retira uma empresa deletada dos índices em memória (TF-IDF, vetorial) e do cache de resultados.
+    """
+    search_cache.invalidate(empresa_id, search_relevant=True)
+    try:
+        rebuild_coordinator.apply_remove(empresa_id)
+        rebuild_coordinator.share_write(empresa_id)
+    except Exception as e:
+        print(f"Aviso: falha ao atualizar o índice de busca: {e}")
+
 
 # --- Funções CRUD para Empresa ---
 
@@ -24,25 +59,45 @@ def create_empresa(db: Session, empresa: schemas.EmpresaCreate):
     db.commit()
     db.refresh(db_empresa)
 
+    _sync_search_index(db_empresa)
+
     return db_empresa
 
 
 # --- ( READ ) ---
 
-def get_empresa(db: Session, empresa_id: int):
+def _query_empresas(db: Session, with_embedding: bool = False):
+    # embedding_vector é deferred no mapeamento: só vem do banco quando pedido
+    query = db.query(models.Empresa)
+    if with_embedding:
+        query = query.options(undefer(models.Empresa.embedding_vector))
+    return query
+
+def get_empresa(db: Session, empresa_id: int, with_embedding: bool = False):
     """
     Busca uma empresa pelo seu ID.
+    O embedding_vector só é carregado com with_embedding=True.
+    """
+    return _query_empresas(db, with_embedding).filter(models.Empresa.id == empresa_id).first()
 
+def get_empresas_by_ids(db: Session, empresa_ids: List[int], with_embedding: bool = False):
+    """
+    Busca várias empresas numa única consulta, na ordem dos ids recebidos.
+    Ids inexistentes são ignorados.
     """
-    return db.query(models.Empresa).filter(models.Empresa.id == empresa_id).first()
+    if not empresa_ids:
+        return []
+    rows = _query_empresas(db, with_embedding).filter(models.Empresa.id.in_(empresa_ids)).all()
+    by_id = {row.id: row for row in rows}
+    return [by_id[empresa_id] for empresa_id in empresa_ids if empresa_id in by_id]
 
-def get_all_empresas(db: Session,  skip: int = 0, limit: Optional[int] = None):
+def get_all_empresas(db: Session,  skip: int = 0, limit: Optional[int] = None, with_embedding: bool = False):
     """
     Busca todas as empresas
-
+    (sem o embedding_vector, a menos que with_embedding=True)
     """
     #return db.query(models.Empresa).offset(skip).limit(limit).all()
-    query = db.query(models.Empresa).offset(skip)
+    query = _query_empresas(db, with_embedding).offset(skip)
     if limit:
         query = query.limit(limit)
     return query.all()
@@ -62,6 +117,8 @@ def update_empresa(db: Session, db_empresa: models.Empresa, empresa_data: schema
     # Lista de campos que afetam a busca
     campos_busca = ['nome_da_empresa', 'solucao', 'setor_principal', 'setor_secundario', 'tag']
     mudou_texto = any(campo in update_data for campo in campos_busca)
+    # A fase não entra no texto indexado, mas filtra os resultados (cache de busca)
+    mudou_busca = mudou_texto or 'fase_da_startup' in update_data
 
     for key, value in update_data.items():
         setattr(db_empresa, key, value)
@@ -73,6 +130,8 @@ def update_empresa(db: Session, db_empresa: models.Empresa, empresa_data: schema
     db.commit()
     db.refresh(db_empresa)
 
+    _sync_search_index(db_empresa, text_changed=mudou_texto, search_relevant=mudou_busca)
+
     return db_empresa
 
 # --- campos MIDIA (UPDATE) ---
@@ -88,6 +147,7 @@ def update_empresa_link(db: Session, empresa_id: int, link: str):
         db_empresa.link_apresentacao = link
         db.commit()
         db.refresh(db_empresa)
+        _sync_search_index(db_empresa, text_changed=False)
     return db_empresa
 
 def update_empresa_link_apresentacao(db: Session, db_empresa: models.Empresa, link: Optional[str]):
@@ -99,6 +159,7 @@ def update_empresa_link_apresentacao(db: Session, db_empresa: models.Empresa, li
     db_empresa.link_apresentacao = link
     db.commit()
     db.refresh(db_empresa)
+    _sync_search_index(db_empresa, text_changed=False)
 
     return db_empresa
 
@@ -111,6 +172,7 @@ def update_empresa_link_video(db: Session, db_empresa: models.Empresa, link: Opt
     db_empresa.link_video = link
     db.commit()
     db.refresh(db_empresa)
+    _sync_search_index(db_empresa, text_changed=False)
 
     return db_empresa
 
@@ -123,6 +185,7 @@ def update_empresa_telefone_contato(db: Session, db_empresa: models.Empresa, tel
     db_empresa.telefone_contato = telefone
     db.commit()
     db.refresh(db_empresa)
+    _sync_search_index(db_empresa, text_changed=False)
 
     return db_empresa
 
@@ -133,8 +196,10 @@ def delete_empresa(db: Session, db_empresa: models.Empresa):
     Usado pelo 'empresa_router'.
     """
 
+    empresa_id = db_empresa.id
     db.delete(db_empresa)
     db.commit()
+    _remove_from_search_index(empresa_id)
     #db.refresh(db_empresa)
 
     try:
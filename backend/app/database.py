@@ -2,8 +2,6 @@ import os
 from dotenv import load_dotenv
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, declarative_base, registry
-import psycopg2
-from psycopg2.extensions import register_adapter, AsIs
 
 
 load_dotenv()
@@ -15,10 +13,8 @@ if not DATABASE_URL:
     raise ValueError("A variável de ambiente 'DATABASE_URL' não está definida.")
 
 
-def adapt_list_for_pgvector(list_data):
-    return AsIs(str(list_data).replace('[', '(').replace(']', ')'))
-
-register_adapter(list, adapt_list_for_pgvector)
+# Vetores do pgvector: convertidos só nas colunas vetoriais, pelo tipo da coluna
+# (vector_storage.py). Nenhum adaptador global para `list` no psycopg2.
 
 engine = create_engine(DATABASE_URL)
 
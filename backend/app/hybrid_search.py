@@ -0,0 +1,120 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+
+from . import search_engine as se_tfidf
+from . import search_engine_vector as se_vector
+from .database import SessionLocal
+from .search_metrics import NO_TRACE, SearchTrace
+
+# --- BUSCA HÍBRIDA (TF-IDF + VETORIAL) ---
+# Os dois motores rodam ao mesmo tempo num pool de threads: o vetorial passa a maior
+# parte do tempo esperando o Postgres (I/O) e o TF-IDF é CPU (NumPy/rapidfuzz).
+# Os dois têm um único prazo, contado de quando a busca híbrida começa (a espera
+# na fila do pool conta): um motor lento vira resultado parcial em vez de somar
+# a sua latência. As listas são fundidas por Reciprocal Rank Fusion.
+
+# Constante k do RRF (valor usual da literatura: 60)
+HYBRID_RRF_K = 60
+# Prazo (segundos) dos dois motores, contado do início da busca híbrida
+HYBRID_SEARCH_TIMEOUT = float(os.getenv("HYBRID_SEARCH_TIMEOUT", "1.5"))
+# Quantos resultados cada motor entrega para a fusão
+HYBRID_SEARCH_DEPTH = int(os.getenv("HYBRID_SEARCH_DEPTH", "20"))
+
+# Cada request põe duas tarefas no pool: o padrão é o dobro do limite do threadpool
+# do AnyIO, onde o FastAPI roda os endpoints síncronos (40). Assim a fila só cresce
+# além da concorrência de requests se motores que estouraram o prazo ainda rodam.
+HYBRID_SEARCH_WORKERS = int(os.getenv("HYBRID_SEARCH_WORKERS", "80"))
+
+_executor = ThreadPoolExecutor(max_workers=HYBRID_SEARCH_WORKERS, thread_name_prefix="hybrid-search")
+
+
+def reciprocal_rank_fusion(rankings: Dict[str, List[int]], k: int = HYBRID_RRF_K) -> List[int]:
+    """
+    score(id) = soma de 1 / (k + posição) em cada lista (posição a partir de 1).
+    Empates mantêm a ordem de primeira aparição.
+    """
+    scores = {}
+    for ranking in rankings.values():
+        for position, company_id in enumerate(ranking, 1):
+            scores[company_id] = scores.get(company_id, 0.0) + 1.0 / (k + position)
+    return sorted(scores, key=lambda company_id: -scores[company_id])
+
+
+def run_engines(searches: Dict[str, Callable[[], List[int]]], timeout: float = HYBRID_SEARCH_TIMEOUT) -> Tuple[Dict[str, List[int]], Dict[str, str]]:
+    """
+    Roda as buscas em paralelo no pool, com um prazo único de `timeout` segundos
+    a partir da submissão. Retorna (rankings dos motores que responderam a tempo,
+    {motor: "timeout" | "erro"} dos que falharam).
+    """
+    futures = {name: _executor.submit(search) for name, search in searches.items()}
+    done, _ = wait(futures.values(), timeout=timeout)
+
+    rankings, failed = {}, {}
+    for name, future in futures.items():
+        if future not in done:
+            # Ainda na fila: é cancelada. Já rodando: a thread termina sozinha
+            # (o vetorial tem statement_timeout no banco)
+            future.cancel()
+            failed[name] = "timeout"
+            continue
+        try:
+            rankings[name] = future.result()
+        except Exception as e:
+            print(f"Aviso: motor '{name}' falhou na busca híbrida: {e}")
+            failed[name] = "erro"
+    return rankings, failed
+
+
+def tfidf_ranking(query: str, fase: Optional[str], depth: int, trace=NO_TRACE) -> List[int]:
+    engine = se_tfidf.search_engine_instance
+    if engine is None:
+        raise RuntimeError("índice TF-IDF não inicializado")
+    return [company.id for company in engine.optimized_search(query=query, fase=fase, limit=depth, trace=trace)]
+
+
+def vector_ranking(query: str, fase: Optional[str], depth: int, timeout: float = HYBRID_SEARCH_TIMEOUT, trace=NO_TRACE) -> List[int]:
+    engine = se_vector.search_engine_vector_instance
+    if engine is None:
+        raise RuntimeError("motor vetorial não inicializado")
+    if engine.IN_MEMORY:
+        # Backend em memória: só ids, sem sessão nem consulta ao banco
+        return engine.search_ids(query=query, fase=fase, limit=depth, trace=trace)
+    # Sessão própria: a sessão do request não pode ser usada em outra thread
+    db = SessionLocal()
+    try:
+        if db.get_bind().dialect.name == "postgresql":
+            # O Postgres cancela a consulta se o motor estourar o tempo
+            db.execute(text(f"SET LOCAL statement_timeout = {int(timeout * 1000)}"))
+        return [company.id for company in engine.optimized_search_vector(db=db, query=query, fase=fase, limit=depth, trace=trace)]
+    finally:
+        db.close()
+
+
+def hybrid_search(query: str, fase: Optional[str] = None, limit: int = 5, timeout: float = HYBRID_SEARCH_TIMEOUT, trace: Optional[SearchTrace] = None) -> Tuple[List[int], Dict[str, str]]:
+    """
+    Ids do resultado fundido (top `limit`) e os motores que falharam.
+    Com `trace`, cada motor registra as suas etapas num trace filho.
+    """
+    depth = max(limit, HYBRID_SEARCH_DEPTH)
+    tfidf_trace = trace.child("tfidf") if trace is not None else NO_TRACE
+    vector_trace = trace.child("vector") if trace is not None else NO_TRACE
+    trace = trace if trace is not None else NO_TRACE
+
+    with trace.stage("motores"):
+        rankings, failed = run_engines({
+            "tfidf": lambda: tfidf_ranking(query, fase, depth, tfidf_trace),
+            "vector": lambda: vector_ranking(query, fase, depth, timeout, vector_trace),
+        }, timeout=timeout)
+    for name in failed:
+        trace.count(f"falha_{name}", 1)
+        # A thread do motor que estourou o tempo ainda pode escrever no trace dele
+        if isinstance(trace, SearchTrace):
+            trace.children.pop(name, None)
+
+    with trace.stage("fusao"):
+        fused = reciprocal_rank_fusion(rankings)[:limit]
+    return fused, failed
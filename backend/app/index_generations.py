@@ -0,0 +1,186 @@
+import os
+import re
+import shutil
+from contextlib import contextmanager
+from typing import List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem flock, cada processo constrói o seu índice
+    fcntl = None
+
+# --- GERAÇÕES DO ÍNDICE EM DISCO (COMPARTILHADO ENTRE WORKERS) ---
+# Layout de SEARCH_INDEX_DIR:
+#   gen-000001/, gen-000002/ ...   snapshots gravados por SearchEngine.save()
+#   CURRENT                        nome da geração publicada (troca atômica via os.replace)
+#   .build.lock                    flock: só um worker faz o fit, os outros esperam e anexam
+#   writes-000001.log ...          ids das empresas escritas por cada worker (SharedWriteLog)
+#   .writes.lock                   flock das escritas no writes.log
+# Como os arrays são abertos com mmap, todos os workers que anexam a mesma geração
+# compartilham as mesmas páginas físicas (page cache) em vez de uma cópia por processo.
+# O número da geração é o contador que indica aos workers quando re-anexar.
+
+GENERATION_RE = re.compile(r"^gen-(\d+)$")
+# Gerações antigas mantidas (workers que ainda não re-anexaram continuam lendo a delas)
+KEEP_GENERATIONS = 2
+WRITE_SEGMENT_RE = re.compile(r"^writes-(\d+)\.log$")
+# Tamanho (bytes) a partir do qual o log de escritas começa um segmento novo
+WRITE_LOG_MAX_BYTES = int(os.getenv("SEARCH_WRITE_LOG_MAX_BYTES", str(16 * 1024 * 1024)))
+
+
+@contextmanager
+def _flock(path: str):
+    if fcntl is None:
+        yield
+        return
+    with open(path, "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class IndexGenerations:
+    """
+    Gerações do snapshot do índice TF-IDF num diretório compartilhado pelos workers.
+    """
+    def __init__(self, root: str):
+        self.root = root
+
+    def _current_path(self) -> str:
+        return os.path.join(self.root, "CURRENT")
+
+    def path(self, generation: str) -> str:
+        return os.path.join(self.root, generation)
+
+    def current(self) -> Optional[str]:
+        """
+        Geração publicada (ou None se ainda não houver nenhuma).
+        """
+        try:
+            with open(self._current_path(), encoding="utf-8") as f:
+                generation = f.read().strip()
+        except FileNotFoundError:
+            return None
+        return generation or None
+
+    def _generations(self):
+        if not os.path.isdir(self.root):
+            return []
+        found = []
+        for name in os.listdir(self.root):
+            match = GENERATION_RE.match(name)
+            if match:
+                found.append((int(match.group(1)), name))
+        return [name for _, name in sorted(found)]
+
+    @contextmanager
+    def builder_lock(self):
+        """
+        Lock exclusivo entre processos (flock) para construir/publicar uma geração.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        with _flock(os.path.join(self.root, ".build.lock")):
+            yield
+
+    def publish(self, engine, fingerprint: dict) -> str:
+        """
+        Grava o índice numa geração nova e a torna a atual. Chamar com o builder_lock.
+        """
+        generations = self._generations()
+        last = int(GENERATION_RE.match(generations[-1]).group(1)) if generations else 0
+        generation = f"gen-{last + 1:06d}"
+        engine.save(self.path(generation), fingerprint)
+
+        tmp_path = self._current_path() + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(generation)
+        os.replace(tmp_path, self._current_path())
+
+        # No Linux um arquivo apagado continua válido para quem já o mapeou
+        for old in self._generations()[:-KEEP_GENERATIONS]:
+            shutil.rmtree(self.path(old), ignore_errors=True)
+        return generation
+
+
+class SharedWriteLog:
+    """
+    Log compartilhado das escritas (uma linha "<origem> <id da empresa>" por escrita).
+    Cada worker anota as escritas que atendeu e lê as dos outros a partir da sua
+    posição: os ids lidos são re-sincronizados com o banco no índice local.
+    O log é dividido em segmentos numerados (writes-000001.log, ...): ao passar de
+    WRITE_LOG_MAX_BYTES começa um segmento novo e só o anterior é mantido, de onde
+    quem estava no meio termina de ler. A posição é (segmento, offset); quem ficou
+    para trás mais de um segmento recebe complete=False.
+    """
+    def __init__(self, root: str, max_bytes: int = WRITE_LOG_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+
+    def _path(self, segment: int) -> str:
+        return os.path.join(self.root, f"writes-{segment:06d}.log")
+
+    def _segments(self) -> List[int]:
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(int(m.group(1)) for m in map(WRITE_SEGMENT_RE.match, os.listdir(self.root)) if m)
+
+    def append(self, origin: str, company_id: int):
+        os.makedirs(self.root, exist_ok=True)
+        with _flock(os.path.join(self.root, ".writes.lock")):
+            segments = self._segments()
+            segment = segments[-1] if segments else 1
+            if segments and os.path.getsize(self._path(segment)) >= self.max_bytes:
+                segment += 1
+                for old in segments[:-1]:
+                    os.remove(self._path(old))
+            with open(self._path(segment), "a", encoding="ascii") as f:
+                f.write(f"{origin} {int(company_id)}\n")
+
+    def position(self) -> Tuple[int, int]:
+        """
+        Fim atual do log: o que for escrito depois disso é lido por read_since().
+        """
+        segments = self._segments()
+        if not segments:
+            return 1, 0
+        try:
+            return segments[-1], os.path.getsize(self._path(segments[-1]))
+        except FileNotFoundError:
+            return self.position()
+
+    def _read_lines(self, segment: int, offset: int) -> Tuple[List[Tuple[str, int]], int]:
+        # Só linhas completas: uma escrita em andamento fica para a próxima leitura
+        with open(self._path(segment), "rb") as f:
+            f.seek(offset)
+            data = f.read()
+        end = data.rfind(b"\n") + 1
+        entries = []
+        for line in data[:end].decode("ascii").splitlines():
+            origin, company_id = line.split()
+            entries.append((origin, int(company_id)))
+        return entries, offset + end
+
+    def read_since(self, position: Tuple[int, int]) -> Tuple[List[Tuple[str, int]], Tuple[int, int], bool]:
+        """
+        Escritas depois de `position`. Retorna (entradas, nova posição, complete).
+        """
+        segment, offset = position
+        segments = self._segments()
+        current = segments[-1] if segments else segment
+        entries = []
+        try:
+            if segment < current:
+                if segment != current - 1:
+                    return [], self.position(), False
+                # Segmento novo: termina de ler o anterior
+                entries, _ = self._read_lines(segment, offset)
+                segment, offset = current, 0
+            if segment not in segments:
+                return entries, (segment, offset), True
+            new_entries, offset = self._read_lines(segment, offset)
+        except FileNotFoundError:
+            # O segmento foi apagado por rotações enquanto este worker não lia
+            return [], self.position(), False
+        return entries + new_entries, (segment, offset), True
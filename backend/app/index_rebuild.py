@@ -0,0 +1,357 @@
+import os
+import time
+import threading
+import uuid
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+from . import models
+from . import search_engine as se_tfidf
+from . import search_engine_vector as se_vector
+from .database import SessionLocal
+from .index_generations import IndexGenerations, SharedWriteLog
+from .normalized_fields import normalized_store
+from .search_cache import search_cache
+from . import autocomplete
+
+# --- REBUILD DO ÍNDICE TF-IDF EM BACKGROUND ---
+# Um rebuild completo (re-fit do vocabulário e do IDF) roda numa thread, a partir
+# de um snapshot novo do banco, sem bloquear as buscas: o endpoint continua usando
+# o índice antigo até a troca. As escritas que chegam durante o build vão para um
+# journal e são re-aplicadas no índice novo logo antes da troca (atômica) de
+# search_engine.search_engine_instance.
+#
+# Com vários workers (SEARCH_INDEX_DIR), cada escrita também é anotada num log
+# compartilhado (SharedWriteLog): a thread de verificação de geração de cada worker
+# lê as escritas dos outros e re-sincroniza essas empresas com o banco no seu
+# índice em memória (TF-IDF, autocomplete e vetorial em memória). Uma escrita feita
+# num worker aparece nos demais em até SEARCH_INDEX_GENERATION_POLL segundos.
+# Sem SEARCH_INDEX_DIR cada processo só enxerga as próprias escritas (um worker).
+
+# Intervalo (segundos) do rebuild agendado; 0 desliga
+SEARCH_INDEX_REBUILD_INTERVAL = float(os.getenv("SEARCH_INDEX_REBUILD_INTERVAL", "0"))
+# Diretório das gerações do snapshot em disco (vazio desliga). No arranque o índice
+# é anexado daqui (mmap, compartilhado entre os workers) sem refazer o fit.
+SEARCH_INDEX_DIR = os.getenv("SEARCH_INDEX_DIR", "")
+# Intervalo (segundos) da verificação de geração nova e de escritas de outros workers
+SEARCH_INDEX_GENERATION_POLL = float(os.getenv("SEARCH_INDEX_GENERATION_POLL", "5"))
+
+
+# Colunas usadas pelo SearchEngine (texto indexado, fuzzy e fase)
+SEARCH_COLUMNS = (
+    models.Empresa.id,
+    models.Empresa.nome_da_empresa,
+    models.Empresa.solucao,
+    models.Empresa.setor_principal,
+    models.Empresa.setor_secundario,
+    models.Empresa.tag,
+    models.Empresa.fase_da_startup,
+)
+
+
+class RebuildCoordinator:
+    """
+    Coordena os rebuilds completos do índice TF-IDF (endpoint, agendamento ou SIGHUP).
+    """
+    def __init__(self, session_factory: Callable = SessionLocal, index_dir: str = SEARCH_INDEX_DIR):
+        self.session_factory = session_factory
+        self.index_dir = index_dir
+        self.generations = IndexGenerations(index_dir) if index_dir else None
+        # Escritas compartilhadas entre os workers: identificador deste processo
+        # (as próprias escritas não são re-aplicadas) e posição já lida do log
+        self.write_log = SharedWriteLog(index_dir) if index_dir else None
+        self._origin = None
+        self._origin_pid = None
+        self._write_log_position = None
+        # Geração do disco em uso por este processo
+        self.generation = None
+        # Protege a troca do índice e o journal; o crud.py o usa nas escritas
+        self.write_lock = threading.RLock()
+        self._journal = None
+        self._thread = None
+        self._schedule_thread = None
+        self._watch_thread = None
+        self.status = {
+            "state": "idle",
+            "trigger": None,
+            "started_at": None,
+            "finished_at": None,
+            "duration_seconds": None,
+            "corpus_size": None,
+            "source": None,
+            "generation": None,
+            "replayed_writes": None,
+            "builds": 0,
+            "last_error": None,
+        }
+
+    @property
+    def origin(self) -> str:
+        # Por processo: com preload, os workers herdam do master o mesmo objeto
+        if self._origin_pid != os.getpid():
+            self._origin, self._origin_pid = uuid.uuid4().hex[:12], os.getpid()
+        return self._origin
+
+    @property
+    def building(self) -> bool:
+        return self._journal is not None
+
+    # --- Journal (chamado com o write_lock) ---
+
+    def record_upsert(self, company):
+        if self._journal is not None:
+            self._journal.append(("upsert", company))
+
+    def record_remove(self, company_id: int):
+        if self._journal is not None:
+            self._journal.append(("remove", company_id))
+
+    # --- Escritas nos índices em memória (crud.py e escritas de outros workers) ---
+
+    def apply_upsert(self, company, text_changed: bool = True, search_relevant: bool = True):
+        """
+        Aplica a escrita de uma empresa nos índices em memória deste processo.
+        O lock evita perder a escrita se um rebuild trocar o índice neste meio tempo.
+        """
+        # Campos normalizados usados pelo fuzzy dos dois motores
+        normalized_store.refresh(company)
+        with self.write_lock:
+            self.record_upsert(company)
+            autocomplete.autocomplete_index.upsert(company)
+            vector_engine = se_vector.search_engine_vector_instance
+            if vector_engine is not None and vector_engine.IN_MEMORY and search_relevant:
+                # Matriz do backend vetorial em memória (VECTOR_SEARCH_BACKEND=memory)
+                vector_engine.upsert(company)
+            engine = se_tfidf.search_engine_instance
+            if engine is None:
+                # Banco estava vazio no arranque: o primeiro registro cria o índice
+                se_tfidf.search_engine_instance = se_tfidf.SearchEngine([company], field_store=normalized_store)
+                return
+            engine.update_company(company, text_changed=text_changed)
+
+    def apply_remove(self, company_id: int):
+        normalized_store.remove(company_id)
+        with self.write_lock:
+            self.record_remove(company_id)
+            autocomplete.autocomplete_index.remove(company_id)
+            vector_engine = se_vector.search_engine_vector_instance
+            if vector_engine is not None and vector_engine.IN_MEMORY:
+                vector_engine.remove(company_id)
+            engine = se_tfidf.search_engine_instance
+            if engine is not None:
+                engine.remove_company(company_id)
+
+    def share_write(self, company_id: int):
+        """
+        Anota a escrita no log compartilhado para os outros workers (com SEARCH_INDEX_DIR).
+        """
+        if self.write_log is not None:
+            self.write_log.append(self.origin, company_id)
+
+    def replay_writes(self) -> int:
+        """
+        Re-sincroniza com o banco as empresas escritas por outros workers desde a
+        última leitura do log. Retorna o nº de empresas aplicadas.
+        """
+        if self.write_log is None or self._write_log_position is None:
+            return 0
+        entries, position, complete = self.write_log.read_since(self._write_log_position)
+        self._write_log_position = position
+        if not complete:
+            # Ficou para trás mais de uma rotação do log: reconcilia a geração com o banco
+            print("Aviso: escritas de outros workers perdidas no log; reconciliando o índice.")
+            self.trigger("generation")
+            return 0
+
+        company_ids = list(dict.fromkeys(company_id for origin, company_id in entries if origin != self.origin))
+        if not company_ids:
+            return 0
+        db = self.session_factory()
+        try:
+            by_id = {c.id: c for c in db.query(models.Empresa).filter(models.Empresa.id.in_(company_ids)).all()}
+        finally:
+            db.close()
+
+        for company_id in company_ids:
+            # O resultado em cache deste worker pode conter a versão antiga
+            search_cache.invalidate(company_id, search_relevant=True)
+            company = by_id.get(company_id)
+            if company is None:
+                self.apply_remove(company_id)
+                continue
+            engine = se_tfidf.search_engine_instance
+            self.apply_upsert(company, text_changed=engine is None or engine.text_changed(company))
+        return len(company_ids)
+
+    # --- Build ---
+
+    def _load_snapshot(self):
+        # Só as colunas que a indexação lê (sem embedding_vector e demais campos):
+        # nenhuma linha do ORM fica presa ao índice nem a uma sessão aberta
+        db = self.session_factory()
+        try:
+            return db.query(*SEARCH_COLUMNS).all()
+        finally:
+            db.close()
+
+    def _build(self, companies, reuse_snapshot: bool):
+        """
+        Índice novo para o corpus. Com SEARCH_INDEX_DIR, anexa a geração publicada
+        (arrays mapeados em memória, reconciliados com o banco) se permitido;
+        senão faz o fit completo e publica uma geração nova para os outros workers.
+        Retorna (engine, origem).
+        """
+        if not self.index_dir:
+            return se_tfidf.SearchEngine(companies, field_store=normalized_store), "fit"
+
+        fingerprint = se_tfidf.corpus_fingerprint(companies)
+        # Só um worker faz o fit: os outros esperam o lock e anexam a geração publicada
+        with self.generations.builder_lock():
+            if reuse_snapshot:
+                generation = self.generations.current()
+                if generation is not None:
+                    path = self.generations.path(generation)
+                    try:
+                        # Fingerprint igual: anexa direto; diferente: reconcilia linha a linha com o banco
+                        engine = se_tfidf.SearchEngine.load(path, companies, fingerprint, field_store=normalized_store)
+                        if engine is None:
+                            engine = se_tfidf.SearchEngine.load(path, companies, field_store=normalized_store)
+                        if engine is not None:
+                            self.generation = generation
+                            return engine, "disk"
+                    except Exception as e:
+                        print(f"Aviso: geração '{generation}' do índice ignorada: {e}")
+
+            engine = se_tfidf.SearchEngine(companies, field_store=normalized_store)
+            if companies:
+                try:
+                    self.generation = self.generations.publish(engine, fingerprint)
+                except Exception as e:
+                    print(f"Aviso: falha ao gravar o snapshot do índice: {e}")
+        return engine, "fit"
+
+    def check_generation(self) -> bool:
+        """
+        Se outro worker publicou uma geração nova, re-anexa (rebuild sem fit).
+        """
+        if not self.index_dir:
+            return False
+        generation = self.generations.current()
+        if generation is None or generation == self.generation:
+            return False
+        return self.trigger("generation")
+
+    def start_generation_watch(self, interval: Optional[float] = None):
+        """
+        Verifica periodicamente (SEARCH_INDEX_GENERATION_POLL segundos) o CURRENT do
+        diretório compartilhado e as escritas feitas pelos outros workers.
+        """
+        interval = SEARCH_INDEX_GENERATION_POLL if interval is None else interval
+        if not self.index_dir or interval <= 0 or (self._watch_thread is not None and self._watch_thread.is_alive()):
+            return
+
+        def loop():
+            while True:
+                time.sleep(interval)
+                self.check_generation()
+                try:
+                    self.replay_writes()
+                except Exception as e:
+                    print(f"Aviso: falha ao aplicar escritas de outros workers: {e}")
+
+        self._watch_thread = threading.Thread(target=loop, name="tfidf-generation-watch", daemon=True)
+        self._watch_thread.start()
+
+    def rebuild(self, trigger: str = "manual") -> bool:
+        """
+        Rebuild síncrono. Retorna False se outro rebuild já estiver em andamento.
+        """
+        with self.write_lock:
+            if self.building:
+                return False
+            self._journal = []
+            self.status.update(state="running", trigger=trigger, started_at=datetime.now(timezone.utc), last_error=None)
+
+        start = time.perf_counter()
+        try:
+            # Escritas de outros workers anotadas antes desta leitura já estão no banco lido
+            write_log_position = self.write_log.position() if self.write_log is not None else None
+            companies = self._load_snapshot()
+            # No arranque e ao detectar uma geração nova, reaproveita o snapshot publicado
+            new_engine, source = self._build(companies, reuse_snapshot=trigger in ("startup", "generation"))
+            # Índice de correção de digitação montado aqui, fora do caminho das buscas
+            new_engine.query_corrector()
+            # O índice de prefixos do autocomplete é reconstruído e trocado junto
+            new_autocomplete = autocomplete.PrefixIndex()
+            new_autocomplete.bulk_load(companies)
+
+            with self.write_lock:
+                # Escritas feitas durante o build: aplicadas em ordem no índice novo
+                journal = self._journal
+                for op, payload in journal:
+                    if op == "upsert":
+                        new_engine.update_company(payload)
+                        new_autocomplete.upsert(payload)
+                    else:
+                        new_engine.remove_company(payload)
+                        new_autocomplete.remove(payload)
+                # Troca atômica: buscas em andamento terminam no índice antigo
+                se_tfidf.search_engine_instance = new_engine
+                autocomplete.autocomplete_index = new_autocomplete
+                self._journal = None
+                self._write_log_position = write_log_position
+                # O IDF mudou: resultados antigos do cache não valem mais
+                search_cache.results.clear()
+                self.status.update(
+                    state="idle",
+                    finished_at=datetime.now(timezone.utc),
+                    duration_seconds=round(time.perf_counter() - start, 3),
+                    corpus_size=len(companies),
+                    source=source,
+                    generation=self.generation,
+                    replayed_writes=len(journal),
+                    builds=self.status["builds"] + 1,
+                )
+            print(f"Índice TF-IDF pronto ({trigger}, {source}): {len(companies)} empresas em {self.status['duration_seconds']}s")
+            return True
+        except Exception as e:
+            with self.write_lock:
+                self._journal = None
+                self.status.update(state="failed", finished_at=datetime.now(timezone.utc), last_error=str(e))
+            print(f"Erro no rebuild do índice TF-IDF ({trigger}): {e}")
+            return False
+
+    def trigger(self, trigger: str = "manual") -> bool:
+        """
+        Dispara o rebuild numa thread. Retorna False se já houver um em andamento.
+        """
+        with self.write_lock:
+            if self.building or (self._thread is not None and self._thread.is_alive()):
+                return False
+            self._thread = threading.Thread(target=self.rebuild, args=(trigger,), name="tfidf-rebuild", daemon=True)
+            self._thread.start()
+        return True
+
+    def start_schedule(self, interval: Optional[float] = None):
+        """
+        Rebuild periódico (SEARCH_INDEX_REBUILD_INTERVAL segundos).
+        """
+        interval = SEARCH_INDEX_REBUILD_INTERVAL if interval is None else interval
+        if interval <= 0 or (self._schedule_thread is not None and self._schedule_thread.is_alive()):
+            return
+
+        def loop():
+            while True:
+                time.sleep(interval)
+                self.trigger("schedule")
+
+        self._schedule_thread = threading.Thread(target=loop, name="tfidf-rebuild-schedule", daemon=True)
+        self._schedule_thread.start()
+
+    def handle_signal(self, signum, frame):
+        # SIGHUP: recarrega o índice sem reiniciar o processo
+        self.trigger("signal")
+
+
+# --- Variável Global Singleton ---
+rebuild_coordinator = RebuildCoordinator()
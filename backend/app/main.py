@@ -7,14 +7,15 @@ warnings.filterwarnings(
     message="The parameter 'token_pattern' will not be used since 'tokenizer' is not None", 
     category=UserWarning
 )
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, status, Response, Query
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import List, Optional, Union
 from contextlib import asynccontextmanager
 
 # --- para StaticFiles ---
 import os
+import signal
 from fastapi.staticfiles import StaticFiles
 # -----
 # Importar text para comandos SQL puros
@@ -22,13 +23,20 @@ from sqlalchemy import text
 # -----
 # Imports para search 
 
-from .search_engine import SearchEngine
+# O crud alimenta o índice incremental deste módulo, por isso o import relativo
+from . import search_engine as se_tfidf
 #from .search_engine_vector import SearchEngineVector
-import backend.app.search_engine_vector as se_vector
+# Import relativo: a busca híbrida lê a mesma instância global deste módulo
+from . import search_engine_vector as se_vector
+from .search_engine_vector_memory import SearchEngineVectorMemory
+from . import hybrid_search as hybrid
 # -----
 from .database import engine,  get_db, table_registry # Base,
 from . import models, security, schemas, crud
-from .routers import upload_router, empresa_router
+from .search_cache import search_cache
+from .search_metrics import SearchTrace, search_metrics
+from .index_rebuild import rebuild_coordinator
+from .routers import upload_router, empresa_router, search_router
 from .schemas import UserLogin
 
 
@@ -39,7 +47,49 @@ STATIC_DIR = "static"
 os.makedirs(STATIC_DIR, exist_ok=True)
 # ------
 
-search_engine_instance: Optional[SearchEngine] = None
+# Nº de resultados devolvidos pelos endpoints de busca (faz parte da chave do cache)
+SEARCH_RESULT_LIMIT = 5
+
+
+def correct_search_query(query: str, response: Response, trace: SearchTrace) -> str:
+    """
+    Corrige palavras fora do vocabulário do TF-IDF ("fintec" -> "fintech") antes da busca.
+    A query usada volta no header X-Search-Corrected-Query.
+    Se a correção falhar, a busca segue com a query original.
+    """
+    search_engine_instance = se_tfidf.search_engine_instance
+    if search_engine_instance is None:
+        return query
+    with trace.stage("correcao"):
+        try:
+            corrected, corrections = search_engine_instance.correct_query(query)
+        except Exception as e:
+            print(f"Aviso: correção da query '{query}' falhou: {e}")
+            return query
+    if corrections:
+        # A query corrigida já está normalizada (ASCII minúsculo): pode ir direto no header
+        response.headers["X-Search-Corrected-Query"] = corrected
+        trace.corrected_query = corrected
+        trace.corrections = corrections
+        trace.count("correcoes", len(corrections))
+    return corrected
+
+
+def finish_search(response: Response, trace: SearchTrace, results):
+    """
+    Fecha o trace da busca: header Server-Timing, agregados em search_metrics e,
+    com explain=true, o breakdown no corpo (nesse caso, sem 404 para resultado vazio).
+    """
+    response.headers["Server-Timing"] = trace.server_timing()
+    search_metrics.record(trace)
+    if trace.explain:
+        return {"resultados": results, "explain": trace.as_dict()}
+    if not results:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Nenhuma startup encontrada com a sua pesquisa."
+        )
+    return results
 
 def sync_database_sequences():
     """
@@ -82,7 +132,6 @@ def sync_database_sequences():
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global search_engine_instance
     
     # --- CORREÇÃO: INVERSÃO DE LÓGICA ---
     # Bloco 1: CRIAR as tabelas primeiro.
@@ -108,22 +157,31 @@ async def lifespan(app: FastAPI):
         nltk.download('rslp', quiet=True) 
         print("Recursos do NLTK prontos com sucesso!")
         
-        db = next(get_db())
-
-        # USANDO CRUD
-        all_companies_list = crud.get_all_empresas(db)
-        
-        # (Agora 'all_companies_list' será uma lista vazia [] caso não exista antes, 
-        # o que está correto)
-        
-        if all_companies_list:
-            search_engine_instance = SearchEngine(all_companies_list)
-            print("Índice TF-IDF criado com sucesso!")
+        # 1. Índice TF-IDF: mesmo caminho do rebuild em background
+        # (snapshot do banco numa sessão própria + troca do search_engine_instance)
+        if not rebuild_coordinator.rebuild("startup"):
+            raise RuntimeError(rebuild_coordinator.status["last_error"])
+        print("Índice TF-IDF criado com sucesso!")
+
+        # Rebuilds posteriores: agendado (SEARCH_INDEX_REBUILD_INTERVAL), SIGHUP ou POST /search/index/rebuild
+        rebuild_coordinator.start_schedule()
+        # Com SEARCH_INDEX_DIR: re-anexa quando outro worker publicar uma geração nova
+        rebuild_coordinator.start_generation_watch()
+        if hasattr(signal, "SIGHUP"):
+            try:
+                signal.signal(signal.SIGHUP, rebuild_coordinator.handle_signal)
+            except ValueError:
+                # signal.signal só funciona na thread principal
+                pass
+
+        # 2. Inicializa Motor Vetorial (VECTOR_SEARCH_BACKEND)
+        if se_vector.VECTOR_SEARCH_BACKEND == "memory":
+            # Matriz com todos os embeddings em memória (mantida pelo crud nas escritas)
+            se_vector.search_engine_vector_instance = SearchEngineVectorMemory.from_database()
+            print(f"Motor vetorial em memória: {len(se_vector.search_engine_vector_instance.row_by_id)} embeddings carregados.")
         else:
-            print("Banco de dados vazio, SearchEngine iniciado sem dados.")
-
-        # 2. Inicializa Motor Vetorial (Não precisa de carregar empresas agora)
-        se_vector.search_engine_vector_instance = se_vector.SearchEngineVector()
+            # pgvector: não precisa de carregar empresas agora
+            se_vector.search_engine_vector_instance = se_vector.SearchEngineVector()
         
         print("Motores de busca inicializados.")
 
@@ -143,6 +201,7 @@ app = FastAPI(title="API de Pesquisa de Startups", lifespan=lifespan)
 # --- Montar Roteadores ---
 app.include_router(upload_router.router, tags=["Uploads"])
 app.include_router(empresa_router.router)
+app.include_router(search_router.router)
 
 
 @app.post("/register", response_model=schemas.Token)
@@ -213,16 +272,20 @@ def list_all_companies(
     return results
 
 
-@app.get("/optimized_search", response_model=List[schemas.Empresa], status_code=status.HTTP_200_OK)
+@app.get("/optimized_search", response_model=Union[List[schemas.Empresa], schemas.SearchExplainResponse], status_code=status.HTTP_200_OK)
 def optimized_search_companies(
     query: str,
+    response: Response,
     fase: Optional[str] = None,
+    explain: bool = False, # breakdown por etapa e scores dos candidatos (ignora o cache)
+    db: Session = Depends(get_db), # hidratação do top-k por id
     current_user: schemas.User = Depends(security.get_current_user)
 ):
     """
     Search antigo, que cria a lista de empresas no cash.
     """
-    global search_engine_instance
+    # Referência local: as escritas podem trocar o índice no meio da busca
+    search_engine_instance = se_tfidf.search_engine_instance
     
     if search_engine_instance is None:
         raise HTTPException(
@@ -230,40 +293,109 @@ def optimized_search_companies(
              detail="O serviço de busca ainda não foi inicializado ou falhou ao carregar o índice."
         )
 
-    results = search_engine_instance.optimized_search(query=query, fase=fase)
-
-    if not results:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Nenhuma startup encontrada com a sua pesquisa."
-        )
-    
-    return results
-
-@app.get("/optimized_search_vector", response_model=List[schemas.Empresa], status_code=status.HTTP_200_OK)
+    trace = SearchTrace("tfidf", explain=explain)
+    query = correct_search_query(query, response, trace)
+    # Queries repetidas ("fintech", "agro"...) saem do cache sem re-rankear
+    cache_key = search_cache.make_key("tfidf", query, fase, SEARCH_RESULT_LIMIT)
+    # O índice só guarda id/fase/campos normalizados: as linhas completas vêm do banco numa consulta
+    load_companies = lambda ids: crud.get_empresas_by_ids(db, ids)
+    # Lida antes da busca: uma escrita concorrente impede gravar o resultado velho
+    generation = search_cache.generation
+    results = None
+    if not explain:
+        with trace.stage("cache"):
+            results = search_cache.get(cache_key, loader=load_companies)
+        trace.count("cache_hit", results is not None)
+    if results is None:
+        results = search_engine_instance.optimized_search(query=query, fase=fase, limit=SEARCH_RESULT_LIMIT, loader=load_companies, trace=trace)
+        results = search_cache.set(cache_key, results, generation=generation)
+
+    return finish_search(response, trace, results)
+
+@app.get("/optimized_search_vector", response_model=Union[List[schemas.Empresa], schemas.SearchExplainResponse], status_code=status.HTTP_200_OK)
 def optimized_search_companies_vector(
     query: str,
+    response: Response,
     fase: Optional[str] = None,
+    explain: bool = False, # breakdown por etapa e scores dos candidatos (ignora o cache)
+    ef_search: Optional[int] = Query(None, ge=1, le=1000), # HNSW: mais alto = mais recall, mais lento
+    probes: Optional[int] = Query(None, ge=1, le=1000), # IVFFlat: nº de listas visitadas
     db: Session = Depends(get_db), # <--- ADICIONADO: Necessário para a busca no banco
     current_user: schemas.User = Depends(security.get_current_user)
 ):
     """
     Search novo, que consulta a coluna embedding_vector no banco de dados.
+    ef_search/probes ajustam o índice ANN só nesta busca (sem cache).
     """
     if se_vector.search_engine_vector_instance is None:
         raise HTTPException(status_code=503, detail="Motor vetorial não disponível.")
 
-    # Passamos o 'db' para a função
-    results = se_vector.search_engine_vector_instance.optimized_search_vector(
-        db=db, query=query, fase=fase
-    )
-    if not results:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Nenhuma startup encontrada com a sua pesquisa."
+    trace = SearchTrace("vector", explain=explain)
+    query = correct_search_query(query, response, trace)
+    # Cache hit: nenhuma ida ao pgvector (empresas fora do cache por id vêm numa só consulta)
+    cache_key = search_cache.make_key("vector", query, fase, SEARCH_RESULT_LIMIT)
+    # Com parâmetros do índice ANN explícitos o resultado pode mudar: não usa o cache
+    use_cache = not explain and ef_search is None and probes is None
+    generation = search_cache.generation
+    results = None
+    if use_cache:
+        with trace.stage("cache"):
+            results = search_cache.get(cache_key, loader=lambda ids: crud.get_empresas_by_ids(db, ids))
+        trace.count("cache_hit", results is not None)
+    if results is None:
+        # Passamos o 'db' para a função
+        results = se_vector.search_engine_vector_instance.optimized_search_vector(
+            db=db, query=query, fase=fase, limit=SEARCH_RESULT_LIMIT, trace=trace,
+            ef_search=ef_search, probes=probes,
+            loader=lambda ids: crud.get_empresas_by_ids(db, ids)
         )
-    
-    return results
+        if use_cache:
+            results = search_cache.set(cache_key, results, generation=generation)
+
+    return finish_search(response, trace, results)
+
+@app.get("/hybrid_search", response_model=Union[List[schemas.Empresa], schemas.SearchExplainResponse], status_code=status.HTTP_200_OK)
+def hybrid_search_companies(
+    query: str,
+    response: Response,
+    fase: Optional[str] = None,
+    explain: bool = False, # breakdown por etapa (dos dois motores) e scores dos candidatos
+    db: Session = Depends(get_db),
+    current_user: schemas.User = Depends(security.get_current_user)
+):
+    """
+    Busca híbrida: TF-IDF (memória) e vetorial (pgvector) em paralelo,
+    fundidos por Reciprocal Rank Fusion.
+    Se um motor estourar o tempo (HYBRID_SEARCH_TIMEOUT) ou falhar, devolve o
+    resultado do outro e indica o motor ausente no header X-Search-Partial.
+    """
+    trace = SearchTrace("hybrid", explain=explain)
+    query = correct_search_query(query, response, trace)
+    load_companies = lambda ids: crud.get_empresas_by_ids(db, ids)
+    cache_key = search_cache.make_key("hybrid", query, fase, SEARCH_RESULT_LIMIT)
+    generation = search_cache.generation
+    results = None
+    if not explain:
+        with trace.stage("cache"):
+            results = search_cache.get(cache_key, loader=load_companies)
+        trace.count("cache_hit", results is not None)
+    if results is None:
+        ids, failed = hybrid.hybrid_search(query=query, fase=fase, limit=SEARCH_RESULT_LIMIT, trace=trace)
+        if len(failed) == 2:
+            search_metrics.record(trace)
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Nenhum motor de busca respondeu a tempo."
+            )
+        with trace.stage("hidratacao"):
+            results = load_companies(ids)
+        if failed:
+            # Resultado parcial não vai para o cache
+            response.headers["X-Search-Partial"] = ",".join(sorted(failed))
+        else:
+            results = search_cache.set(cache_key, results, generation=generation)
+
+    return finish_search(response, trace, results)
 
 # --- ADICIONADO: Montar o diretório estático ---
 
@@ -1,7 +1,7 @@
 from sqlalchemy import Column, Integer, String, Text, BigInteger
 from sqlalchemy.orm import Mapped, mapped_column, registry
 from sqlalchemy.types import Integer 
-from pgvector.sqlalchemy import Vector # importaçãopara lidar com vetores 
+from .vector_storage import column_type as embedding_column_type # vector, halfvec ou sparsevec (pgvector)
 #from .database import Base
 from .database import table_registry
 
@@ -55,7 +55,9 @@ class Empresa:
     link_video: Mapped[str | None] = mapped_column(String, nullable=True, default=None)
     telefone_contato: Mapped[str | None] = mapped_column(String(20), nullable=True, default=None)
     tag: Mapped[str | None] = mapped_column(String, nullable=True, default=None)
-    embedding_vector: Mapped[list[float] | None] = mapped_column(Vector(1024), nullable=True, default=None)
+    # Deferred: nenhuma leitura de Empresa traz o vetor (nem o converte) sem pedir;
+    # carregar com crud.get_empresa(..., with_embedding=True) / undefer(Empresa.embedding_vector)
+    embedding_vector: Mapped[list[float] | None] = mapped_column(embedding_column_type(), nullable=True, default=None, deferred=True, repr=False, compare=False)
 
 
 
@@ -0,0 +1,124 @@
+import threading
+from dataclasses import dataclass
+from typing import Optional, Sequence, Tuple
+import numpy as np
+from unidecode import unidecode
+from fuzzywuzzy import utils as fuzz_utils
+from rapidfuzz import process as rf_process, fuzz as rf_fuzz
+
+# --- CAMPOS NORMALIZADOS ---
+# Os dois motores de busca comparam a query (fuzzy) com o nome, o contexto
+# (solução + setores + tag) e a tag de cada candidato. Em vez de refazer
+# unidecode(...).lower() a cada busca, guardamos aqui, por id da empresa,
+# as strings já normalizadas.
+
+
+@dataclass(frozen=True, slots=True)
+class CamposNormalizados:
+    # Hash dos campos crus de origem: detecta se a empresa mudou sem guardar o texto original
+    origem: int
+    nome: str
+    contexto: str
+    tag: str
+
+
+def normalizar(texto) -> str:
+    """
+    unidecode + lowercase + o mesmo pré-processamento do fuzzywuzzy (full_process),
+    para que o fuzzy possa rodar com full_process=False.
+    """
+    return fuzz_utils.full_process(unidecode(f"{texto}").lower(), force_ascii=True)
+
+
+def _origem(company) -> int:
+    return hash((company.nome_da_empresa, company.solucao, company.setor_principal, company.setor_secundario, company.tag))
+
+
+def campos_da_empresa(company) -> CamposNormalizados:
+    return CamposNormalizados(
+        origem=_origem(company),
+        nome=normalizar(company.nome_da_empresa),
+        contexto=normalizar(f"{company.solucao} {company.setor_principal} {company.setor_secundario}{company.tag}"),
+        tag=normalizar(f"{company.tag}"),
+    )
+
+
+# --- RE-RANK FUZZY EM LOTE ---
+# A partir deste nº de comparações o cdist divide o trabalho entre todos os núcleos
+# (abaixo disso o custo de subir as threads não compensa).
+PARALLEL_MIN_PAIRS = 2000
+
+
+def batch_token_set_ratio(query_norm: str, choices: Sequence[str]) -> np.ndarray:
+    """
+    token_set_ratio da query contra cada string de `choices` (já normalizadas),
+    num único rapidfuzz.process.cdist: código compilado, sem o GIL e multi-núcleo
+    para lotes grandes. Mesmo score do fuzzywuzzy, sem o arredondamento para int.
+    """
+    if not choices:
+        return np.empty(0, dtype=np.float32)
+    workers = -1 if len(choices) >= PARALLEL_MIN_PAIRS else 1
+    return rf_process.cdist(
+        [query_norm], choices,
+        scorer=rf_fuzz.token_set_ratio, processor=None, workers=workers, dtype=np.float32,
+    )[0]
+
+
+class NormalizedFieldStore:
+    """
+    Campos normalizados por id da empresa.
+    Montado na indexação (SearchEngine) e atualizado pelo crud.py a cada escrita.
+    """
+    def __init__(self):
+        self._campos = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._campos)
+
+    def refresh(self, company) -> CamposNormalizados:
+        """
+        (Re)calcula os campos de uma empresa. Se os campos crus não mudaram,
+        reaproveita o que já está guardado.
+        """
+        campos = self._campos.get(company.id)
+        if campos is not None and campos.origem == _origem(company):
+            return campos
+        campos = campos_da_empresa(company)
+        with self._lock:
+            self._campos[company.id] = campos
+        return campos
+
+    def get(self, company) -> CamposNormalizados:
+        # O refresh já devolve o valor guardado quando a empresa não mudou
+        return self.refresh(company)
+
+    def get_by_id(self, company_id: int) -> Optional[CamposNormalizados]:
+        return self._campos.get(company_id)
+
+    def bulk_load(self, companies):
+        for company in companies:
+            self.refresh(company)
+
+    def remove(self, company_id: int):
+        with self._lock:
+            self._campos.pop(company_id, None)
+
+    def fuzzy_scores(self, query: str, company_ids: Sequence[int]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Re-rank em lote: scores fuzzy de nome, contexto e tag (arrays NumPy alinhados
+        com `company_ids`). Os três campos vão num único cdist. Ids sem campos
+        guardados pontuam 0.
+        """
+        vazio = CamposNormalizados(0, "", "", "")
+        campos = [self._campos.get(company_id, vazio) for company_id in company_ids]
+        n = len(campos)
+
+        choices = [c.nome for c in campos] + [c.contexto for c in campos] + [c.tag for c in campos]
+        scores = batch_token_set_ratio(normalizar(query), choices)
+        return scores[:n], scores[n:2 * n], scores[2 * n:]
+
+
+# --- Variável Global Singleton ---
+# Store compartilhado pelo SearchEngine do lifespan, pelo SearchEngineVector e pelo crud.py
+normalized_store = NormalizedFieldStore()
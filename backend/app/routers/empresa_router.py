@@ -1,9 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Response
+from fastapi import APIRouter, Depends, HTTPException, status, Response, Query
 from sqlalchemy.orm import Session
 from typing import List, Optional
 
 
-from .. import crud, schemas, models
+from .. import crud, schemas, models, autocomplete
 from ..database import get_db
 from ..security import get_current_user
 
@@ -47,6 +47,21 @@ def list_all_companies(
     """
     return crud.get_all_empresas(db)
 
+# --- (Autocomplete) ---
+# Declarado antes de "/{empresa_id}" para não ser capturado por ele
+@router.get("/autocomplete", response_model=List[schemas.AutocompleteSuggestion], status_code=status.HTTP_200_OK)
+def autocomplete_empresas(
+    prefix: str = Query(..., min_length=1),
+    fase: Optional[str] = None,
+    limit: int = Query(10, ge=1, le=50),
+    #current_user: schemas.User = Depends(get_current_user)
+):
+    """
+    Sugestões para a caixa de busca (nome, setor principal e tag) a partir do prefixo digitado.
+    Servido do índice de prefixos em memória: não passa pelo TF-IDF nem pelo banco.
+    """
+    return autocomplete.autocomplete_index.suggest(prefix, fase=fase, limit=limit)
+
 # --- (Read One) ---
 @router.get("/{empresa_id}", response_model=schemas.Empresa)
 def get_single_empresa(
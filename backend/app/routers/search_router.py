@@ -0,0 +1,95 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+from typing import Dict, List
+
+from .. import schemas, crud
+from .. import search_engine as se_tfidf
+from ..database import get_db
+from ..search_cache import search_cache
+from ..search_metrics import search_metrics
+from ..index_rebuild import rebuild_coordinator
+from ..security import get_current_user
+
+router = APIRouter(
+    prefix="/search",  # Rotas de operação dos motores de busca
+    tags=["Busca"]
+)
+
+
+# --- Busca em lote ---
+
+@router.post("/batch", response_model=Dict[str, List[schemas.Empresa]], status_code=status.HTTP_200_OK)
+def batch_search(
+    request: schemas.SearchBatchRequest,
+    db: Session = Depends(get_db),
+    current_user: schemas.User = Depends(get_current_user)
+):
+    """
+    Várias buscas TF-IDF numa chamada: as queries são vetorizadas juntas e pontuadas
+    por um único produto esparso (em blocos), e as empresas de todos os resultados
+    vêm do banco numa consulta só. Retorna {query: empresas} (queries repetidas aparecem uma vez).
+    """
+    # Referência local: um rebuild pode trocar o índice no meio da busca
+    search_engine_instance = se_tfidf.search_engine_instance
+    if search_engine_instance is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="O serviço de busca ainda não foi inicializado ou falhou ao carregar o índice."
+        )
+
+    return search_engine_instance.search_many(
+        request.queries,
+        fase=request.fase,
+        limit=request.limit,
+        loader=lambda ids: crud.get_empresas_by_ids(db, ids),
+    )
+
+
+# --- Cache de resultados ---
+
+@router.get("/cache/stats", response_model=schemas.SearchCacheStats, status_code=status.HTTP_200_OK)
+def read_search_cache_stats(
+    current_user: schemas.User = Depends(get_current_user)
+):
+    """
+    Contadores de hit, miss e eviction do cache de resultados e do cache de empresas por id.
+    """
+    return search_cache.stats()
+
+
+# --- Métricas dos motores ---
+
+@router.get("/metrics", response_model=Dict[str, schemas.EngineMetrics], status_code=status.HTTP_200_OK)
+def read_search_metrics(
+    current_user: schemas.User = Depends(get_current_user)
+):
+    """
+    Agregados por motor (tfidf, vector, hybrid) desde o arranque do processo: nº de buscas,
+    tempo total/médio/máximo de cada etapa e contadores (candidatos, cortes por limiar, cache hits).
+    """
+    return search_metrics.snapshot()
+
+
+# --- Rebuild do índice TF-IDF ---
+
+@router.post("/index/rebuild", response_model=schemas.SearchIndexStatus, status_code=status.HTTP_202_ACCEPTED)
+def trigger_search_index_rebuild(
+    current_user: schemas.User = Depends(get_current_user)
+):
+    """
+    Dispara um rebuild completo do índice TF-IDF em background.
+    As buscas continuam no índice atual até a troca. Se já houver um rebuild
+    em andamento, nenhum outro é iniciado.
+    """
+    rebuild_coordinator.trigger("endpoint")
+    return rebuild_coordinator.status
+
+
+@router.get("/index/status", response_model=schemas.SearchIndexStatus, status_code=status.HTTP_200_OK)
+def read_search_index_status(
+    current_user: schemas.User = Depends(get_current_user)
+):
+    """
+    Estado do último rebuild: duração, tamanho do corpus e escritas re-aplicadas.
+    """
+    return rebuild_coordinator.status
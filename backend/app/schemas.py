@@ -1,6 +1,7 @@
 from pydantic import BaseModel, Field, EmailStr, field_validator, HttpUrl, constr,  AnyHttpUrl,ConfigDict
 import re
-from typing import Optional
+from typing import Optional, List, Dict, Any
+from datetime import datetime
 
 
 # -----------schemas para USERS ----------
@@ -300,4 +301,85 @@ class EmpresaUpdate(BaseModel):
         return Empresa.validate_telefone(v)
     
 
-    # re-utilizando os métodos definidos na classe Empresa.
\ No newline at end of file
+    # re-utilizando os métodos definidos na classe Empresa.
+
+# --- Schemas de operação da busca ---
+
+class CacheStats(BaseModel):
+    """Contadores de um cache LRU+TTL"""
+    hits: int
+    misses: int
+    evictions: int
+    expirations: int
+    size: int
+    maxsize: int
+
+
+class SearchCacheStats(BaseModel):
+    """Schema para GET /search/cache/stats"""
+    resultados: CacheStats
+    empresas: CacheStats
+
+
+class SearchIndexStatus(BaseModel):
+    """Schema para POST /search/index/rebuild e GET /search/index/status"""
+    state: str
+    trigger: Optional[str] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    duration_seconds: Optional[float] = None
+    corpus_size: Optional[int] = None
+    source: Optional[str] = None
+    generation: Optional[str] = None
+    replayed_writes: Optional[int] = None
+    builds: int
+    last_error: Optional[str] = None
+
+
+class SearchExplain(BaseModel):
+    """Breakdown de uma busca (explain=true): tempos por etapa, contadores e scores dos candidatos"""
+    motor: str
+    etapas_ms: Dict[str, float]
+    contadores: Dict[str, int]
+    candidatos: List[Dict[str, Any]]
+    consulta_corrigida: Optional[str] = None  # query usada depois da correção de digitação
+    correcoes: Dict[str, str] = {}  # palavra digitada -> palavra usada
+    motores: Dict[str, "SearchExplain"] = {}  # motores internos (busca híbrida)
+
+
+class SearchExplainResponse(BaseModel):
+    """Resposta dos endpoints de busca com explain=true"""
+    resultados: List[Empresa]
+    explain: SearchExplain
+
+
+class StageMetrics(BaseModel):
+    count: int
+    total_ms: float
+    avg_ms: float
+    max_ms: float
+
+
+class EngineMetrics(BaseModel):
+    """Schema para GET /search/metrics (um por motor)"""
+    requests: int
+    stages: Dict[str, StageMetrics]
+    counters: Dict[str, int]
+
+
+# Limite de queries por chamada do /search/batch (a memória do produto esparso cresce com o lote)
+SEARCH_BATCH_MAX_QUERIES = 500
+
+
+class SearchBatchRequest(BaseModel):
+    """Schema para POST /search/batch"""
+    queries: List[str] = Field(min_length=1, max_length=SEARCH_BATCH_MAX_QUERIES)
+    fase: Optional[str] = None
+    limit: int = Field(default=5, ge=1, le=50)
+
+
+class AutocompleteSuggestion(BaseModel):
+    """Schema para GET /empresa/autocomplete"""
+    texto: str
+    campo: str  # nome_da_empresa, setor_principal ou tag
+    empresa_id: Optional[int] = None  # só para sugestões de nome
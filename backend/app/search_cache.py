@@ -0,0 +1,180 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, List, Optional, Sequence
+
+from . import schemas
+from .normalized_fields import normalizar
+
+# --- CACHE DE RESULTADOS DE BUSCA ---
+# Poucas centenas de queries ("fintech", "agro", "saude"...) dominam o tráfego.
+# Guardamos só a lista de ids de cada resultado; as empresas são hidratadas
+# de um cache por id. O crud.py invalida as entradas a cada escrita.
+# Uma busca que começou antes de uma escrita pode terminar depois dela: a geração
+# (incrementada a cada invalidação) é lida antes da busca e, se mudou, o resultado
+# antigo não é gravado.
+# Obs: com vários workers cada processo tem o seu cache; o TTL limita o tempo
+# que uma escrita feita em outro worker pode ficar invisível.
+
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "1024"))
+SEARCH_CACHE_COMPANY_SIZE = int(os.getenv("SEARCH_CACHE_COMPANY_SIZE", "4096"))
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "300"))
+
+
+class LRUTTLCache:
+    """
+    Cache LRU limitado por tamanho, com expiração (TTL) por entrada.
+    """
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            value, expires_at = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key: Hashable):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+        }
+
+
+class SearchCache:
+    """
+    Resultados (lista de ids) por (motor, query normalizada, fase, limit)
+    + snapshot de cada empresa por id para a hidratação.
+    """
+    def __init__(self, maxsize: int = SEARCH_CACHE_SIZE, company_maxsize: int = SEARCH_CACHE_COMPANY_SIZE, ttl: float = SEARCH_CACHE_TTL):
+        self.results = LRUTTLCache(maxsize, ttl)
+        self.companies = LRUTTLCache(company_maxsize, ttl)
+        self.generation = 0
+        # Serializa set() e invalidate(): a checagem da geração e a gravação são atômicas
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(engine: str, query: str, fase: Optional[str], limit: int) -> tuple:
+        return (engine, normalizar(query), fase, limit)
+
+    def get(self, key: tuple, loader: Optional[Callable[[List[int]], Sequence[Any]]] = None) -> Optional[list]:
+        """
+        Devolve as empresas do resultado em cache (na ordem original) ou None.
+        Empresas que saíram do cache por id são carregadas com `loader(ids)`
+        numa única consulta; sem loader, a falta conta como miss. Se houver uma
+        invalidação durante o loader, o que foi lido responde o request mas não
+        volta para o cache.
+        """
+        generation = self.generation
+        ids = self.results.get(key)
+        if ids is None:
+            return None
+
+        found = {}
+        missing = []
+        for company_id in ids:
+            company = self.companies.get(company_id)
+            if company is None:
+                missing.append(company_id)
+            else:
+                found[company_id] = company
+
+        if missing:
+            if loader is None:
+                return None
+            loaded = [self._snapshot(company) for company in loader(missing)]
+            with self._lock:
+                if generation == self.generation:
+                    for snapshot in loaded:
+                        self.companies.set(snapshot.id, snapshot)
+            for snapshot in loaded:
+                found[snapshot.id] = snapshot
+            if any(company_id not in found for company_id in ids):
+                # Alguma empresa sumiu do banco: o resultado não vale mais
+                self.results.pop(key)
+                return None
+
+        return [found[company_id] for company_id in ids]
+
+    def set(self, key: tuple, companies: Sequence[Any], generation: Optional[int] = None) -> list:
+        """
+        Guarda o resultado e devolve os snapshots das empresas (para responder já).
+        `generation` é o valor de `self.generation` lido antes da busca: se houve
+        uma invalidação desde então, o resultado pode estar velho e não é gravado.
+        """
+        snapshots = [self._snapshot(company) for company in companies]
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return snapshots
+            for snapshot in snapshots:
+                self.companies.set(snapshot.id, snapshot)
+            self.results.set(key, tuple(company.id for company in snapshots))
+        return snapshots
+
+    @staticmethod
+    def _snapshot(company) -> schemas.Empresa:
+        # Snapshot imutável: não depende da sessão do SQLAlchemy que carregou o objeto
+        return company if isinstance(company, schemas.Empresa) else schemas.Empresa.model_validate(company, from_attributes=True)
+
+    def invalidate(self, company_id: int, search_relevant: bool = True):
+        """
+        Chamado pelo crud.py. Se um campo que afeta a busca mudou (textos, fase,
+        criação ou remoção), qualquer resultado pode ter mudado: limpa todos.
+        Caso contrário (ex: telefone), só o snapshot daquela empresa é descartado.
+        Nos dois casos a geração avança: buscas em andamento não gravam o que leram.
+        """
+        with self._lock:
+            self.generation += 1
+            self.companies.pop(company_id)
+            if search_relevant:
+                self.results.clear()
+
+    def stats(self) -> dict:
+        return {"resultados": self.results.stats(), "empresas": self.companies.stats()}
+
+
+# --- Variável Global Singleton ---
+search_cache = SearchCache()
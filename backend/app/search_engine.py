@@ -1,140 +1,760 @@
-import nltk
 from unidecode import unidecode
-from nltk.corpus import stopwords
-from nltk.tokenize import wordpunct_tokenize
-#from nltk.stem import RSLPStemmer 
-from nltk.stem import SnowballStemmer
 
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-from typing import List, Any
-from fuzzywuzzy import fuzz
-import inspect
+from scipy import sparse
+from typing import Callable, List, Any, Optional, Sequence
+from dataclasses import dataclass
+from datetime import datetime, timezone
+import numpy as np
+import threading
+import hashlib
+import json
+import os
 
 # Importações internas
-from . import crud, embedding_service
-from .models import Empresa
-
-try:
-    nltk.download('punkt', quiet=True)
-    nltk.download('stopwords', quiet=True)
-#    nltk.download('rslp', quiet=True)
-except Exception:
-    pass
-
-
-def initialize_nlp_resources():
-    global stemmer, stop_words_pt
-    try:
-        stemmer = SnowballStemmer("portuguese")
-        #stemmer = RSLPStemmer()
-        stop_words_pt = set(stopwords.words('portuguese'))
-    except LookupError:
-        #nltk.download('rslp', quiet=True)
-        stemmer = SnowballStemmer("portuguese")
-        #stemmer = RSLPStemmer()
-        stop_words_pt = set(stopwords.words('portuguese'))
-    
-    # STOP WORDS:
-    CORP_AND_COMMON_STOP_WORDS = {'empresa', 'ltda', 's.a', 'eireli', 'companhia', 'solucoes', 'inovacao', 'tecnologia', 'group', 'grupo', 'de', 'a', 'o', 'e', 'do', 'da', 'dos', 'as', 'os', 
-        'um', 'uma', 'uns', 'umas', 'para', 'na', 'no', 'em', 'por', 'foco', ',','quer', 'busco', 'ramo', 'com', 'eu', 'tu', 'ele', 'ela', 'documento', 'fazer', 'quero', 'um', 'peca', 'faz', 'que'}
-    stop_words_pt.update(CORP_AND_COMMON_STOP_WORDS)
-    
-initialize_nlp_resources()
-
-def custom_tokenizer(text):
-    # 1. Normalização
-    text = unidecode(text).lower()
-    # 2. Tokenização
-    tokens = wordpunct_tokenize(text)
-    final_tokens = []
-    # 3. Filtragem e Stemming
-    for t in tokens:
-        # 3.1. Remover Stop Words e Palavras monossilábicas
-        if t in stop_words_pt or len(t) <= 1:
-            continue
-        # 3.2. Stemming (Redução à Raiz)
-        if t.isalpha():
-            final_tokens.append(stemmer.stem(t))
-        # 3.3. Números e Códigos
-        #alfanumérico (ex: "3d", "xpto1"), mantemos como está.
-        elif t.isalnum(): 
-            final_tokens.append(t)
-    # 4. Retorno limpo e "stemizado"
-    return final_tokens
+# (o crud NÃO é importado aqui: é o crud que alimenta o índice incremental)
+from .normalized_fields import NormalizedFieldStore
+# Tokenizador compartilhado com o embedding_service (stemming memoizado)
+from .tokenizer import custom_tokenizer, build_stem_dictionary, register_surface_forms, surface_forms
+from .search_metrics import NO_TRACE
+from .spelling import QueryCorrector
+
+# --- Variável Global Singleton ---
+# Instância usada pelo endpoint /optimized_search e alimentada pelo crud.py
+search_engine_instance = None
+
+def company_search_text(company) -> str:
+    """
+    Texto indexado pelo TF-IDF para uma empresa (todos os campos de busca).
+    """
+    return unidecode(f"{company.nome_da_empresa} {company.solucao} {company.setor_principal} {company.setor_secundario}{company.tag}").lower()
+
+
+def _hash_text(text: str) -> int:
+    return int.from_bytes(hashlib.sha1(text.encode("utf-8")).digest()[:8], "little")
+
+
+def text_hash(company) -> int:
+    """
+    Hash (64 bits) do texto indexado de uma empresa: detecta linhas alteradas no snapshot em disco.
+    """
+    return _hash_text(company_search_text(company))
+
+
+def _with_width(matrix, width: int):
+    """
+    A mesma matriz CSR com `width` colunas (colunas novas do vocabulário ficam
+    vazias). Não copia os arrays: a matriz base pode continuar mapeada em memória.
+    """
+    if matrix.shape[1] >= width:
+        return matrix
+    return sparse.csr_matrix((matrix.data, matrix.indices, matrix.indptr), shape=(matrix.shape[0], width), copy=False)
+
+
+def _fitted_vectorizer(vocabulary: dict, idf, ngram_range) -> TfidfVectorizer:
+    """
+    TfidfVectorizer pronto para transform() a partir de um vocabulário e IDF já
+    calculados (snapshot em disco ou vocabulário estendido), sem fit. O nº de
+    colunas vem do próprio vocabulário: o setter de idf_ confere os tamanhos.
+    """
+    vectorizer = TfidfVectorizer(tokenizer=custom_tokenizer, ngram_range=ngram_range, token_pattern=None)
+    vectorizer.vocabulary_ = vocabulary
+    vectorizer.idf_ = idf
+    return vectorizer
+
+
+@dataclass(frozen=True, slots=True)
+class CompanyRecord:
+    """
+    Resultado não hidratado: só o que o índice guarda de cada empresa.
+    """
+    id: int
+    fase_da_startup: Optional[str]
+
+
+def corpus_fingerprint(companies: List[Any]) -> dict:
+    """
+    Identifica o corpus indexado: nº de linhas, maior id e checksum dos textos de busca.
+    Decide se o snapshot em disco (SearchEngine.save) ainda vale para o banco atual.
+    """
+    checksum = hashlib.sha1()
+    for company in sorted(companies, key=lambda c: c.id):
+        checksum.update(f"{company.id}\x1f{company_search_text(company)}\x1e".encode("utf-8"))
+    return {
+        "rows": len(companies),
+        "max_id": max((c.id for c in companies), default=None),
+        "checksum": checksum.hexdigest(),
+    }
 
 
 class SearchEngine:
     """
     Motor de Busca Antigo .
     Usa cache de memória.
+
+    O índice não guarda as linhas do banco: só colunas NumPy por linha (id, fase
+    como código categórico, hash do texto) e os campos normalizados do fuzzy
+    (NormalizedFieldStore). As linhas completas são hidratadas por id, numa
+    única consulta, só para o top-k final (ver `loader` em optimized_search).
+
+    O índice é incremental: o crud.py chama add_company / update_company /
+    remove_company a cada escrita. As linhas novas vão para um bloco delta
+    (matriz CSR pequena) em vez de re-copiar a matriz base, que pode estar
+    mapeada do disco. Linhas removidas ou substituídas viram "tombstones" e são
+    descartadas pela compactação (que também funde o delta na base), que roda
+    em background quando a proporção de tombstones ou de linhas delta fica alta.
+    Termos novos entram no vocabulário na hora; o IDF dos termos antigos
+    fica congelado desde o fit.
     """
-    def __init__(self, all_companies_list: List[Any]):
-        self.all_companies_list = all_companies_list
+    # Proporção de linhas mortas (tombstones) que dispara a compactação
+    COMPACTION_RATIO = 0.25
+    # Quantos candidatos (por TF-IDF) seguem para o fuzzy: max(limit * fator, mínimo)
+    CANDIDATE_POOL_FACTOR = 10
+    MIN_CANDIDATE_POOL = 50
+    # Corte mínimo do cosseno TF-IDF e do score final
+    RELEVANCE_THRESHOLD = 0.015
+    FINAL_SCORE_THRESHOLD = 70.0
+
+    def __init__(self, all_companies_list: List[Any], field_store: Optional[NormalizedFieldStore] = None, warn_if_empty: bool = True):
+        # warn_if_empty=False: instância vazia que vai receber um snapshot do disco (load)
+        # Nome/contexto normalizados para o fuzzy (o lifespan passa o store global)
+        self.field_store = field_store if field_store is not None else NormalizedFieldStore()
         self.tfidf_vectorizer = None
-        self.company_vectors = None # sera inserido no db 
+        # Matriz base (CSR) do último build/compactação e bloco delta com as linhas
+        # adicionadas depois dele (a linha i do delta é a linha base.shape[0] + i)
+        self.base_vectors = None # sera inserido no db 
+        self.delta_vectors = None
+        # Listas invertidas: a matriz base em CSC (coluna = termo -> linhas com o termo)
+        # e, para as linhas do bloco delta, um dict termo -> linhas
+        self.postings = None
+        self.delta_postings = {}
+        # id da empresa -> linha viva na matriz
+        self.row_by_id = {}
+        # Colunas NumPy por linha: id, hash do texto indexado e código categórico da fase
+        self.ids = np.empty(0, dtype=np.int64)
+        self.row_hashes = np.empty(0, dtype=np.uint64)
+        self.tombstones = np.zeros(0, dtype=bool)
+        self.phase_codes_by_name = {}
+        self.phase_names = []
+        self.phase_codes = np.zeros(0, dtype=np.int32)
+
+        # As escritas trocam as referências (copy-on-write) sob o lock;
+        # as buscas só pegam um snapshot consistente delas.
+        self._lock = threading.RLock()
+        self._version = 0
+        self._compaction_thread = None
+        # Índice de correção de digitação (montado sob demanda para o vocabulário atual)
+        self._corrector = None
+        self._corrector_lock = threading.Lock()
         
-        if self.all_companies_list:
-            # --- 1. INDEXAÇÃO ---
-            company_texts = [
-                unidecode(f"{c.nome_da_empresa} {c.solucao} {c.setor_principal} {c.setor_secundario}{c.tag}").lower()
-                for c in self.all_companies_list
-            ]
-            
-            self.tfidf_vectorizer = TfidfVectorizer(tokenizer=custom_tokenizer, ngram_range=(1, 2),token_pattern=None)
-            self.company_vectors = self.tfidf_vectorizer.fit_transform(company_texts)
-        else:
+        if all_companies_list:
+            self._fit(all_companies_list)
+        elif warn_if_empty:
              print("Aviso: SearchEngine inicializado sem dados.")
 
-    def optimized_search(self, query: str, fase: str = None, limit: int = 5):
-        if self.tfidf_vectorizer is None or self.company_vectors is None:
-            return []
+    def _fit(self, companies: List[Any]):
+        # --- 1. INDEXAÇÃO ---
+        company_texts = [company_search_text(c) for c in companies]
+        # Cada palavra distinta do corpus é "stemizada" uma única vez
+        build_stem_dictionary(company_texts)
 
-        normalized_query = unidecode(query).lower()
-        # --- 2. BUSCA TF-IDF ( em todas as informações da empressa)
-        query_vector = self.tfidf_vectorizer.transform([normalized_query])
-        cosine_scores = cosine_similarity(query_vector, self.company_vectors).flatten() # mudar o copany vectors para a ultima coluna 
-        
-        scored_companies = []
-        RELEVANCE_THRESHOLD = 0.015
+        tfidf_vectorizer = TfidfVectorizer(tokenizer=custom_tokenizer, ngram_range=(1, 2),token_pattern=None)
+        company_vectors = tfidf_vectorizer.fit_transform(company_texts)
 
-        for i, score in enumerate(cosine_scores):
-            company = self.all_companies_list[i]
-            
-            if score < RELEVANCE_THRESHOLD: 
-                continue
-                
-            if fase and company.fase_da_startup != fase:
+        n = len(companies)
+        ids = np.fromiter((c.id for c in companies), dtype=np.int64, count=n)
+        row_hashes = np.fromiter((_hash_text(t) for t in company_texts), dtype=np.uint64, count=n)
+        self.field_store.bulk_load(companies)
+        self._set_index(ids, row_hashes, companies, tfidf_vectorizer, company_vectors, company_vectors.tocsc())
+
+    def _set_index(self, ids, row_hashes, companies: Sequence[Any], tfidf_vectorizer, company_vectors, postings):
+        """
+        Estado completo de um índice recém construído (fit ou carregado do disco).
+        `companies` é alinhado com as linhas: None marca uma linha morta
+        (empresa removida do banco depois do snapshot), que já nasce tombstone.
+        Das empresas só a fase é lida; nenhuma referência a elas é guardada.
+        """
+        self.tfidf_vectorizer = tfidf_vectorizer
+        self.base_vectors = company_vectors
+        self.delta_vectors = sparse.csr_matrix((0, company_vectors.shape[1]))
+        self.postings = postings
+        self.delta_postings = {}
+        n = len(ids)
+        self.ids = ids
+        self.row_hashes = row_hashes
+        self.tombstones = np.fromiter((c is None for c in companies), dtype=bool, count=n)
+        self.phase_codes = np.fromiter((self._phase_code(c.fase_da_startup) if c is not None else -1 for c in companies), dtype=np.int32, count=n)
+        self.row_by_id = {company_id: i for i, (company_id, c) in enumerate(zip(ids.tolist(), companies)) if c is not None}
+        # Vocabulário novo: o índice de correção é refeito na próxima consulta
+        self._corrector = None
+
+    @property
+    def company_vectors(self):
+        """
+        Matriz completa (base + delta), na ordem das linhas. Com linhas delta
+        ela é montada (cópia) a cada acesso: as buscas usam base e delta separados.
+        """
+        with self._lock:
+            base, delta = self.base_vectors, self.delta_vectors
+        if base is None or delta.shape[0] == 0:
+            return base
+        width = max(base.shape[1], delta.shape[1])
+        return sparse.vstack([_with_width(base, width), _with_width(delta, width)], format="csr")
+
+    # --- SNAPSHOT EM DISCO ---
+    # Um diretório com vocabulário, IDF, arrays da matriz CSR e das listas
+    # invertidas (CSC), ids das linhas, a palavra do corpus de cada radical
+    # (para o corretor escrever palavras reais) e um manifest com a versão do formato
+    # e o fingerprint do corpus. O manifest é escrito por último: sem ele
+    # (ou com fingerprint diferente) o snapshot é ignorado.
+    SNAPSHOT_FORMAT_VERSION = 3
+    SNAPSHOT_ARRAYS = ("vectors_data", "vectors_indices", "vectors_indptr", "postings_data", "postings_indices", "postings_indptr", "ids", "row_hashes", "idf")
+
+    def save(self, directory: str, fingerprint: dict):
+        """
+        Grava o índice em `directory` (o carregamento via load() não refaz o fit).
+        """
+        with self._lock:
+            if self.tombstones.any() or self.delta_vectors.shape[0]:
+                self.compact()
+            vectorizer = self.tfidf_vectorizer
+            company_vectors = self.base_vectors
+            postings = self.postings
+            ids = self.ids
+            row_hashes = self.row_hashes
+
+        os.makedirs(directory, exist_ok=True)
+        manifest_path = os.path.join(directory, "manifest.json")
+        if os.path.exists(manifest_path):
+            os.remove(manifest_path)
+
+        arrays = {
+            "vectors_data": company_vectors.data,
+            "vectors_indices": company_vectors.indices,
+            "vectors_indptr": company_vectors.indptr,
+            "postings_data": postings.data,
+            "postings_indices": postings.indices,
+            "postings_indptr": postings.indptr,
+            "ids": ids,
+            "row_hashes": row_hashes,
+            "idf": vectorizer.idf_,
+        }
+        for name, array in arrays.items():
+            tmp_path = os.path.join(directory, f".{name}.npy.tmp")
+            with open(tmp_path, "wb") as f:
+                np.save(f, np.ascontiguousarray(array))
+            os.replace(tmp_path, os.path.join(directory, f"{name}.npy"))
+
+        self._write_json(os.path.join(directory, "vocabulary.json"), {term: int(i) for term, i in vectorizer.vocabulary_.items()})
+        vocabulary = vectorizer.vocabulary_
+        self._write_json(os.path.join(directory, "surface_forms.json"), {
+            stemmed: word for stemmed, word in surface_forms().items() if stemmed in vocabulary
+        })
+        self._write_json(manifest_path, {
+            "format_version": self.SNAPSHOT_FORMAT_VERSION,
+            "fingerprint": fingerprint,
+            "shape": list(company_vectors.shape),
+            "ngram_range": list(vectorizer.ngram_range),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+        })
+
+    @staticmethod
+    def _write_json(path: str, data):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, directory: str, companies: List[Any], fingerprint: Optional[dict] = None, field_store: Optional[NormalizedFieldStore] = None):
+        """
+        Carrega o índice gravado por save() sem refazer o fit. Os arrays grandes
+        são mapeados em memória (np.load com mmap_mode='r'): vários processos
+        que carregam o mesmo diretório compartilham as mesmas páginas físicas.
+
+        Com `fingerprint`, só aceita um snapshot do mesmo corpus (senão retorna None):
+        as linhas são casadas com `companies` só pelo id, sem conferir o hash de cada uma.
+        Sem ele, o snapshot é reconciliado com `companies` pelo hash de cada linha:
+        empresas novas ou alteradas entram juntas no bloco delta (os arrays da
+        base continuam mapeados) e as removidas viram tombstone.
+        Retorna None se não houver snapshot.
+        """
+        manifest_path = os.path.join(directory, "manifest.json")
+        if not os.path.exists(manifest_path):
+            return None
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("format_version") != cls.SNAPSHOT_FORMAT_VERSION:
+            return None
+        if fingerprint is not None and manifest.get("fingerprint") != fingerprint:
+            return None
+
+        arrays = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r") for name in cls.SNAPSHOT_ARRAYS}
+        with open(os.path.join(directory, "vocabulary.json"), encoding="utf-8") as f:
+            vocabulary = json.load(f)
+        with open(os.path.join(directory, "surface_forms.json"), encoding="utf-8") as f:
+            register_surface_forms(json.load(f))
+
+        by_id = {c.id: c for c in companies}
+        if fingerprint is not None:
+            # Mesmo corpus (fingerprint confere): nenhuma linha mudou desde o snapshot
+            ordered = [by_id.get(i) for i in arrays["ids"].tolist()]
+        else:
+            # Linhas cujo texto mudou depois do snapshot: tratadas como removidas e re-adicionadas
+            ordered = [
+                by_id[i] if i in by_id and text_hash(by_id[i]) == int(h) else None
+                for i, h in zip(arrays["ids"].tolist(), arrays["row_hashes"])
+            ]
+        shape = tuple(manifest["shape"])
+
+        tfidf_vectorizer = _fitted_vectorizer(vocabulary, np.asarray(arrays["idf"]), tuple(manifest["ngram_range"]))
+
+        company_vectors = sparse.csr_matrix((arrays["vectors_data"], arrays["vectors_indices"], arrays["vectors_indptr"]), shape=shape, copy=False)
+        postings = sparse.csc_matrix((arrays["postings_data"], arrays["postings_indices"], arrays["postings_indptr"]), shape=shape, copy=False)
+
+        engine = cls([], field_store=field_store, warn_if_empty=False)
+        engine.field_store.bulk_load(c for c in ordered if c is not None)
+        engine._set_index(arrays["ids"], arrays["row_hashes"], ordered, tfidf_vectorizer, company_vectors, postings)
+
+        engine.add_companies([company for company in companies if company.id not in engine.row_by_id])
+        return engine
+
+    def _phase_code(self, fase) -> int:
+        # Código categórico estável para cada valor de fase_da_startup
+        code = self.phase_codes_by_name.get(fase)
+        if code is None:
+            code = self.phase_codes_by_name[fase] = len(self.phase_names)
+            self.phase_names.append(fase)
+        return code
+
+    # --- MANUTENÇÃO INCREMENTAL DO ÍNDICE ---
+
+    def add_company(self, company):
+        """
+        Adiciona (ou substitui, se o id já existir) a linha de uma empresa no índice.
+        """
+        self.add_companies([company])
+
+    def add_companies(self, companies: List[Any]):
+        """
+        Adiciona (ou substitui) várias empresas de uma vez: um único transform e
+        um único vstack no bloco delta. A matriz base não é copiada.
+        """
+        if not companies:
+            return
+        if self.tfidf_vectorizer is None:
+            # Índice vazio: os primeiros documentos definem o vocabulário
+            with self._lock:
+                self._fit(companies)
+                self._version += 1
+            return
+        texts = [company_search_text(company) for company in companies]
+        # Palavras novas também ganham forma de superfície para o corretor
+        build_stem_dictionary(texts)
+        for company in companies:
+            self.field_store.refresh(company)
+
+        with self._lock:
+            self._extend_vocabulary(texts)
+            new_vectors = self.tfidf_vectorizer.transform(texts)
+            # Colunas novas do vocabulário ficam vazias nas linhas antigas do delta
+            delta_vectors = _with_width(self.delta_vectors, new_vectors.shape[1])
+            self.delta_vectors = sparse.vstack([delta_vectors, new_vectors], format="csr")
+
+            first_row = len(self.ids)
+            tombstones = np.append(self.tombstones, np.zeros(len(companies), dtype=bool))
+            for i, company in enumerate(companies):
+                old_row = self.row_by_id.get(company.id)
+                if old_row is not None:
+                    tombstones[old_row] = True
+                self.row_by_id[company.id] = first_row + i
+            self.tombstones = tombstones
+            self.ids = np.append(self.ids, np.fromiter((c.id for c in companies), dtype=np.int64, count=len(companies)))
+            self.row_hashes = np.append(self.row_hashes, np.fromiter((_hash_text(t) for t in texts), dtype=np.uint64, count=len(texts)))
+            self.phase_codes = np.append(self.phase_codes, np.fromiter((self._phase_code(c.fase_da_startup) for c in companies), dtype=np.int32, count=len(companies)))
+            for i in range(len(companies)):
+                for term in new_vectors.indices[new_vectors.indptr[i]:new_vectors.indptr[i + 1]]:
+                    self.delta_postings.setdefault(term, []).append(first_row + i)
+            self._version += 1
+
+        self._maybe_compact()
+
+    def update_company(self, company, text_changed: bool = True):
+        """
+        Atualiza uma empresa no índice.
+        Se os textos de busca não mudaram, só atualiza a fase (sem re-vetorizar).
+        """
+        with self._lock:
+            row = self.row_by_id.get(company.id)
+            if row is not None and not text_changed:
+                self.field_store.refresh(company)
+                phase_codes = self.phase_codes.copy()
+                phase_codes[row] = self._phase_code(company.fase_da_startup)
+                self.phase_codes = phase_codes
+                self._version += 1
+                return
+        self.add_company(company)
+
+    def text_changed(self, company) -> bool:
+        """
+        O texto indexado da empresa difere do da sua linha (ou ela não está no índice)?
+        """
+        with self._lock:
+            row = self.row_by_id.get(company.id)
+            return row is None or int(self.row_hashes[row]) != text_hash(company)
+
+    def remove_company(self, company_id: int):
+        """
+        Marca a linha da empresa como tombstone (ela deixa de aparecer nas buscas).
+        """
+        with self._lock:
+            if company_id not in self.row_by_id:
+                return
+            self.tombstones = self._tombstone_row(company_id)
+            self._version += 1
+        self.field_store.remove(company_id)
+
+        self._maybe_compact()
+
+    def _extend_vocabulary(self, texts: List[str]):
+        """
+        Acrescenta ao vocabulário os termos (e bigramas) ainda desconhecidos dos textos.
+        O IDF de um termo novo é calculado como se ele aparecesse em 1 documento;
+        o IDF dos termos antigos só é recalculado num rebuild completo.
+        """
+        vocabulary = self.tfidf_vectorizer.vocabulary_
+        analyzer = self.tfidf_vectorizer.build_analyzer()
+        new_terms = [t for t in dict.fromkeys(term for text in texts for term in analyzer(text)) if t not in vocabulary]
+        if not new_terms:
+            return
+
+        n_docs = len(self.ids) + len(texts)
+        # Mesma fórmula do TfidfVectorizer com smooth_idf=True
+        new_idf = np.full(len(new_terms), np.log((1 + n_docs) / (1 + 1)) + 1)
+        idf = np.concatenate([self.tfidf_vectorizer.idf_, new_idf])
+
+        vocabulary = dict(vocabulary)
+        for term in new_terms:
+            vocabulary[term] = len(vocabulary)
+
+        # Copy-on-write: buscas em andamento continuam com o vetorizador antigo
+        self.tfidf_vectorizer = _fitted_vectorizer(vocabulary, idf, self.tfidf_vectorizer.ngram_range)
+        # Termos novos: o índice de correção é refeito na próxima consulta
+        self._corrector = None
+
+    def _tombstone_row(self, company_id: int):
+        # Retorna uma cópia do vetor de tombstones com a linha antiga marcada
+        tombstones = self.tombstones
+        row = self.row_by_id.pop(company_id, None)
+        if row is not None:
+            tombstones = tombstones.copy()
+            tombstones[row] = True
+        return tombstones
+
+    def tombstone_ratio(self) -> float:
+        tombstones = self.tombstones
+        if len(tombstones) == 0:
+            return 0.0
+        return float(tombstones.sum()) / len(tombstones)
+
+    def delta_ratio(self) -> float:
+        # Linhas ainda fora da matriz base/CSC (só no bloco delta)
+        if self.base_vectors is None:
+            return 0.0
+        n_delta = self.delta_vectors.shape[0]
+        n_rows = self.base_vectors.shape[0] + n_delta
+        return n_delta / n_rows if n_rows else 0.0
+
+    def _maybe_compact(self):
+        if self.tombstone_ratio() < self.COMPACTION_RATIO and self.delta_ratio() < self.COMPACTION_RATIO:
+            return
+        with self._lock:
+            if self._compaction_thread is not None and self._compaction_thread.is_alive():
+                return
+            self._compaction_thread = threading.Thread(target=self.compact, name="tfidf-compaction", daemon=True)
+            self._compaction_thread.start()
+
+    def compact(self, max_attempts: int = 3):
+        """
+        Remove fisicamente as linhas tombstone, funde o bloco delta na matriz base
+        e reconstrói as listas invertidas.
+        O trabalho pesado roda fora do lock; se houver escrita no meio, tenta de novo.
+        """
+        for _ in range(max_attempts):
+            with self._lock:
+                version = self._version
+                base_vectors = self.base_vectors
+                delta_vectors = self.delta_vectors
+                ids = self.ids
+                row_hashes = self.row_hashes
+                tombstones = self.tombstones
+                phase_codes = self.phase_codes
+
+            alive = np.flatnonzero(~tombstones)
+            width = max(base_vectors.shape[1], delta_vectors.shape[1])
+            vectors = sparse.vstack([_with_width(base_vectors, width), _with_width(delta_vectors, width)], format="csr")
+            new_vectors = vectors[alive]
+            new_postings = new_vectors.tocsc()
+            new_ids = ids[alive]
+            new_row_by_id = {company_id: i for i, company_id in enumerate(new_ids.tolist())}
+
+            with self._lock:
+                if version != self._version:
+                    continue
+                self.base_vectors = new_vectors
+                self.delta_vectors = sparse.csr_matrix((0, width))
+                self.postings = new_postings
+                self.delta_postings = {}
+                self.ids = new_ids
+                self.row_hashes = row_hashes[alive]
+                self.tombstones = np.zeros(len(new_ids), dtype=bool)
+                self.phase_codes = phase_codes[alive]
+                self.row_by_id = new_row_by_id
+                self._corrector = None
+                self._version += 1
+                return True
+        return False
+
+    @staticmethod
+    def _candidate_scores(query_vector, company_vectors, postings, delta_postings, delta_offset: int = 0):
+        """
+        Pontua só os documentos que têm pelo menos um termo da query (term-at-a-time).
+        Como as linhas do TF-IDF já são normalizadas (L2), o produto escalar é o cosseno.
+        `company_vectors` só é lido nas linhas delta: a matriz completa ou só o bloco
+        delta (cuja primeira linha é a linha `delta_offset`).
+        Retorna (linhas candidatas, scores).
+        """
+        terms = query_vector.indices
+        weights = query_vector.data
+
+        # 1. Linhas cobertas pela matriz CSC: percorre as listas invertidas dos termos
+        rows_parts, value_parts = [], []
+        for term, weight in zip(terms, weights):
+            if term >= postings.shape[1]:
                 continue
+            start, end = postings.indptr[term], postings.indptr[term + 1]
+            rows_parts.append(postings.indices[start:end])
+            value_parts.append(postings.data[start:end] * weight)
 
-            # --- 3. REFINAMENTO (Fuzzy Matching)
+        if rows_parts:
+            candidates, inverse = np.unique(np.concatenate(rows_parts), return_inverse=True)
+            scores = np.bincount(inverse, weights=np.concatenate(value_parts))
+        else:
+            candidates, scores = np.empty(0, dtype=np.int64), np.empty(0)
 
-            # A. Score de NOME
-            nome_da_empresa_norm = unidecode(company.nome_da_empresa).lower()
-            name_fuzzy_score = fuzz.token_set_ratio(nome_da_empresa_norm, normalized_query)
+        # 2. Linhas adicionadas depois do último build (listas delta)
+        if delta_postings:
+            n_rows = delta_offset + company_vectors.shape[0]
+            delta_rows = {row for term in terms for row in delta_postings.get(term, ()) if row < n_rows}
+            if delta_rows:
+                delta_rows = np.fromiter(sorted(delta_rows), dtype=np.int64)
+                delta_vectors = _with_width(company_vectors[delta_rows - delta_offset], query_vector.shape[1])
+                delta_scores = (delta_vectors @ query_vector.T).toarray().ravel()
+                candidates = np.concatenate([candidates, delta_rows])
+                scores = np.concatenate([scores, delta_scores])
 
-            # B. Score de CONTEXTO (Solução + Setores)
-            contexto_raw = f"{company.solucao} {company.setor_principal} {company.setor_secundario}{company.tag}"
-            context_fuzzy_score = fuzz.token_set_ratio(unidecode(contexto_raw).lower(), normalized_query)
+        return candidates, scores
 
-            # --- 4. CÁLCULO FINAL (Ponderação) ---
+    @staticmethod
+    def _top_k(scores, k: int):
+        """
+        Índices dos k maiores scores (argpartition + ordenação só dos k).
+        """
+        if len(scores) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(scores))
+        return top[np.argsort(-scores[top], kind="stable")]
+
+    # --- CORREÇÃO DE DIGITAÇÃO ---
+
+    def document_frequencies(self):
+        """
+        Snapshot (sob o lock) do vocabulário atual e da frequência de documento de
+        cada termo: tamanho da lista invertida da CSC + linhas adicionadas depois
+        dela. O array tem a largura do vocabulário, inclusive os termos novos.
+        """
+        with self._lock:
+            vocabulary = self.tfidf_vectorizer.vocabulary_
+            delta_vectors = self.delta_vectors
+            postings = self.postings
+        width = len(vocabulary)
+        frequencies = np.zeros(width, dtype=np.int64)
+        frequencies[:postings.shape[1]] = np.diff(postings.indptr)
+        frequencies += np.bincount(delta_vectors.indices, minlength=width)[:width]
+        return vocabulary, frequencies
+
+    def query_corrector(self) -> Optional[QueryCorrector]:
+        """
+        Índice symmetric-delete do vocabulário atual. Montado sob demanda e
+        descartado quando o vocabulário cresce ou o índice é compactado.
+        """
+        if self.tfidf_vectorizer is None:
+            return None
+        corrector = self._corrector
+        if corrector is None:
+            with self._corrector_lock:
+                corrector = self._corrector
+                if corrector is None:
+                    vocabulary, frequencies = self.document_frequencies()
+                    corrector = QueryCorrector(vocabulary, frequencies)
+                    with self._lock:
+                        # Só guarda se o vocabulário não mudou durante a montagem
+                        if self.tfidf_vectorizer.vocabulary_ is vocabulary:
+                            self._corrector = corrector
+        return corrector
+
+    def correct_query(self, query: str):
+        """
+        Troca as palavras fora do vocabulário pelo termo conhecido mais próximo.
+        Retorna (query corrigida, {palavra digitada: palavra usada}).
+        """
+        corrector = self.query_corrector()
+        if corrector is None:
+            return query, {}
+        return corrector.correct(query)
+
+    def _snapshot(self):
+        # Snapshot consistente do índice (as escritas nunca alteram estes objetos no lugar)
+        with self._lock:
+            return (self.tfidf_vectorizer, self.postings, self.delta_vectors, self.delta_postings,
+                    self.ids, self.tombstones, self.phase_codes)
+
+    def _rank(self, query: str, candidates, cosine_scores, ids, tombstones, phase_codes, fase: Optional[str], limit: int, trace=NO_TRACE):
+        """
+        Do cosseno dos candidatos ao top-k final: filtros, pool para o fuzzy e score final.
+        Retorna (ids, fases) do top-k, já ordenados.
+        """
+        with trace.stage("filtros"):
+            # Filtros em bloco (arrays NumPy): relevância mínima, tombstones e fase
+            relevant = cosine_scores >= self.RELEVANCE_THRESHOLD
+            keep = relevant & ~tombstones[candidates]
+            trace.count("corte_relevancia", len(candidates) - int(relevant.sum()))
+            if fase:
+                phase_code = self.phase_codes_by_name.get(fase)
+                if phase_code is None:
+                    trace.count("corte_fase", int(keep.sum()))
+                    return [], []
+                in_phase = phase_codes[candidates] == phase_code
+                trace.count("corte_fase", int((keep & ~in_phase).sum()))
+                keep &= in_phase
+            candidates, cosine_scores = candidates[keep], cosine_scores[keep]
+
+            # Só os melhores por TF-IDF seguem para o fuzzy
+            pool_size = max(limit * self.CANDIDATE_POOL_FACTOR, self.MIN_CANDIDATE_POOL)
+            top = self._top_k(cosine_scores, pool_size)
+            candidates, cosine_scores = candidates[top], cosine_scores[top]
+            trace.count("pool_fuzzy", len(candidates))
+        if len(candidates) == 0:
+            return [], []
+
+        # --- 3. REFINAMENTO (Fuzzy Matching), só para os sobreviventes
+        with trace.stage("fuzzy"):
+            candidate_ids = ids[candidates].tolist()
+            # Campos já normalizados na indexação; o fuzzy roda em lote (cdist)
+            # A. Score de NOME / B. Score de CONTEXTO (Solução + Setores)
+            name_fuzzy_scores, context_fuzzy_scores, _ = self.field_store.fuzzy_scores(query, candidate_ids)
+
+        # --- 4. CÁLCULO FINAL (Ponderação) ---
+        with trace.stage("ranking"):
             # Score Final =
             #   (TF-IDF * 200)       -> Relevância estatística (Olha todos os campos, resolve plurais )
             # + (Fuzzy Nome * 1.5)   -> Bónus se acertar no nome
             # + (Fuzzy Contexto * 0.5) -> Bónus se acertar na descrição
-            
-            final_score = (score * 200) + (name_fuzzy_score * 1.5) + (context_fuzzy_score * 0.5)
+            final_scores = (cosine_scores * 200) + (name_fuzzy_scores * 1.5) + (context_fuzzy_scores * 0.5)
 
             # metodo anterior 
             #tf_idf_weighted = score * 400
             #fuzzy_bonus = context_fuzzy_score * 0.50 
             #final_score = tf_idf_weighted + fuzzy_bonus
-            
-            if final_score > 70.0: 
-                scored_companies.append({'company': company, 'score': final_score})
-        
-        scored_companies.sort(key=lambda x: x['score'], reverse=True)
-        
-        return [item['company'] for item in scored_companies[:limit]]
-    
-    
\ No newline at end of file
+
+            passed = np.flatnonzero(final_scores > self.FINAL_SCORE_THRESHOLD)
+            order = passed[np.argsort(-final_scores[passed], kind="stable")][:limit]
+            trace.count("corte_score_final", len(candidates) - len(passed))
+
+        if trace.explain:
+            trace.add_candidates([
+                {
+                    "empresa_id": candidate_ids[i],
+                    "tfidf": round(float(cosine_scores[i]), 4),
+                    "fuzzy_nome": round(float(name_fuzzy_scores[i]), 2),
+                    "fuzzy_contexto": round(float(context_fuzzy_scores[i]), 2),
+                    "score_final": round(float(final_scores[i]), 2),
+                    "aprovado": bool(final_scores[i] > self.FINAL_SCORE_THRESHOLD),
+                }
+                for i in np.argsort(-final_scores, kind="stable")
+            ])
+
+        return [candidate_ids[i] for i in order], [self.phase_names[phase_codes[candidates[i]]] for i in order]
+
+    def optimized_search(self, query: str, fase: str = None, limit: int = 5, loader: Optional[Callable[[List[int]], List[Any]]] = None, trace=NO_TRACE):
+        """
+        Busca TF-IDF + fuzzy. Com `loader` (ex: crud.get_empresas_by_ids), as linhas
+        completas do top-k são hidratadas numa única consulta; sem ele, devolve
+        CompanyRecord (id e fase). `trace` (SearchTrace) recebe os tempos por etapa.
+        """
+        if self.tfidf_vectorizer is None or self.base_vectors is None:
+            return []
+        tfidf_vectorizer, postings, delta_vectors, delta_postings, ids, tombstones, phase_codes = self._snapshot()
+
+        normalized_query = unidecode(query).lower()
+        # --- 2. BUSCA TF-IDF ( em todas as informações da empressa)
+        with trace.stage("vetorizacao"):
+            query_vector = tfidf_vectorizer.transform([normalized_query])
+        # Só os documentos que compartilham algum termo com a query são tocados
+        with trace.stage("candidatos"):
+            candidates, cosine_scores = self._candidate_scores(query_vector, delta_vectors, postings, delta_postings, delta_offset=postings.shape[0])
+        trace.count("candidatos", len(candidates))
+
+        result_ids, result_phases = self._rank(query, candidates, cosine_scores, ids, tombstones, phase_codes, fase, limit, trace)
+        trace.count("resultados", len(result_ids))
+
+        # --- 5. HIDRATAÇÃO: só o top-k final
+        if loader is not None:
+            with trace.stage("hidratacao"):
+                return loader(result_ids)
+        return [CompanyRecord(company_id, phase) for company_id, phase in zip(result_ids, result_phases)]
+
+    # Nº de queries por produto esparso em search_many (limita a matriz query x documento)
+    BATCH_CHUNK_SIZE = 64
+
+    def search_many(self, queries: List[str], fase: str = None, limit: int = 5, loader: Optional[Callable[[List[int]], List[Any]]] = None) -> dict:
+        """
+        Várias buscas de uma vez: um único transform para todas as queries e um
+        produto esparso (queries x documentos) por bloco de BATCH_CHUNK_SIZE queries;
+        depois o top-k de cada linha. Mesmo resultado de optimized_search para cada query.
+        Retorna {query: resultados}; com `loader`, hidrata todos os ids numa única chamada.
+        """
+        unique_queries = list(dict.fromkeys(queries))
+        if self.tfidf_vectorizer is None or self.base_vectors is None:
+            return {query: [] for query in unique_queries}
+        tfidf_vectorizer, postings, delta_vectors, _, ids, tombstones, phase_codes = self._snapshot()
+        # A CSC da base já é a CSR da sua transposta (.T não copia); só o delta é transposto
+        base_t = postings.T
+        width = len(tfidf_vectorizer.vocabulary_)
+        delta_t = _with_width(delta_vectors, width).T.tocsr()
+
+        ranked = {}
+        for start in range(0, len(unique_queries), self.BATCH_CHUNK_SIZE):
+            chunk = unique_queries[start:start + self.BATCH_CHUNK_SIZE]
+            query_vectors = tfidf_vectorizer.transform([unidecode(q).lower() for q in chunk])
+            # Linha i: cosseno da query i com cada documento que compartilha algum termo
+            products = sparse.hstack([query_vectors[:, :base_t.shape[0]] @ base_t, query_vectors @ delta_t], format="csr")
+            products.sort_indices()
+            for i, query in enumerate(chunk):
+                row_start, row_end = products.indptr[i], products.indptr[i + 1]
+                candidates = products.indices[row_start:row_end].astype(np.int64)
+                ranked[query] = self._rank(query, candidates, products.data[row_start:row_end], ids, tombstones, phase_codes, fase, limit)
+
+        if loader is None:
+            return {
+                query: [CompanyRecord(company_id, phase) for company_id, phase in zip(result_ids, result_phases)]
+                for query, (result_ids, result_phases) in ranked.items()
+            }
+
+        all_ids = list(dict.fromkeys(company_id for result_ids, _ in ranked.values() for company_id in result_ids))
+        by_id = {company.id: company for company in loader(all_ids)}
+        return {
+            query: [by_id[company_id] for company_id in result_ids if company_id in by_id]
+            for query, (result_ids, _) in ranked.items()
+        }
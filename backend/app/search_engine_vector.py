@@ -1,28 +1,39 @@
-import nltk
-from unidecode import unidecode
-from nltk.corpus import stopwords
-from nltk.tokenize import wordpunct_tokenize
-from nltk.stem import SnowballStemmer
 from typing import List, Optional
-from fuzzywuzzy import fuzz
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import bindparam, func, or_, select, text, union
+import numpy as np
+import os
+import time
 
 # Importações internas
 from . import embedding_service
 from .models import Empresa
+from .normalized_fields import normalizar, normalized_store
+from .search_metrics import NO_TRACE
+from . import vector_planner
+from .vector_planner import DistanceKeyset, VectorPlan
 
 # --- Variável Global Singleton ---
 # Mantem a estrutura para não quebrar as importações no main.py,
 
 search_engine_vector_instance = None
 
-try:
-    nltk.download('punkt', quiet=True)
-    nltk.download('stopwords', quiet=True)
-except Exception:
-    pass
+# Backend do motor vetorial (escolhido no lifespan do main.py):
+#   pgvector  consulta a coluna embedding_vector no banco a cada busca (padrão)
+#   memory    matriz normalizada de todos os embeddings em memória
+#             (search_engine_vector_memory.py), mantida pelo crud a cada escrita
+VECTOR_SEARCH_BACKEND = os.getenv("VECTOR_SEARCH_BACKEND", "pgvector").lower()
+if VECTOR_SEARCH_BACKEND not in ("pgvector", "memory"):
+    raise ValueError(f"VECTOR_SEARCH_BACKEND inválido: '{VECTOR_SEARCH_BACKEND}' (use pgvector ou memory)")
 
+# Re-rank fuzzy do backend pgvector:
+#   python  token_set_ratio em lote sobre as bandas de candidatos do ORM (padrão)
+#   sql     word_similarity do pg_trgm calculado na própria consulta (migração e4f19a7b3c62):
+#           o pool de candidatos pode ser bem maior e só as `limit` linhas finais saem do
+#           banco. Só no Postgres (nos demais bancos cai no modo python).
+VECTOR_RERANK_MODE = os.getenv("VECTOR_RERANK_MODE", "python").lower()
+if VECTOR_RERANK_MODE not in ("python", "sql"):
+    raise ValueError(f"VECTOR_RERANK_MODE inválido: '{VECTOR_RERANK_MODE}' (use python ou sql)")
 
 class SearchEngineVector:
     """
@@ -30,65 +41,296 @@ class SearchEngineVector:
     Agora utiliza pgvector no PostgreSQL para busca semântica em tempo real,
     eliminando o cache de memória.
     """
-    
-    def optimized_search_vector(self, db: Session, query: str, fase: Optional[str] = None, limit: int = 5):
+    # Quantos candidatos (limit * N) vão para o re-rank fuzzy no backend em memória.
+    # No pgvector o tamanho é adaptativo: bandas de distância (vector_planner.SurvivalStats).
+    CANDIDATE_OVERFETCH = 3
+    FINAL_SCORE_THRESHOLD = 70.0
+    # Backend em memória: o crud repassa as escritas (upsert/remove) para o motor
+    IN_MEMORY = False
+    # Índice ANN (migração 11c7474a9df1): recall x latência por consulta.
+    # hnsw.ef_search: tamanho da lista de candidatos do HNSW (padrão do pgvector: 40)
+    HNSW_EF_SEARCH = int(os.getenv("VECTOR_HNSW_EF_SEARCH", "40"))
+    # ivfflat.probes: nº de listas visitadas pelo IVFFlat (vazio = padrão do servidor)
+    IVFFLAT_PROBES = int(os.getenv("VECTOR_IVFFLAT_PROBES")) if os.getenv("VECTOR_IVFFLAT_PROBES") else None
+
+    # Modo sql: candidatos do ANN (limit * N) pontuados no banco
+    SQL_CANDIDATE_OVERFETCH = int(os.getenv("VECTOR_SQL_CANDIDATE_OVERFETCH", "20"))
+
+    def __init__(self, phase_stats: Optional[vector_planner.PhaseStats] = None, rerank_mode: Optional[str] = None, survival_stats: Optional[vector_planner.SurvivalStats] = None):
+        # Seletividade de cada fase (escolha da estratégia do filtro de fase)
+        self.phase_stats = phase_stats if phase_stats is not None else vector_planner.phase_stats
+        # Taxa de aprovação no score final por tamanho de query (tamanho da primeira banda)
+        self.survival_stats = survival_stats if survival_stats is not None else vector_planner.survival_stats
+        self.rerank_mode = rerank_mode or VECTOR_RERANK_MODE
+
+    def _set_ann_params(self, db: Session, candidate_limit: int, ef_search: Optional[int] = None, probes: Optional[int] = None):
         """
-        Realiza a busca combinando Similaridade de Cosseno (via SQL) e Fuzzy Match (via Python).
+        SET LOCAL dos parâmetros do índice ANN: valem só na transação desta busca.
         """
-        # 1. Gerar o vetor da query usando lógica de tokens (embedding_service)
-        query_vector = embedding_service.generate_query_embedding(query)
+        if db.get_bind().dialect.name != "postgresql":
+            return
+        ef_search = self.HNSW_EF_SEARCH if ef_search is None else ef_search
+        # O HNSW devolve no máximo ef_search linhas: nunca menos que o LIMIT da consulta
+        db.execute(text(f"SET LOCAL hnsw.ef_search = {max(int(ef_search), candidate_limit)}"))
+        probes = self.IVFFLAT_PROBES if probes is None else probes
+        if probes is not None:
+            db.execute(text(f"SET LOCAL ivfflat.probes = {int(probes)}"))
 
-        # 2. Busca no banco via pgvector
+    @staticmethod
+    def _candidate_statement(query_vector, fase: Optional[str], candidate_limit: int, exact: bool = False, after: Optional[DistanceKeyset] = None):
         # Selecionamos a distância para usá-la no cálculo do score final
-        distance_query = Empresa.embedding_vector.cosine_distance(query_vector).label('distance')
-        
-        candidate_query = db.query(Empresa, distance_query)
-        
+        distance = Empresa.embedding_vector.cosine_distance(query_vector)
+        # Linhas sem embedding não têm distância (NULL): ficam fora dos candidatos
+        candidate_query = select(Empresa, distance.label('distance')).where(Empresa.embedding_vector.isnot(None))
         if fase:
-            candidate_query = candidate_query.filter(Empresa.fase_da_startup == fase)
-
+            candidate_query = candidate_query.where(Empresa.fase_da_startup == fase)
+        if after is not None:
+            # Keyset na distância: banda seguinte, sem repetir os empates já vistos
+            candidate_query = candidate_query.where(distance >= after.distance)
+            if after.tie_ids:
+                candidate_query = candidate_query.where(Empresa.id.notin_(after.tie_ids))
         # O operador <=> representa a distância de cosseno no pgvector.
-        # Ordenamos pela distância e pegamos uma amostra para re-rank
-        candidates = candidate_query.order_by(distance_query).limit(limit * 3).all()
+        # "+ 0" faz a ordenação deixar de casar com o índice ANN: distância exata só nas linhas filtradas
+        order = distance + 0 if exact else distance
+        return candidate_query.order_by(order).limit(candidate_limit)
 
-        if not candidates:
-            return []
+    def _plan(self, db: Session, fase: Optional[str], candidate_limit: int, ef_search: Optional[int]) -> VectorPlan:
+        base_ef_search = self.HNSW_EF_SEARCH if ef_search is None else ef_search
+        if db.get_bind().dialect.name != "postgresql":
+            return VectorPlan("ann", ef_search=base_ef_search)
+        if fase:
+            self.phase_stats.ensure_fresh(db)
+        return self.phase_stats.plan(fase, candidate_limit, base_ef_search)
 
-        # 3. Refinamento e Re-rank com Fuzzy Matching (lógica original)
-        scored_companies = []
-        normalized_query = unidecode(query).lower()
+    def _fetch_candidates(self, db: Session, query_vector, fase: Optional[str], candidate_limit: int, plan: VectorPlan, probes: Optional[int], trace=NO_TRACE, after: Optional[DistanceKeyset] = None):
+        """
+        Executa o plano. No ann_overfetch, se o filtro de fase deixar menos de
+        `candidate_limit` linhas, dobra ef_search (e probes) e repete; no teto,
+        termina com a busca exata. Com `after`, busca a banda de distância seguinte.
+        Retorna as linhas (Empresa, distância).
+        """
+        exact = plan.strategy == "exato"
+        ef_search = plan.ef_search
+        probes = self.IVFFLAT_PROBES if probes is None else probes
+        # O ANN percorre de novo os vizinhos das bandas anteriores antes de chegar nesta
+        seen = after.seen if after is not None else 0
+        # A fase pode ter menos linhas que o pedido: não adianta alargar além disso
+        target = candidate_limit if plan.phase_rows is None else min(candidate_limit, max(plan.phase_rows - seen, 0))
+        while True:
+            # execute() = consulta no banco; all() = leitura das linhas e montagem dos objetos do ORM
+            with trace.stage("pgvector"):
+                if not exact:
+                    self._set_ann_params(db, seen + candidate_limit, ef_search, probes)
+                result = db.execute(self._candidate_statement(query_vector, fase, candidate_limit, exact, after))
+            with trace.stage("hidratacao"):
+                candidates = result.all()
+            trace.count("consultas_pgvector", 1)
 
-        for company, distance in candidates:
-            # Converter Distância em Similaridade (pgvector: 0 é idêntico, 1 é oposto)
-            # Similaridade varia de 0.0 a 1.0
-            similarity = 1.0 - float(distance)
-            
+            if exact or plan.strategy != "ann_overfetch" or len(candidates) >= target:
+                return candidates
+            if ef_search >= vector_planner.VECTOR_MAX_EF_SEARCH:
+                exact = True
+            else:
+                ef_search = min(ef_search * 2, vector_planner.VECTOR_MAX_EF_SEARCH)
+                probes = probes * 2 if probes is not None else None
+
+    def optimized_search_vector(self, db: Session, query: str, fase: Optional[str] = None, limit: int = 5, trace=NO_TRACE, ef_search: Optional[int] = None, probes: Optional[int] = None, loader=None):
+        """
+        Realiza a busca combinando Similaridade de Cosseno (via SQL) e Fuzzy Match (via Python).
+        `trace` (SearchTrace) recebe os tempos de cada etapa; `ef_search` (HNSW) e
+        `probes` (IVFFlat) ajustam o índice ANN só nesta consulta.
+        `loader` só é usado pelo backend em memória: aqui as empresas já vêm na consulta vetorial.
+        Com rerank_mode "sql" (Postgres), o fuzzy também roda no banco (pg_trgm).
+        """
+        # 1. Gerar o vetor da query usando lógica de tokens (embedding_service)
+        with trace.stage("embedding"):
+            query_vector = embedding_service.generate_query_embedding(query)
+
+        if self.rerank_mode == "sql" and db.get_bind().dialect.name == "postgresql":
+            return self._search_sql_rerank(db, query, query_vector, fase, limit, trace, ef_search, probes)
+
+        # 2. Busca no banco via pgvector em bandas de distância (iterative deepening):
+        # a primeira banda tem o tamanho que costuma bastar para queries desse tamanho;
+        # a seguinte (keyset na distância, com o dobro do tamanho) só é buscada se
+        # menos de `limit` candidatos passarem no score final, dentro do orçamento de tempo.
+        started = time.perf_counter()
+        max_candidates = max(vector_planner.VECTOR_OVERFETCH_MAX_CANDIDATES, limit)
+        band_size = self.survival_stats.initial_fetch(query, limit, max_candidates)
+        with trace.stage("planejamento"):
+            plan = self._plan(db, fase, band_size, ef_search)
+        trace.count(f"estrategia_{plan.strategy}", 1)
+
+        survivors = []  # (score final, empresa), na ordem em que foram aprovadas
+        seen, after = 0, None
+        while True:
+            band = self._fetch_candidates(db, query_vector, fase, band_size, plan, probes, trace, after)
+            seen += len(band)
+            trace.count("bandas", 1)
+            if band:
+                # 3. Refinamento e Re-rank com Fuzzy Matching (lógica original), em lote
+                companies = [company for company, _ in band]
+                with trace.stage("fuzzy"):
+                    # Campos pré-normalizados (store compartilhado, atualizado pelo crud)
+                    for company in companies:
+                        normalized_store.refresh(company)
+
+                # Converter Distância em Similaridade (pgvector: 0 é idêntico, 1 é oposto)
+                # Similaridade varia de 0.0 a 1.0
+                similarity = 1.0 - np.array([float(distance) for _, distance in band])
+                order, final_score = self._rerank(query, [company.id for company in companies], similarity, trace)
+                survivors.extend((float(final_score[i]), companies[i]) for i in order)
+
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            if (len(survivors) >= limit or len(band) < band_size or seen >= max_candidates
+                    or elapsed_ms >= vector_planner.VECTOR_OVERFETCH_BUDGET_MS):
+                break
+            after = self._next_keyset(band, after, seen)
+            band_size = min(band_size * 2, max_candidates - seen)
+
+        trace.count("candidatos", seen)
+        self.survival_stats.record(query, seen, len(survivors))
+
+        # Bandas diferentes: ordena de novo pelo score final (estável: empate fica com a mais próxima)
+        survivors.sort(key=lambda item: -item[0])
+        results = [company for _, company in survivors[:limit]]
+        trace.count("resultados", len(results))
+        return results
+
+    @staticmethod
+    def _next_keyset(band, after: Optional[DistanceKeyset], seen: int) -> DistanceKeyset:
+        # Ids na última distância da banda (e, se ela repetir a anterior, os empates de antes)
+        last = float(band[-1][1])
+        ties = tuple(company.id for company, distance in band if float(distance) == last)
+        if after is not None and after.distance == last:
+            ties = after.tie_ids + ties
+        return DistanceKeyset(last, ties, seen)
+
+    def _rerank(self, query: str, company_ids: List[int], similarity, trace=NO_TRACE):
+        """
+        Re-rank dos candidatos vetoriais: similaridade de cosseno + fuzzy de nome,
+        contexto e tag. Retorna as posições (em `company_ids`) dos aprovados, do
+        melhor para o pior, e o score final de cada candidato.
+        """
+        with trace.stage("fuzzy"):
+            # Nome da empresa (Peso alto no fuzzy), Contexto (Solução + Setores) e Tag
+            name_fuzzy_score, context_fuzzy_score, tag_fuzzy_score = normalized_store.fuzzy_scores(query, company_ids)
+
+        with trace.stage("ranking"):
             # --- CÁLCULO DE SCORES ---
-            
             # A. Score Vetorial (Equivalente ao TF-IDF * 200)
             vector_score = similarity * 200
-            # Nome da empresa (Peso alto no fuzzy)
-            nome_da_empresa_norm = unidecode(company.nome_da_empresa).lower()
-            name_fuzzy_score = fuzz.token_set_ratio(nome_da_empresa_norm, normalized_query)
-
-            # Contexto (Solução + Setores)
-            contexto_raw = f"{company.solucao} {company.setor_principal} {company.setor_secundario}{company.tag}"
-            contexto_norm = unidecode(contexto_raw).lower()
-            context_fuzzy_score = fuzz.token_set_ratio(contexto_norm, normalized_query)
-
-            # Contexto (Tag)- dando maior peso 
-            tag_raw = f"{company.tag}"
-            tag_norm = unidecode(tag_raw).lower()
-            tag_fuzzy_score = fuzz.token_set_ratio(tag_norm, normalized_query)
 
             # Cálculo de Score Final
             # Como o filtro vetorial do banco já trouxe os mais parecidos, aplica o ajuste fino.
+            # Contexto (Tag)- dando maior peso 
             final_score = vector_score +(name_fuzzy_score * 1.5) + (context_fuzzy_score * 0.4)+ (tag_fuzzy_score * 0.5)
             
             # Limiar de corte para evitar resultados irrelevantes
-            if final_score > 70.0: 
-                scored_companies.append({'company': company, 'score': final_score})
-        
-        # Ordenar pelos melhores resultados após o re-rank
-        scored_companies.sort(key=lambda x: x['score'], reverse=True)
-        return [item['company'] for item in scored_companies[:limit]]
\ No newline at end of file
+            passed = np.flatnonzero(final_score > self.FINAL_SCORE_THRESHOLD)
+
+            # Ordenar pelos melhores resultados após o re-rank
+            order = passed[np.argsort(-final_score[passed], kind="stable")]
+        trace.count("corte_score_final", len(company_ids) - len(passed))
+
+        if trace.explain:
+            trace.add_candidates([
+                {
+                    "empresa_id": company_ids[i],
+                    "similaridade": round(float(similarity[i]), 4),
+                    "fuzzy_nome": round(float(name_fuzzy_score[i]), 2),
+                    "fuzzy_contexto": round(float(context_fuzzy_score[i]), 2),
+                    "fuzzy_tag": round(float(tag_fuzzy_score[i]), 2),
+                    "score_final": round(float(final_score[i]), 2),
+                    "aprovado": bool(final_score[i] > self.FINAL_SCORE_THRESHOLD),
+                }
+                for i in np.argsort(-final_score, kind="stable")
+            ])
+
+        return order, final_score
+
+    # --- RE-RANK FUZZY NO SQL (VECTOR_RERANK_MODE=sql) ---
+
+    @staticmethod
+    def _normalized(expression):
+        # Mesma expressão dos índices de trigramas (unaccent + lower): qualquer
+        # diferença (ex: coalesce) faria o Postgres deixar de usar o índice
+        return func.startups_normalizar(expression)
+
+    @staticmethod
+    def _word_similarity(query_param, expression):
+        # startups_normalizar é STRICT: campo NULL pontua 0
+        return func.coalesce(func.word_similarity(query_param, expression), 0) * 100
+
+    @classmethod
+    def _sql_rerank_statement(cls, query_vector, query_norm: str, fase: Optional[str], candidate_limit: int, limit: int, exact: bool = False):
+        """
+        Uma consulta só: pool de candidatos (vizinhos do ANN + empresas cujo nome ou
+        tag casam com a query pelos índices GIN de trigramas), score final calculado
+        no banco e só as `limit` melhores linhas devolvidas.
+        """
+        query_param = bindparam("query_norm", query_norm)
+        name = cls._normalized(Empresa.nome_da_empresa)
+        tag = cls._normalized(Empresa.tag)
+        context = cls._normalized(func.concat_ws(" ", Empresa.solucao, Empresa.setor_principal, Empresa.setor_secundario, Empresa.tag))
+        distance = Empresa.embedding_vector.cosine_distance(query_vector)
+
+        filters = [Empresa.embedding_vector.isnot(None)]
+        if fase:
+            filters.append(Empresa.fase_da_startup == fase)
+        ann = select(Empresa.id).where(*filters).order_by(distance + 0 if exact else distance).limit(candidate_limit).subquery()
+        # query <% campo: usa o índice GIN (pg_trgm.word_similarity_threshold, padrão 0.6)
+        trigram = select(Empresa.id).where(
+            *filters, or_(query_param.op("<%")(name), query_param.op("<%")(tag))
+        ).limit(candidate_limit).subquery()
+        pool = union(select(ann.c.id), select(trigram.c.id)).subquery("pool")
+
+        # Mesmos pesos do re-rank em Python (word_similarity 0..1 -> escala 0..100 do fuzzy)
+        similarity = (1.0 - distance).label("similaridade")
+        name_score = cls._word_similarity(query_param, name).label("fuzzy_nome")
+        context_score = cls._word_similarity(query_param, context).label("fuzzy_contexto")
+        tag_score = cls._word_similarity(query_param, tag).label("fuzzy_tag")
+        final_score = (similarity * 200 + name_score * 1.5 + context_score * 0.4 + tag_score * 0.5).label("score_final")
+        scored = select(
+            Empresa.id, similarity, name_score, context_score, tag_score, final_score,
+        ).where(Empresa.id.in_(select(pool.c.id))).subquery("scored")
+
+        return (
+            select(Empresa, scored.c.similaridade, scored.c.fuzzy_nome, scored.c.fuzzy_contexto, scored.c.fuzzy_tag, scored.c.score_final)
+            .join(scored, scored.c.id == Empresa.id)
+            .where(scored.c.score_final > cls.FINAL_SCORE_THRESHOLD)
+            .order_by(scored.c.score_final.desc(), Empresa.id)
+            .limit(limit)
+        )
+
+    def _search_sql_rerank(self, db: Session, query: str, query_vector, fase: Optional[str], limit: int, trace=NO_TRACE, ef_search: Optional[int] = None, probes: Optional[int] = None):
+        candidate_limit = limit * self.SQL_CANDIDATE_OVERFETCH
+        with trace.stage("planejamento"):
+            plan = self._plan(db, fase, candidate_limit, ef_search)
+        trace.count(f"estrategia_{plan.strategy}", 1)
+        exact = plan.strategy == "exato"
+
+        with trace.stage("pgvector"):
+            if not exact:
+                self._set_ann_params(db, candidate_limit, plan.ef_search, probes)
+            result = db.execute(self._sql_rerank_statement(query_vector, normalizar(query), fase, candidate_limit, limit, exact))
+        with trace.stage("hidratacao"):
+            rows = result.all()
+        trace.count("consultas_pgvector", 1)
+
+        if trace.explain:
+            trace.add_candidates([
+                {
+                    "empresa_id": company.id,
+                    "similaridade": round(float(similarity), 4),
+                    "fuzzy_nome": round(float(name_score), 2),
+                    "fuzzy_contexto": round(float(context_score), 2),
+                    "fuzzy_tag": round(float(tag_score), 2),
+                    "score_final": round(float(final_score), 2),
+                    "aprovado": True,
+                }
+                for company, similarity, name_score, context_score, tag_score, final_score in rows
+            ])
+
+        results = [row[0] for row in rows]
+        trace.count("resultados", len(results))
+        return results
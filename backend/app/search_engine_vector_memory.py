@@ -0,0 +1,183 @@
+import threading
+from typing import Any, Callable, List, Optional
+
+import numpy as np
+from scipy import sparse
+from sklearn.preprocessing import normalize
+from sqlalchemy.orm import Session
+
+# Importações internas
+from . import embedding_service
+from .database import SessionLocal
+from .index_rebuild import SEARCH_COLUMNS
+from .models import Empresa
+from .normalized_fields import normalized_store
+from .search_engine_vector import SearchEngineVector
+from .search_metrics import NO_TRACE
+from .vector_storage import to_sparse_matrix
+
+# Colunas do snapshot: as do índice TF-IDF (fuzzy e fase) + o embedding
+VECTOR_MEMORY_COLUMNS = SEARCH_COLUMNS + (Empresa.embedding_vector,)
+
+
+class SearchEngineVectorMemory(SearchEngineVector):
+    """
+    Backend em memória do motor vetorial (VECTOR_SEARCH_BACKEND=memory).
+    Guarda todos os embedding_vector numa matriz CSR float32 com as linhas já
+    normalizadas (L2): a similaridade de cosseno de toda a base é um único
+    produto matriz-vetor, e o top-k sai de um argpartition, sem ida ao banco.
+    O banco só é consultado para hidratar o resultado final (uma consulta por ids).
+    As escritas chegam pelo crud (upsert/remove); linhas substituídas ou removidas
+    viram tombstones até a próxima compactação.
+    """
+    IN_MEMORY = True
+    # Proporção de linhas mortas (tombstones) que dispara a compactação
+    COMPACTION_RATIO = 0.25
+
+    def __init__(self, rows: List[Any] = ()):
+        super().__init__()
+        vectors, ids, phases = [], [], []
+        for row in rows:
+            if row.embedding_vector is None:
+                continue
+            vectors.append(row.embedding_vector)
+            ids.append(row.id)
+            phases.append(row.fase_da_startup)
+            normalized_store.refresh(row)
+
+        self.phase_codes_by_name = {}
+        self._lock = threading.Lock()
+        matrix = to_sparse_matrix(vectors)
+        # normalize() não aceita matriz sem linhas (banco vazio no arranque)
+        self.matrix = (normalize(matrix, norm="l2") if matrix.shape[0] else matrix).astype(np.float32)
+        self.ids = np.array(ids, dtype=np.int64)
+        self.phase_codes = np.array([self._phase_code(fase) for fase in phases], dtype=np.int32)
+        self.tombstones = np.zeros(len(ids), dtype=bool)
+        self.row_by_id = {company_id: i for i, company_id in enumerate(ids)}
+
+    @classmethod
+    def from_database(cls, session_factory: Callable = SessionLocal) -> "SearchEngineVectorMemory":
+        """
+        Carrega todos os embeddings numa sessão própria (só as colunas necessárias).
+        """
+        db = session_factory()
+        try:
+            rows = db.query(*VECTOR_MEMORY_COLUMNS).all()
+        finally:
+            db.close()
+        return cls(rows)
+
+    def _phase_code(self, fase) -> int:
+        # Código categórico estável para cada valor de fase_da_startup
+        code = self.phase_codes_by_name.get(fase)
+        if code is None:
+            code = self.phase_codes_by_name[fase] = len(self.phase_codes_by_name)
+        return code
+
+    def _snapshot(self):
+        # Leitura consistente sem lock: as escritas trocam os arrays (copy-on-write)
+        with self._lock:
+            return self.matrix, self.ids, self.phase_codes, self.tombstones
+
+    # --- MANUTENÇÃO INCREMENTAL (chamada pelo crud.py) ---
+
+    def upsert(self, company):
+        """
+        Adiciona ou substitui a linha de uma empresa. O vetor é gerado pela mesma
+        função que grava a coluna (embedding_service), sem reler o banco.
+        """
+        vector = embedding_service.vectorizer.transform([embedding_service.embedding_text(company)])
+        vector = normalize(vector, norm="l2").astype(np.float32)
+        with self._lock:
+            tombstones = self._tombstone_row(company.id)
+            self.matrix = sparse.vstack([self.matrix, vector], format="csr")
+            self.ids = np.append(self.ids, np.int64(company.id))
+            self.phase_codes = np.append(self.phase_codes, np.int32(self._phase_code(company.fase_da_startup)))
+            self.tombstones = np.append(tombstones, False)
+            self.row_by_id[company.id] = len(self.ids) - 1
+        self._maybe_compact()
+
+    def remove(self, company_id: int):
+        with self._lock:
+            self.tombstones = self._tombstone_row(company_id)
+        self._maybe_compact()
+
+    def _tombstone_row(self, company_id: int):
+        # Retorna uma cópia do vetor de tombstones com a linha antiga marcada
+        tombstones = self.tombstones
+        row = self.row_by_id.pop(company_id, None)
+        if row is not None:
+            tombstones = tombstones.copy()
+            tombstones[row] = True
+        return tombstones
+
+    def _maybe_compact(self):
+        with self._lock:
+            n = len(self.tombstones)
+            if n == 0 or self.tombstones.sum() / n < self.COMPACTION_RATIO:
+                return
+            # Só fatia arrays (sem re-vetorizar): barato o bastante para rodar inline
+            alive = np.flatnonzero(~self.tombstones)
+            self.matrix = self.matrix[alive]
+            self.ids = self.ids[alive]
+            self.phase_codes = self.phase_codes[alive]
+            self.tombstones = np.zeros(len(alive), dtype=bool)
+            self.row_by_id = {company_id: i for i, company_id in enumerate(self.ids.tolist())}
+
+    # --- BUSCA ---
+
+    def search_ids(self, query: str, fase: Optional[str] = None, limit: int = 5, trace=NO_TRACE) -> List[int]:
+        """
+        Ids do resultado (já com o re-rank fuzzy), sem acessar o banco.
+        """
+        with trace.stage("embedding"):
+            query_vector = embedding_service.vectorizer.transform([query])
+            query_vector = normalize(query_vector, norm="l2").toarray().ravel().astype(np.float32)
+        if not query_vector.any():
+            # Nenhum token da query: no pgvector a distância seria indefinida (NaN)
+            return []
+
+        candidate_limit = limit * self.CANDIDATE_OVERFETCH
+        matrix, ids, phase_codes, tombstones = self._snapshot()
+        with trace.stage("similaridade"):
+            # Linhas e query normalizadas: o produto escalar é o cosseno
+            scores = matrix @ query_vector
+            alive = ~tombstones
+            if fase:
+                code = self.phase_codes_by_name.get(fase)
+                alive &= phase_codes == code if code is not None else False
+            rows = np.flatnonzero(alive)
+            row_scores = scores[rows]
+            if len(rows) > candidate_limit:
+                top = np.argpartition(-row_scores, candidate_limit - 1)[:candidate_limit]
+            else:
+                top = np.arange(len(rows))
+            top = top[np.argsort(-row_scores[top], kind="stable")]
+            candidates = rows[top]
+        trace.count("candidatos", len(candidates))
+
+        if len(candidates) == 0:
+            return []
+
+        candidate_ids = ids[candidates].tolist()
+        order, _ = self._rerank(query, candidate_ids, scores[candidates].astype(np.float64), trace)
+        return [candidate_ids[i] for i in order[:limit]]
+
+    def optimized_search_vector(self, db: Session, query: str, fase: Optional[str] = None, limit: int = 5, trace=NO_TRACE, ef_search: Optional[int] = None, probes: Optional[int] = None, loader: Optional[Callable] = None):
+        """
+        Mesma assinatura do backend pgvector. ef_search/probes não se aplicam
+        (a busca em memória é exata). `loader` hidrata os ids numa só chamada;
+        sem ele, uma consulta IN no `db`.
+        """
+        result_ids = self.search_ids(query, fase=fase, limit=limit, trace=trace)
+        if not result_ids:
+            return []
+
+        with trace.stage("hidratacao"):
+            if loader is not None:
+                results = loader(result_ids)
+            else:
+                by_id = {company.id: company for company in db.query(Empresa).filter(Empresa.id.in_(result_ids)).all()}
+                results = [by_id[company_id] for company_id in result_ids if company_id in by_id]
+        trace.count("resultados", len(results))
+        return results
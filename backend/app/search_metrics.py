@@ -0,0 +1,143 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List
+
+# --- INSTRUMENTAÇÃO DOS MOTORES DE BUSCA ---
+# Cada busca pode receber um SearchTrace: os motores marcam o tempo de cada etapa
+# (embedding, consulta no pgvector, hidratação, fuzzy...), contam candidatos e
+# cortes por limiar e, no modo explain, guardam os componentes do score de cada
+# candidato. Os endpoints devolvem o trace no header Server-Timing (e no corpo com
+# explain=true) e o acumulam em search_metrics, exposto em GET /search/metrics.
+
+
+class SearchTrace:
+    """
+    Tempos (ms) por etapa, contadores e, com explain, os scores de cada candidato.
+    """
+    def __init__(self, engine: str, explain: bool = False):
+        self.engine = engine
+        self.explain = explain
+        self.stages: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+        self.candidates: List[dict] = []
+        # Correção de digitação aplicada à query (ver spelling.py)
+        self.corrected_query = None
+        self.corrections: Dict[str, str] = {}
+        # Motores chamados por este (ex: tfidf e vector dentro do hybrid)
+        self.children: Dict[str, "SearchTrace"] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            self.stages[name] = self.stages.get(name, 0.0) + elapsed
+
+    def count(self, name: str, value: int):
+        self.counts[name] = self.counts.get(name, 0) + int(value)
+
+    def add_candidates(self, rows: List[dict]):
+        # Só no modo explain (montar os dicts por candidato tem custo)
+        if self.explain:
+            self.candidates.extend(rows)
+
+    def child(self, engine: str) -> "SearchTrace":
+        trace = SearchTrace(engine, explain=self.explain)
+        self.children[engine] = trace
+        return trace
+
+    def server_timing(self) -> str:
+        """
+        Valor do header Server-Timing (ex: "embedding;dur=1.2, pgvector;dur=8.4").
+        """
+        parts = [f"{name};dur={duration:.1f}" for name, duration in self.stages.items()]
+        for engine, trace in self.children.items():
+            parts.extend(f"{engine}-{name};dur={duration:.1f}" for name, duration in trace.stages.items())
+        return ", ".join(parts)
+
+    def as_dict(self) -> dict:
+        return {
+            "motor": self.engine,
+            "etapas_ms": {name: round(duration, 3) for name, duration in self.stages.items()},
+            "contadores": dict(self.counts),
+            "candidatos": self.candidates,
+            "consulta_corrigida": self.corrected_query,
+            "correcoes": dict(self.corrections),
+            "motores": {engine: trace.as_dict() for engine, trace in self.children.items()},
+        }
+
+
+class _NoTrace:
+    """
+    Trace que não registra nada (padrão dos motores quando a chamada não passa um).
+    """
+    explain = False
+
+    @contextmanager
+    def stage(self, name: str):
+        yield
+
+    def count(self, name: str, value: int):
+        pass
+
+    def add_candidates(self, rows: List[dict]):
+        pass
+
+
+NO_TRACE = _NoTrace()
+
+
+class SearchMetrics:
+    """
+    Agregados por motor: nº de buscas, tempo por etapa (total/máximo) e contadores.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._engines = {}
+
+    def record(self, trace: SearchTrace):
+        with self._lock:
+            self._record(trace)
+
+    def _record(self, trace: SearchTrace):
+        engine = self._engines.setdefault(trace.engine, {"requests": 0, "stages": {}, "counters": {}})
+        engine["requests"] += 1
+        for name, duration in trace.stages.items():
+            stage = engine["stages"].setdefault(name, {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+            stage["count"] += 1
+            stage["total_ms"] += duration
+            stage["max_ms"] = max(stage["max_ms"], duration)
+        for name, value in trace.counts.items():
+            engine["counters"][name] = engine["counters"].get(name, 0) + value
+        for child in trace.children.values():
+            self._record(child)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                name: {
+                    "requests": engine["requests"],
+                    "stages": {
+                        stage_name: {
+                            "count": stage["count"],
+                            "total_ms": round(stage["total_ms"], 3),
+                            "avg_ms": round(stage["total_ms"] / stage["count"], 3),
+                            "max_ms": round(stage["max_ms"], 3),
+                        }
+                        for stage_name, stage in engine["stages"].items()
+                    },
+                    "counters": dict(engine["counters"]),
+                }
+                for name, engine in self._engines.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self._engines.clear()
+
+
+# --- Variável Global Singleton ---
+search_metrics = SearchMetrics()
@@ -0,0 +1,128 @@
+import os
+from typing import Dict, Iterable, Optional, Tuple
+
+from rapidfuzz.distance import OSA
+from unidecode import unidecode
+
+from .tokenizer import TOKEN_RE, query_words, stem, surface_forms
+
+# --- CORREÇÃO DE DIGITAÇÃO (SYMMETRIC DELETE) ---
+# Queries com erro ("fintec", "agricultra") não compartilham nenhum termo com o
+# vocabulário do TF-IDF e caem no 404 depois do fuzzy. O índice abaixo guarda, para
+# cada radical do vocabulário, as variantes com até SPELLING_MAX_DISTANCE letras
+# apagadas (só no prefixo de SPELLING_PREFIX_LENGTH letras, como no SymSpell).
+# Uma palavra desconhecida gera as próprias deleções e acha os candidatos por
+# lookup em dicionário, sem comparar com o vocabulário inteiro; a distância real
+# (Damerau/OSA) só é calculada para esses candidatos.
+
+SPELLING_MAX_DISTANCE = int(os.getenv("SPELLING_MAX_DISTANCE", "2"))
+SPELLING_PREFIX_LENGTH = int(os.getenv("SPELLING_PREFIX_LENGTH", "7"))
+# Palavras mais curtas que isso não são corrigidas (siglas, "ia", "3d"...)
+SPELLING_MIN_WORD_LENGTH = 4
+
+
+def _deletes(term: str, max_distance: int) -> set:
+    """
+    O termo e todas as variantes com até `max_distance` letras apagadas.
+    """
+    variants = {term}
+    frontier = {term}
+    for _ in range(max_distance):
+        frontier = {w[:i] + w[i + 1:] for w in frontier if len(w) > 1 for i in range(len(w))}
+        variants |= frontier
+    return variants
+
+
+def allowed_distance(word: str) -> int:
+    # Palavras curtas: uma letra de diferença já muda o sentido
+    return min(SPELLING_MAX_DISTANCE, 1 if len(word) <= 5 else 2)
+
+
+class SymmetricDeleteIndex:
+    """
+    Índice de deleções dos termos (radicais) do vocabulário, com a frequência de
+    documento de cada termo para desempatar candidatos à mesma distância.
+    """
+    def __init__(self, term_frequencies: Dict[str, int], max_distance: int = SPELLING_MAX_DISTANCE, prefix_length: int = SPELLING_PREFIX_LENGTH):
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self.frequencies = term_frequencies
+        self._deletes: Dict[str, list] = {}
+        for term in term_frequencies:
+            for variant in _deletes(term[:prefix_length], max_distance):
+                self._deletes.setdefault(variant, []).append(term)
+
+    def __contains__(self, term: str) -> bool:
+        return term in self.frequencies
+
+    def lookup(self, term: str, max_distance: Optional[int] = None) -> Optional[str]:
+        """
+        Termo conhecido mais próximo (menor distância, depois maior frequência), ou None.
+        """
+        max_distance = self.max_distance if max_distance is None else min(max_distance, self.max_distance)
+        if term in self.frequencies:
+            return term
+
+        best, best_key = None, None
+        seen = set()
+        for variant in _deletes(term[:self.prefix_length], max_distance):
+            for candidate in self._deletes.get(variant, ()):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                if abs(len(candidate) - len(term)) > max_distance:
+                    continue
+                distance = OSA.distance(term, candidate, score_cutoff=max_distance)
+                if distance > max_distance:
+                    continue
+                key = (distance, -self.frequencies[candidate], candidate)
+                if best_key is None or key < best_key:
+                    best, best_key = candidate, key
+        return best
+
+
+class QueryCorrector:
+    """
+    Corrige as palavras da query cujo radical não existe no vocabulário do TF-IDF.
+    """
+    def __init__(self, vocabulary: Dict[str, int], document_frequencies):
+        # Só unigramas: os bigramas do vocabulário saem das mesmas palavras
+        self.index = SymmetricDeleteIndex({
+            term: int(document_frequencies[column])
+            for term, column in vocabulary.items()
+            if " " not in term and term.isalpha()
+        })
+        # Palavra do corpus que representa cada radical (a query corrigida tem que
+        # voltar ao mesmo radical quando passar de novo pelo tokenizer)
+        self.surface = surface_forms()
+
+    def _surface(self, term: str) -> Optional[str]:
+        word = self.surface.get(term)
+        if word is not None:
+            return word
+        # Índice anexado do disco: sem o dicionário do corpus, só serve o próprio radical
+        return term if stem(term) == term else None
+
+    def corrections(self, words: Iterable[str]) -> Dict[str, str]:
+        corrections = {}
+        for word in words:
+            if word in corrections or len(word) < SPELLING_MIN_WORD_LENGTH or not word.isalpha():
+                continue
+            stemmed = stem(word)
+            if stemmed in self.index:
+                continue
+            target = self.index.lookup(stemmed, allowed_distance(stemmed))
+            replacement = self._surface(target) if target is not None else None
+            if replacement is not None:
+                corrections[word] = replacement
+        return corrections
+
+    def correct(self, query: str) -> Tuple[str, Dict[str, str]]:
+        """
+        (query corrigida, {palavra digitada: palavra usada}). Sem correções, a query volta igual.
+        """
+        corrections = self.corrections(query_words(query))
+        if not corrections:
+            return query, {}
+        corrected = TOKEN_RE.sub(lambda m: corrections.get(m.group(0), m.group(0)), unidecode(query).lower())
+        return corrected, corrections
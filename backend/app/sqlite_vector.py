@@ -0,0 +1,124 @@
+import math
+import sqlite3
+import threading
+
+import numpy as np
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.elements import BinaryExpression
+from sqlalchemy.sql.operators import custom_op
+
+# --- SHIM DO PGVECTOR PARA O SQLITE (desenvolvimento e testes) ---
+# Os testes rodam em sqlite:///:memory:, onde os operadores do pgvector (<=>, <->, <#>)
+# não existem. Com este shim, a mesma consulta do ORM (SearchEngineVector) roda no SQLite:
+# - as colunas vetoriais (vector_storage.py) guardam o vetor como BLOB float32 empacotado
+# - os operadores viram funções SQL (cosine_distance, l2_distance, max_inner_product,
+#   l1_distance), registradas em toda conexão SQLite aberta pelo SQLAlchemy
+# Cada função decodifica os BLOBs sem cópia (np.frombuffer) e calcula com NumPy;
+# o vetor da query (mesmo BLOB em todas as linhas) é decodificado uma vez só.
+# Serve para exercitar e medir o caminho vetorial offline: o SQLite calcula a distância
+# linha a linha (sem índice ANN), como uma busca exata do pgvector.
+
+# Operador do pgvector -> função registrada no SQLite
+SQLITE_DISTANCE_FUNCTIONS = {
+    "<=>": "cosine_distance",
+    "<->": "l2_distance",
+    "<#>": "max_inner_product",
+    "<+>": "l1_distance",
+}
+
+
+def to_blob(values, dim: int) -> bytes:
+    values = np.asarray(values, dtype=np.float32).ravel()
+    if len(values) != dim:
+        raise ValueError(f"esperado vetor com {dim} dimensões, recebido {len(values)}")
+    return values.tobytes()
+
+
+def from_blob(value: bytes) -> np.ndarray:
+    # Cópia: o array devolvido ao ORM não pode depender do buffer do SQLite
+    return np.frombuffer(value, dtype=np.float32).copy()
+
+
+class _QueryVectorCache(threading.local):
+    """
+    Último vetor da direita decodificado (por thread): numa busca ele é o mesmo
+    BLOB para todas as linhas, então só a linha da tabela é decodificada a cada chamada.
+    """
+    blob = None
+    vector = None
+    norm = None
+
+    def get(self, blob: bytes):
+        if blob is not self.blob and blob != self.blob:
+            vector = np.frombuffer(blob, dtype=np.float32).astype(np.float64)
+            self.blob, self.vector, self.norm = blob, vector, float(np.sqrt(vector @ vector))
+        return self.vector, self.norm
+
+
+_query_cache = _QueryVectorCache()
+
+
+def _vectors(a: bytes, b: bytes):
+    x = np.frombuffer(a, dtype=np.float32).astype(np.float64)
+    y, y_norm = _query_cache.get(b)
+    if len(x) != len(y):
+        raise ValueError(f"dimensões diferentes ({len(x)} e {len(y)})")
+    return x, y, y_norm
+
+
+def cosine_distance(a, b):
+    if a is None or b is None:
+        return None
+    x, y, y_norm = _vectors(a, b)
+    norms = float(np.sqrt(x @ x)) * y_norm
+    if norms == 0:
+        # O pgvector devolve NaN (ordenado depois de tudo); o SQLite transformaria NaN em NULL
+        return math.inf
+    # Mesmo intervalo do pgvector: distância entre 0 e 2
+    return 1.0 - min(max(float(x @ y) / norms, -1.0), 1.0)
+
+
+def l2_distance(a, b):
+    if a is None or b is None:
+        return None
+    x, y, _ = _vectors(a, b)
+    diff = x - y
+    return float(np.sqrt(diff @ diff))
+
+
+def max_inner_product(a, b):
+    if a is None or b is None:
+        return None
+    x, y, _ = _vectors(a, b)
+    # <#> do pgvector: produto interno negativo (ORDER BY ascendente = maior produto primeiro)
+    return -float(x @ y)
+
+
+def l1_distance(a, b):
+    if a is None or b is None:
+        return None
+    x, y, _ = _vectors(a, b)
+    return float(np.abs(x - y).sum())
+
+
+@event.listens_for(Engine, "connect")
+def _register_functions(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    for function in (cosine_distance, l2_distance, max_inner_product, l1_distance):
+        dbapi_connection.create_function(function.__name__, 2, function, deterministic=True)
+
+
+@compiles(BinaryExpression, "sqlite")
+def _compile_distance_operator(binary, compiler, **kw):
+    # a <=> b  ->  cosine_distance(a, b); as demais expressões seguem o compilador padrão
+    operator = binary.operator
+    if isinstance(operator, custom_op) and operator.opstring in SQLITE_DISTANCE_FUNCTIONS:
+        return "%s(%s, %s)" % (
+            SQLITE_DISTANCE_FUNCTIONS[operator.opstring],
+            compiler.process(binary.left, **kw),
+            compiler.process(binary.right, **kw),
+        )
+    return compiler.visit_binary(binary, **kw)
@@ -0,0 +1,130 @@
+import os
+import re
+import threading
+from functools import lru_cache
+from typing import Iterable
+
+import nltk
+from unidecode import unidecode
+from nltk.corpus import stopwords
+from nltk.stem import SnowballStemmer
+
+# --- TOKENIZAÇÃO COMPARTILHADA ---
+# Usada pelo TfidfVectorizer (search_engine.py) e pelo HashingVectorizer
+# (embedding_service.py): os dois motores geram exatamente os mesmos tokens.
+# O stemming é o maior custo de CPU na indexação, por isso cada palavra é
+# "stemizada" uma vez só: dicionário pré-calculado com o vocabulário do corpus
+# + cache LRU limitado para as palavras novas (queries e escritas).
+
+try:
+    nltk.download('punkt', quiet=True)
+    nltk.download('stopwords', quiet=True)
+except Exception:
+    pass
+
+STEM_CACHE_SIZE = int(os.getenv("STEM_CACHE_SIZE", "65536"))
+
+# Inicialização de componentes globais
+stemmer = SnowballStemmer("portuguese")
+stop_words_pt = set(stopwords.words('portuguese'))
+
+# STOP WORDS:
+CORP_AND_COMMON_STOP_WORDS = {
+    'empresa', 'ltda', 's.a', 'eireli', 'companhia', 'solucoes', 'inovacao', 'tecnologia', 'group', 'grupo',
+    'de', 'a', 'o', 'e', 'do', 'da', 'dos', 'as', 'os', 'um', 'uma', 'uns', 'umas', 'para', 'na', 'no', 'em', 'por',
+    'foco', ',', 'quer', 'busco', 'ramo', 'com', 'eu', 'tu', 'ele', 'ela', 'documento', 'fazer', 'quero', 'peca', 'faz', 'que'
+}
+stop_words_pt.update(CORP_AND_COMMON_STOP_WORDS)
+stop_words_pt = frozenset(stop_words_pt)
+
+# Pré-filtro compilado: o mesmo que wordpunct_tokenize + "len > 1" + "isalnum()".
+# Sequências de [a-z0-9] com 2+ caracteres que não encostam em outro caractere
+# de palavra (tokens com "_" eram descartados pelo isalnum e continuam sendo).
+TOKEN_RE = re.compile(r"(?<!\w)[a-z0-9]{2,}(?!\w)")
+
+# Radicais pré-calculados do vocabulário do corpus (ver build_stem_dictionary)
+_stem_dictionary = {}
+_stem_dictionary_lock = threading.Lock()
+
+
+@lru_cache(maxsize=STEM_CACHE_SIZE)
+def _cached_stem(token: str) -> str:
+    return stemmer.stem(token)
+
+
+def stem(token: str) -> str:
+    """
+    Radical (Snowball português) de um token alfabético, sem recalcular.
+    """
+    stemmed = _stem_dictionary.get(token)
+    if stemmed is None:
+        stemmed = _cached_stem(token)
+    return stemmed
+
+
+def _normalize(text: str) -> str:
+    # Textos já normalizados (ex: company_search_text) não passam de novo pelo unidecode
+    if not text.isascii():
+        text = unidecode(text)
+    return text.lower()
+
+
+def _raw_tokens(text: str):
+    return (t for t in TOKEN_RE.findall(_normalize(text)) if t not in stop_words_pt)
+
+
+def query_words(text: str):
+    """
+    Palavras da query como o tokenizer as vê (normalizadas, sem stop words), antes do stemming.
+    """
+    return list(_raw_tokens(text))
+
+
+def surface_forms() -> dict:
+    """
+    Radical -> uma palavra do corpus com esse radical (a mais curta), a partir do
+    dicionário pré-calculado. Usado para escrever a query corrigida com palavras reais.
+    """
+    with _stem_dictionary_lock:
+        items = list(_stem_dictionary.items())
+    forms = {}
+    for word, stemmed in items:
+        current = forms.get(stemmed)
+        if current is None or (len(word), word) < (len(current), current):
+            forms[stemmed] = word
+    return forms
+
+
+def register_surface_forms(forms: dict):
+    """
+    Recoloca no dicionário pares radical -> palavra gravados com o índice
+    (snapshot em disco): o processo que anexa o snapshot não refaz o fit.
+    """
+    with _stem_dictionary_lock:
+        for stemmed, word in forms.items():
+            _stem_dictionary.setdefault(word, stemmed)
+
+
+def build_stem_dictionary(texts: Iterable[str]) -> int:
+    """
+    Pré-calcula o radical de cada palavra distinta do corpus (uma vez por palavra).
+    Chamado antes da indexação (SearchEngine._fit, import_data_vector.py) e
+    nas empresas adicionadas depois dela (SearchEngine.add_companies).
+    Devolve o tamanho do dicionário.
+    """
+    vocabulary = set()
+    for text in texts:
+        vocabulary.update(t for t in _raw_tokens(text) if t.isalpha())
+
+    novos = {t: stemmer.stem(t) for t in vocabulary if t not in _stem_dictionary}
+    with _stem_dictionary_lock:
+        _stem_dictionary.update(novos)
+    return len(_stem_dictionary)
+
+
+def custom_tokenizer(text):
+    """
+    Normalização (unidecode + lowercase), remoção de stop words e palavras
+    monossilábicas, stemming das palavras e números/códigos (ex: "3d") mantidos como estão.
+    """
+    return [stem(t) if t.isalpha() else t for t in _raw_tokens(text)]
@@ -0,0 +1,183 @@
+import math
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+# --- PLANEJAMENTO DA BUSCA VETORIAL COM FILTRO DE FASE ---
+# Com um índice ANN (HNSW/IVFFlat), o WHERE fase_da_startup = :fase é aplicado
+# depois do índice: o HNSW entrega ef_search vizinhos e o filtro descarta os de outras
+# fases. Fase rara = poucos (ou zero) resultados; sem índice = seq scan na tabela toda.
+# O planner escolhe a estratégia pela seletividade da fase (tabela de estatísticas
+# em memória, renovada a cada VECTOR_PHASE_STATS_TTL segundos):
+#   exato           fase pequena: distância calculada só nas linhas da fase (sem ANN)
+#   indice_parcial  fase com índice ANN parcial próprio (migração 5b0e2f7c91d4)
+#   ann_overfetch   fase comum: ANN com ef_search proporcional a 1/seletividade,
+#                   dobrado até achar os candidatos pedidos (banda do re-rank)
+
+VECTOR_PHASE_STATS_TTL = float(os.getenv("VECTOR_PHASE_STATS_TTL", "300"))
+# Fases com até esse nº de linhas com embedding vão para a busca exata
+VECTOR_EXACT_SCAN_MAX_ROWS = int(os.getenv("VECTOR_EXACT_SCAN_MAX_ROWS", "5000"))
+# Teto do ef_search no loop de overfetch (o máximo aceito pelo pgvector é 1000)
+VECTOR_MAX_EF_SEARCH = int(os.getenv("VECTOR_MAX_EF_SEARCH", "1000"))
+
+# --- CANDIDATOS DO RE-RANK (iterative deepening) ---
+# O SearchEngineVector busca os candidatos em bandas de distância e só pede a banda
+# seguinte se poucos passarem no score final, até estes limites por consulta:
+VECTOR_OVERFETCH_BUDGET_MS = float(os.getenv("VECTOR_OVERFETCH_BUDGET_MS", "50"))
+VECTOR_OVERFETCH_MAX_CANDIDATES = int(os.getenv("VECTOR_OVERFETCH_MAX_CANDIDATES", "200"))
+# Piso da taxa de sobrevivência (evita uma primeira banda gigante)
+VECTOR_MIN_SURVIVAL_RATE = 0.05
+
+# Índices parciais: ix_startups_embedding_vector_fase_<slug> ... WHERE fase_da_startup = '<fase>'
+PARTIAL_INDEX_PREFIX = "ix_startups_embedding_vector_fase_"
+_PARTIAL_PREDICATE_RE = re.compile(r"fase_da_startup\)?(?:::text)?\s*=\s*'((?:[^']|'')*)'")
+
+
+@dataclass(frozen=True)
+class VectorPlan:
+    strategy: str
+    # ef_search inicial (só ann_overfetch / indice_parcial)
+    ef_search: Optional[int] = None
+    # Linhas com embedding na fase (teto de candidatos possíveis)
+    phase_rows: Optional[int] = None
+
+
+@dataclass(frozen=True)
+class DistanceKeyset:
+    """
+    Fim da banda anterior: a próxima começa em `distance` (inclusive), sem os ids
+    já vistos nessa mesma distância (empates).
+    """
+    distance: float
+    tie_ids: Tuple[int, ...] = ()
+    # Candidatos já buscados (o ANN precisa passar por eles de novo)
+    seen: int = 0
+
+
+class PhaseStats:
+    """
+    Linhas com embedding por fase e fases com índice ANN parcial.
+    """
+    def __init__(self, ttl: float = VECTOR_PHASE_STATS_TTL):
+        self.ttl = ttl
+        self.rows_by_phase: Dict[str, int] = {}
+        self.total_rows = 0
+        self.partial_index_phases = frozenset()
+        self.refreshed_at = None
+        self._lock = threading.Lock()
+
+    def stale(self) -> bool:
+        return self.refreshed_at is None or time.monotonic() - self.refreshed_at > self.ttl
+
+    def refresh(self, db: Session):
+        rows = db.execute(text(
+            "SELECT fase_da_startup, count(*) FROM startups "
+            "WHERE embedding_vector IS NOT NULL GROUP BY fase_da_startup"
+        )).all()
+        indexes = db.execute(text(
+            "SELECT indexdef FROM pg_indexes WHERE tablename = 'startups' AND indexname LIKE :prefix"
+        ), {"prefix": PARTIAL_INDEX_PREFIX + "%"}).all()
+
+        partial = set()
+        for (indexdef,) in indexes:
+            match = _PARTIAL_PREDICATE_RE.search(indexdef)
+            if match:
+                partial.add(match.group(1).replace("''", "'"))
+
+        with self._lock:
+            self.rows_by_phase = {phase: int(count) for phase, count in rows}
+            self.total_rows = sum(self.rows_by_phase.values())
+            self.partial_index_phases = frozenset(partial)
+            self.refreshed_at = time.monotonic()
+
+    def ensure_fresh(self, db: Session):
+        if not self.stale():
+            return
+        try:
+            # Savepoint: um erro aqui não pode abortar a transação da busca
+            with db.begin_nested():
+                self.refresh(db)
+        except Exception as e:
+            # Sem estatísticas o planner cai na busca exata (sempre correta)
+            print(f"Aviso: falha ao atualizar as estatísticas de fase da busca vetorial: {e}")
+            with self._lock:
+                self.refreshed_at = time.monotonic()
+
+    def plan(self, fase: Optional[str], candidate_limit: int, base_ef_search: int) -> VectorPlan:
+        """
+        Estratégia para a fase pedida (None = sem filtro).
+        """
+        if not fase:
+            return VectorPlan("ann", ef_search=base_ef_search)
+        with self._lock:
+            phase_rows = self.rows_by_phase.get(fase, 0)
+            total_rows = self.total_rows
+            has_partial_index = fase in self.partial_index_phases
+
+        if phase_rows <= VECTOR_EXACT_SCAN_MAX_ROWS:
+            # Inclui fases desconhecidas (estatística velha ou fase nova): a busca exata nunca perde linhas
+            return VectorPlan("exato", phase_rows=phase_rows)
+        if has_partial_index:
+            # O índice parcial só tem linhas da fase: o ef_search normal basta
+            return VectorPlan("indice_parcial", ef_search=base_ef_search, phase_rows=phase_rows)
+
+        selectivity = phase_rows / total_rows if total_rows else 1.0
+        # Em média ef_search * seletividade vizinhos sobrevivem ao filtro (margem de 50%)
+        ef_search = math.ceil(candidate_limit / selectivity * 1.5)
+        ef_search = min(max(ef_search, base_ef_search, candidate_limit), VECTOR_MAX_EF_SEARCH)
+        return VectorPlan("ann_overfetch", ef_search=ef_search, phase_rows=phase_rows)
+
+
+class SurvivalStats:
+    """
+    Fração dos candidatos vetoriais que passa no score final, por nº de palavras
+    da query (média móvel exponencial). Define o tamanho da primeira banda:
+    consultas curtas (nome de empresa) costumam aprovar quase tudo, as longas não.
+    """
+    def __init__(self, default_rate: float, alpha: float = 0.2, max_words: int = 5):
+        self.default_rate = default_rate
+        self.alpha = alpha
+        self.max_words = max_words
+        self.rates: Dict[int, float] = {}
+        self.queries: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, query: str) -> int:
+        return min(max(len(query.split()), 1), self.max_words)
+
+    def rate(self, query: str) -> float:
+        return self.rates.get(self._bucket(query), self.default_rate)
+
+    def initial_fetch(self, query: str, limit: int, max_candidates: int = VECTOR_OVERFETCH_MAX_CANDIDATES) -> int:
+        # Candidatos para, na média, `limit` passarem no score final
+        fetch = math.ceil(limit / max(self.rate(query), VECTOR_MIN_SURVIVAL_RATE))
+        return min(max(fetch, limit), max(max_candidates, limit))
+
+    def record(self, query: str, fetched: int, survived: int):
+        if fetched <= 0:
+            return
+        bucket = self._bucket(query)
+        observed = min(survived / fetched, 1.0)
+        with self._lock:
+            previous = self.rates.get(bucket)
+            self.rates[bucket] = observed if previous is None else previous + self.alpha * (observed - previous)
+            self.queries[bucket] = self.queries.get(bucket, 0) + 1
+
+    def snapshot(self) -> Dict[int, dict]:
+        with self._lock:
+            return {
+                bucket: {"taxa": round(rate, 4), "consultas": self.queries.get(bucket, 0)}
+                for bucket, rate in sorted(self.rates.items())
+            }
+
+
+# --- Variável Global Singleton ---
+phase_stats = PhaseStats()
+# Sem observações, a primeira banda é limit * 3 (o overfetch fixo de antes)
+survival_stats = SurvivalStats(default_rate=1 / 3)
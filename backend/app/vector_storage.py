@@ -0,0 +1,159 @@
+import os
+
+import numpy as np
+from scipy import sparse
+from pgvector import HalfVector, SparseVector
+from pgvector.sqlalchemy import HALFVEC, SPARSEVEC, Vector
+
+from . import sqlite_vector
+
+# --- REPRESENTAÇÃO DO EMBEDDING NO BANCO ---
+# O HashingVectorizer gera 1024 dimensões com poucas dezenas de valores diferentes
+# de zero. Guardado como vector(1024) (float32 denso), cada linha ocupa ~4 KB quase
+# só de zeros. EMBEDDING_STORAGE escolhe a representação da coluna embedding_vector
+# (a migração 8d3a6c1e4b27 converte as linhas existentes), usada de ponta a ponta:
+# coluna, embeddings gravados pelo crud/importação e vetor da query.
+#   vector     float32 denso (4 KB por linha; padrão, formato original)
+#   halfvec    float16 denso (2 KB por linha; índices HNSW e IVFFlat)
+#   sparsevec  só os valores diferentes de zero (~8 bytes por valor; só índice HNSW)
+
+EMBEDDING_DIMENSIONS = 1024
+
+
+# --- PARÂMETROS VETORIAIS (SÓ NAS COLUNAS VETORIAIS) ---
+# O psycopg2 só envia parâmetros em texto: o formato binário do pgvector (vector_recv)
+# não tem como ser usado por ele. O caminho mais curto é montar o texto direto do
+# array NumPy: os zeros (quase todo o vetor de hashing) viram a constante "0" e só
+# os valores diferentes de zero passam por float -> str, sem lista de floats em Python.
+
+def _dense_text(values, dim: int) -> str:
+    values = np.asarray(values, dtype=np.float32).ravel()
+    if len(values) != dim:
+        raise ValueError(f"esperado vetor com {dim} dimensões, recebido {len(values)}")
+    parts = ["0"] * dim
+    nonzero = np.flatnonzero(values)
+    for i, value in zip(nonzero.tolist(), values[nonzero].tolist()):
+        parts[i] = repr(value)
+    return "[" + ",".join(parts) + "]"
+
+
+def _sparse_text(values, dim: int) -> str:
+    values = np.asarray(values, dtype=np.float32).ravel()
+    if len(values) != dim:
+        raise ValueError(f"esperado vetor com {dim} dimensões, recebido {len(values)}")
+    nonzero = np.flatnonzero(values)
+    # sparsevec: índices a partir de 1
+    items = ",".join(f"{i + 1}:{value!r}" for i, value in zip(nonzero.tolist(), values[nonzero].tolist()))
+    return "{" + items + "}/" + str(dim)
+
+
+def _dense_array(value):
+    # Valor lido da coluna (array, HalfVector ou SparseVector) como array float32 denso
+    if hasattr(value, "to_numpy"):
+        value = value.to_numpy()
+    return np.asarray(value, dtype=np.float32).ravel()
+
+
+def _is_sqlite(dialect) -> bool:
+    return getattr(dialect, "name", None) == "sqlite"
+
+
+class _ArrayBindMixin:
+    """
+    Arrays NumPy viram texto do pgvector pelo caminho rápido; os demais valores
+    (listas, HalfVector, SparseVector) seguem pelo tipo original do pgvector.
+    No SQLite (testes/desenvolvimento) o vetor vira BLOB float32: ver sqlite_vector.py.
+    """
+    _array_to_text = staticmethod(_dense_text)
+    # Tipo devolvido ao ler do SQLite (o mesmo que o pgvector devolve no Postgres)
+    _from_sqlite = staticmethod(sqlite_vector.from_blob)
+
+    def bind_processor(self, dialect):
+        if _is_sqlite(dialect):
+            def process_sqlite(value):
+                if value is None:
+                    return None
+                return sqlite_vector.to_blob(_dense_array(value), self.dim)
+            return process_sqlite
+
+        default = super().bind_processor(dialect)
+
+        def process(value):
+            if isinstance(value, np.ndarray):
+                return self._array_to_text(value, self.dim)
+            return default(value)
+        return process
+
+    def result_processor(self, dialect, coltype):
+        if _is_sqlite(dialect):
+            def process_sqlite(value):
+                if value is None:
+                    return None
+                return self._from_sqlite(value)
+            return process_sqlite
+        return super().result_processor(dialect, coltype)
+
+
+class EmbeddingVector(_ArrayBindMixin, Vector):
+    cache_ok = True
+
+
+class EmbeddingHalfVec(_ArrayBindMixin, HALFVEC):
+    cache_ok = True
+    _from_sqlite = staticmethod(lambda value: HalfVector(sqlite_vector.from_blob(value)))
+
+
+class EmbeddingSparseVec(_ArrayBindMixin, SPARSEVEC):
+    cache_ok = True
+    _array_to_text = staticmethod(_sparse_text)
+    _from_sqlite = staticmethod(lambda value: SparseVector(sqlite_vector.from_blob(value)))
+
+
+EMBEDDING_STORAGE_TYPES = {
+    "vector": EmbeddingVector,
+    "halfvec": EmbeddingHalfVec,
+    "sparsevec": EmbeddingSparseVec,
+}
+EMBEDDING_STORAGE = os.getenv("EMBEDDING_STORAGE", "vector").lower()
+if EMBEDDING_STORAGE not in EMBEDDING_STORAGE_TYPES:
+    raise ValueError(f"EMBEDDING_STORAGE inválido: '{EMBEDDING_STORAGE}' (use {', '.join(EMBEDDING_STORAGE_TYPES)})")
+
+
+def column_type():
+    """
+    Tipo SQLAlchemy da coluna embedding_vector (models.Empresa).
+    """
+    return EMBEDDING_STORAGE_TYPES[EMBEDDING_STORAGE](EMBEDDING_DIMENSIONS)
+
+
+def column_sql() -> str:
+    """
+    Tipo da coluna em SQL (ex: "halfvec(1024)"), para DDL escrito à mão.
+    """
+    return f"{EMBEDDING_STORAGE}({EMBEDDING_DIMENSIONS})"
+
+
+def to_storage(sparse_row):
+    """
+    Linha esparsa do HashingVectorizer (1 x EMBEDDING_DIMENSIONS) no formato da coluna.
+    """
+    if EMBEDDING_STORAGE == "sparsevec":
+        # Sem densificar: só os índices e valores diferentes de zero
+        return SparseVector(sparse_row)
+    # vector e halfvec: array float32 (o arredondamento para float16 fica com o Postgres)
+    return sparse_row.toarray().ravel().astype(np.float32)
+
+
+def to_sparse_matrix(values, chunk_size: int = 1024):
+    """
+    Valores lidos da coluna como matriz CSR float32 (len(values) x EMBEDDING_DIMENSIONS),
+    para o motor vetorial em memória. Densifica em blocos: converter linha a linha
+    (uma csr_matrix por empresa) é ~10x mais lento na carga inicial.
+    """
+    blocks = [
+        sparse.csr_matrix(np.vstack([_dense_array(value) for value in values[start:start + chunk_size]]))
+        for start in range(0, len(values), chunk_size)
+    ]
+    if not blocks:
+        return sparse.csr_matrix((0, EMBEDDING_DIMENSIONS), dtype=np.float32)
+    return sparse.vstack(blocks, format="csr")
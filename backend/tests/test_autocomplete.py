@@ -0,0 +1,62 @@
+import time
+from ..app.autocomplete import PrefixIndex
+
+
+# --- MOCK CLASS ---
+class MockEmpresa:
+    def __init__(self, id, nome_da_empresa, setor_principal, tag=None, fase_da_startup="Operação"):
+        self.id = id
+        self.nome_da_empresa = nome_da_empresa
+        self.setor_principal = setor_principal
+        self.tag = tag
+        self.fase_da_startup = fase_da_startup
+
+
+def build_index():
+    index = PrefixIndex()
+    index.bulk_load([
+        MockEmpresa(1, "AgroSense BR", "Agrotech", tag="agro"),
+        MockEmpresa(2, "Smart Agro", "Agrotech", fase_da_startup="Seed"),
+        MockEmpresa(3, "CyberGuard Pro", "Segurança da Informação", tag="seguranca"),
+    ])
+    return index
+
+
+def test_prefixo_casa_inicio_de_palavra_e_normaliza():
+    index = build_index()
+    sugestoes = index.suggest("AGRO")
+
+    assert {"texto": "AgroSense BR", "campo": "nome_da_empresa", "empresa_id": 1} in sugestoes
+    assert {"texto": "Smart Agro", "campo": "nome_da_empresa", "empresa_id": 2} in sugestoes
+    # O setor aparece uma vez só, mesmo com duas empresas
+    assert [s for s in sugestoes if s["campo"] == "setor_principal"] == [{"texto": "Agrotech", "campo": "setor_principal", "empresa_id": None}]
+    # Acentos e maiúsculas não importam
+    assert index.suggest("segurança")[0]["texto"] in ("Segurança da Informação", "seguranca")
+    assert index.suggest("xyz") == []
+
+
+def test_filtro_de_fase_e_limite():
+    index = build_index()
+    assert [(s["texto"], s["empresa_id"]) for s in index.suggest("agro", fase="Seed")] == [("Smart Agro", 2), ("Agrotech", None)]
+    assert len(index.suggest("a", limit=2)) == 2
+
+
+def test_escritas_atualizam_o_indice():
+    index = build_index()
+    index.upsert(MockEmpresa(3, "GuardMesh", "Segurança da Informação"))
+    assert not any(s["texto"] == "CyberGuard Pro" for s in index.suggest("cyber"))
+    assert index.suggest("guardm")[0]["empresa_id"] == 3
+
+    index.remove(1)
+    assert not any(s.get("empresa_id") == 1 for s in index.suggest("agro"))
+
+
+def test_resposta_abaixo_de_um_milissegundo():
+    index = PrefixIndex()
+    index.bulk_load(MockEmpresa(i, f"Empresa {i} Agro", "Agrotech", tag=f"tag{i % 50}") for i in range(20000))
+    index.suggest("agro")
+
+    inicio = time.perf_counter()
+    for _ in range(100):
+        index.suggest("empresa 19")
+    assert (time.perf_counter() - inicio) / 100 < 0.001
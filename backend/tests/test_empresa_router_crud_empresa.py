@@ -1,6 +1,7 @@
+import numpy as np
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, select
 from sqlalchemy.orm import sessionmaker, Session
 from typing import Generator
 from http import HTTPStatus
@@ -8,7 +9,8 @@ from http import HTTPStatus
 # Importar a aplicação e os componentes necessários
 from ..app.main import app
 from ..app.database import get_db, table_registry
-from ..app import models
+from ..app import models, crud, embedding_service
+from ..app.search_engine_vector import SearchEngineVector
 from ..app.security import get_current_user
 
 # --- Configuração do Banco de Dados de Teste (SQLite em memória) ---
@@ -193,4 +195,45 @@ def test_create_empresa_invalid_cnpj(client: TestClient):
     }
     
     response = client.post("/empresa/", json=payload)
-    assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY # 422,
\ No newline at end of file
+    assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY # 422,
+
+def test_embedding_vector_so_carrega_quando_pedido(client: TestClient, db_session):
+    """O embedding_vector é deferred: leituras normais não o trazem do banco"""
+    db, _, _ = db_session
+    response = client.post("/empresa/", json={
+        "nome_da_empresa": "Vetor Deferred", "endereco": "Rua A, 1", "cnpj": "22.222.222/0001-22",
+        "ano_de_fundacao": 2024, "email": "a@b.com", "setor_principal": "Agrotech", "setor_secundario": "IA",
+        "fase_da_startup": "Seed", "colaboradores": "1-10", "publico_alvo": "B2B", "modelo_de_negocio": "SaaS",
+        "recebeu_investimento": "Não", "negocios_no_exterior": "Não", "faturamento": "R$ 0", "patente": "Não",
+        "ja_pivotou": "Não", "comunidades": "MTI", "solucao": "Monitoramento de safras com sensores",
+    })
+    assert response.status_code == HTTPStatus.CREATED
+    empresa_id = response.json()["id"]
+    db.expunge_all()
+
+    empresa = crud.get_empresa(db, empresa_id)
+    assert "embedding_vector" in inspect(empresa).unloaded
+    assert all("embedding_vector" in inspect(e).unloaded for e in crud.get_all_empresas(db))
+    db.expunge_all()
+
+    empresa = crud.get_empresa(db, empresa_id, with_embedding=True)
+    assert "embedding_vector" not in inspect(empresa).unloaded
+    assert len(empresa.embedding_vector) == 1024
+
+
+def test_busca_vetorial_roda_no_sqlite(db_session):
+    """A consulta do pgvector (<=>) roda no SQLite pelo shim (sqlite_vector.py)."""
+    db, test_empresa, _ = db_session
+    test_empresa.embedding_vector = embedding_service.generate_embedding(test_empresa)
+    db.commit()
+
+    query_vector = embedding_service.generate_query_embedding("Empresa de Teste Original")
+    distance = db.execute(
+        select(models.Empresa.embedding_vector.cosine_distance(query_vector))
+    ).scalar_one()
+    stored = db.execute(select(models.Empresa.embedding_vector)).scalar_one()
+    expected = 1 - stored @ query_vector / (np.linalg.norm(stored) * np.linalg.norm(query_vector))
+    assert distance == pytest.approx(expected, abs=1e-6)
+
+    results = SearchEngineVector().optimized_search_vector(db, "Empresa de Teste Original")
+    assert [empresa.id for empresa in results] == [test_empresa.id]
@@ -0,0 +1,59 @@
+import time
+from ..app import hybrid_search as hybrid
+
+
+def test_rrf_combina_as_duas_listas():
+    rankings = {"tfidf": [1, 2, 3], "vector": [3, 1, 4]}
+    # 1: 1/61 + 1/62 | 3: 1/63 + 1/61 | 2: 1/62 | 4: 1/63
+    assert hybrid.reciprocal_rank_fusion(rankings) == [1, 3, 2, 4]
+    assert hybrid.reciprocal_rank_fusion({}) == []
+
+
+def test_motor_lento_vira_resultado_parcial():
+    def lento():
+        time.sleep(1)
+        return [9]
+
+    inicio = time.monotonic()
+    rankings, failed = hybrid.run_engines({"tfidf": lambda: [1, 2], "vector": lento}, timeout=0.1)
+
+    assert time.monotonic() - inicio < 0.5
+    assert rankings == {"tfidf": [1, 2]}
+    assert failed == {"vector": "timeout"}
+
+
+def test_motor_com_erro_nao_derruba_a_busca():
+    def quebrado():
+        raise RuntimeError("sem banco")
+
+    rankings, failed = hybrid.run_engines({"tfidf": quebrado, "vector": lambda: [3]}, timeout=1)
+    assert rankings == {"vector": [3]}
+    assert failed == {"tfidf": "erro"}
+
+
+def test_tfidf_lento_vira_resultado_parcial():
+    def lento():
+        time.sleep(1)
+        return [1]
+
+    inicio = time.monotonic()
+    rankings, failed = hybrid.run_engines({"tfidf": lento, "vector": lambda: [3]}, timeout=0.2)
+
+    assert time.monotonic() - inicio < 0.5
+    assert rankings == {"vector": [3]}
+    assert failed == {"tfidf": "timeout"}
+
+
+def test_espera_na_fila_conta_no_prazo(monkeypatch):
+    executor = hybrid.ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(hybrid, "_executor", executor)
+    # Pool ocupado por outro request: os motores nem começam dentro do prazo
+    executor.submit(time.sleep, 0.5)
+
+    inicio = time.monotonic()
+    rankings, failed = hybrid.run_engines({"tfidf": lambda: [1], "vector": lambda: [3]}, timeout=0.2)
+
+    assert time.monotonic() - inicio < 0.4
+    assert rankings == {}
+    assert failed == {"tfidf": "timeout", "vector": "timeout"}
+    executor.shutdown()
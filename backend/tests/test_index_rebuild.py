@@ -0,0 +1,286 @@
+import mmap
+import threading
+from ..app import search_engine as se_tfidf
+from ..app import tokenizer
+from ..app.index_rebuild import RebuildCoordinator
+from ..app.index_generations import SharedWriteLog
+
+
+# --- MOCK CLASS ---
+class MockEmpresa:
+    def __init__(self, id, nome_da_empresa, solucao, setor_principal="Agrotech", setor_secundario="IA", fase_da_startup="Operação", tag=None):
+        self.id = id
+        self.nome_da_empresa = nome_da_empresa
+        self.solucao = solucao
+        self.setor_principal = setor_principal
+        self.setor_secundario = setor_secundario
+        self.fase_da_startup = fase_da_startup
+        self.tag = tag
+
+
+class FakeSession:
+    def __init__(self, companies):
+        self.companies = companies
+    def query(self, *columns):
+        return self
+    def filter(self, *criteria):
+        return self
+    def all(self):
+        return list(self.companies)
+    def close(self):
+        pass
+
+
+def test_rebuild_troca_indice_e_reaplica_journal(monkeypatch):
+    corpus = [
+        MockEmpresa(1, "AgroSense BR", "Plataforma de IA para logística agrícola"),
+        MockEmpresa(2, "CyberGuard Pro", "Software de segurança com machine learning"),
+    ]
+    antigo = se_tfidf.SearchEngine(corpus[:1])
+    monkeypatch.setattr(se_tfidf, "search_engine_instance", antigo)
+
+    coordinator = RebuildCoordinator(session_factory=lambda: FakeSession(corpus))
+
+    # Uma escrita chega enquanto o build roda: vai para o journal
+    build_original = se_tfidf.SearchEngine
+    def build_com_escrita(*args, **kwargs):
+        engine = build_original(*args, **kwargs)
+        with coordinator.write_lock:
+            coordinator.record_remove(1)
+        return engine
+    monkeypatch.setattr(se_tfidf, "SearchEngine", build_com_escrita)
+
+    assert coordinator.rebuild("teste")
+
+    novo = se_tfidf.search_engine_instance
+    assert novo is not antigo
+    assert [c.id for c in novo.optimized_search("segurança machine learning")] == [2]
+    assert 1 not in novo.row_by_id
+    # O índice antigo (de buscas em andamento) não foi alterado
+    assert 1 in antigo.row_by_id
+
+    assert coordinator.status["corpus_size"] == 2
+    assert coordinator.status["replayed_writes"] == 1
+    assert coordinator.status["duration_seconds"] is not None
+    assert not coordinator.building
+
+
+def test_trigger_nao_roda_dois_rebuilds(monkeypatch):
+    liberar = threading.Event()
+
+    def session_lenta():
+        liberar.wait(5)
+        return FakeSession([])
+
+    monkeypatch.setattr(se_tfidf, "search_engine_instance", None)
+    coordinator = RebuildCoordinator(session_factory=session_lenta)
+
+    assert coordinator.trigger("teste")
+    assert not coordinator.trigger("teste")
+    liberar.set()
+    coordinator._thread.join(5)
+    assert coordinator.status["state"] == "idle"
+    assert coordinator.status["corpus_size"] == 0
+
+
+def test_snapshot_em_disco_carrega_sem_fit(tmp_path, monkeypatch, capsys):
+    corpus = [
+        MockEmpresa(1, "AgroSense BR", "Plataforma de IA para logística agrícola"),
+        MockEmpresa(2, "CyberGuard Pro", "Software de segurança com machine learning"),
+        MockEmpresa(3, "ProtoMesh 3D", "Impressão 3D industrial e prototipagem rápida", fase_da_startup="Seed"),
+    ]
+    fingerprint = se_tfidf.corpus_fingerprint(corpus)
+    original = se_tfidf.SearchEngine(corpus)
+    original.save(str(tmp_path), fingerprint)
+
+    # O carregamento não pode refazer o fit
+    def sem_fit(*args, **kwargs):
+        raise AssertionError("fit não deveria rodar")
+    monkeypatch.setattr(se_tfidf.TfidfVectorizer, "fit_transform", sem_fit)
+
+    capsys.readouterr()
+    carregado = se_tfidf.SearchEngine.load(str(tmp_path), list(reversed(corpus)), fingerprint)
+    # Anexar um snapshot não é um índice vazio
+    assert "sem dados" not in capsys.readouterr().out
+    for query, fase in [("logística agrícola", None), ("impressão 3D", "Seed"), ("machine learning", None)]:
+        assert [c.id for c in carregado.optimized_search(query, fase=fase)] == [c.id for c in original.optimized_search(query, fase=fase)]
+
+    # Escritas depois do carregamento continuam funcionando (arrays mapeados são só leitura)
+    carregado.COMPACTION_RATIO = 2.0
+    carregado.add_company(MockEmpresa(4, "AgroDrone", "Drones para logística agrícola"))
+    assert 4 in [c.id for c in carregado.optimized_search("drones")]
+
+    # Corpus diferente: snapshot inválido
+    corpus[0].solucao = "Outra solução"
+    assert se_tfidf.SearchEngine.load(str(tmp_path), corpus, se_tfidf.corpus_fingerprint(corpus)) is None
+
+
+def test_rebuild_de_arranque_usa_o_snapshot(tmp_path, monkeypatch):
+    corpus = [MockEmpresa(1, "AgroSense BR", "Plataforma de IA para logística agrícola")]
+    monkeypatch.setattr(se_tfidf, "search_engine_instance", None)
+    coordinator = RebuildCoordinator(session_factory=lambda: FakeSession(corpus), index_dir=str(tmp_path))
+
+    assert coordinator.rebuild("startup")
+    assert coordinator.status["source"] == "fit"
+    assert coordinator.rebuild("startup")
+    assert coordinator.status["source"] == "disk"
+    # Rebuild pedido explicitamente sempre refaz o fit
+    assert coordinator.rebuild("endpoint")
+    assert coordinator.status["source"] == "fit"
+
+
+def test_fingerprint_decide_entre_anexar_e_reconciliar(tmp_path, monkeypatch):
+    corpus = [
+        MockEmpresa(1, "AgroSense BR", "Plataforma de IA para logística agrícola"),
+        MockEmpresa(2, "CyberGuard Pro", "Software de segurança com machine learning"),
+    ]
+    monkeypatch.setattr(se_tfidf, "search_engine_instance", None)
+    coordinator = RebuildCoordinator(session_factory=lambda: FakeSession(corpus), index_dir=str(tmp_path))
+    assert coordinator.rebuild("startup")
+
+    # Fingerprint igual: as linhas não são conferidas uma a uma
+    text_hash = se_tfidf.text_hash
+    def sem_hash(company):
+        raise AssertionError("hash por linha não deveria rodar")
+    monkeypatch.setattr(se_tfidf, "text_hash", sem_hash)
+    assert coordinator.rebuild("startup")
+    assert coordinator.status["source"] == "disk"
+
+    # Fingerprint diferente: a geração é reconciliada com o banco (sem fit)
+    monkeypatch.setattr(se_tfidf, "text_hash", text_hash)
+    corpus[1].solucao = "Impressão 3D industrial"
+    assert coordinator.rebuild("startup")
+    assert coordinator.status["source"] == "disk"
+    assert [c.id for c in se_tfidf.search_engine_instance.optimized_search("impressão 3D")] == [2]
+
+
+def mapeado_em_memoria(array):
+    # Sobe a cadeia de .base até o buffer de origem
+    while array is not None and not isinstance(array, mmap.mmap):
+        array = getattr(array, "base", None)
+    return array is not None
+
+
+def test_workers_compartilham_geracoes(tmp_path, monkeypatch):
+    """
+    Dois coordenadores no mesmo diretório simulam dois workers: só o primeiro faz o fit;
+    o segundo anexa a geração publicada (mmap) e re-anexa quando sai uma geração nova.
+    """
+    corpus = [
+        MockEmpresa(1, "AgroSense BR", "Plataforma de IA para logística agrícola"),
+        MockEmpresa(2, "CyberGuard Pro", "Software de segurança com machine learning"),
+    ]
+    monkeypatch.setattr(se_tfidf, "search_engine_instance", None)
+    worker_a = RebuildCoordinator(session_factory=lambda: FakeSession(corpus), index_dir=str(tmp_path))
+    worker_b = RebuildCoordinator(session_factory=lambda: FakeSession(corpus), index_dir=str(tmp_path))
+
+    assert worker_a.rebuild("startup")
+    assert (worker_a.status["source"], worker_a.generation) == ("fit", "gen-000001")
+    assert worker_b.rebuild("startup")
+    assert (worker_b.status["source"], worker_b.generation) == ("disk", "gen-000001")
+    assert mapeado_em_memoria(se_tfidf.search_engine_instance.postings.data)
+    assert not worker_b.check_generation()
+
+    # O banco mudou e o worker A publicou uma geração nova
+    corpus[1].solucao = "Impressão 3D industrial"
+    assert worker_a.rebuild("endpoint")
+    assert worker_a.generation == "gen-000002"
+
+    assert worker_b.check_generation()
+    worker_b._thread.join(5)
+    assert (worker_b.status["source"], worker_b.generation) == ("disk", "gen-000002")
+    assert [c.id for c in se_tfidf.search_engine_instance.optimized_search("impressão 3D")] == [2]
+
+
+def test_geracao_antiga_e_reconciliada_com_o_banco(tmp_path):
+    corpus = [
+        MockEmpresa(1, "AgroSense BR", "Plataforma de IA para logística agrícola"),
+        MockEmpresa(2, "CyberGuard Pro", "Software de segurança com machine learning"),
+    ]
+    se_tfidf.SearchEngine(corpus).save(str(tmp_path), se_tfidf.corpus_fingerprint(corpus))
+
+    # Depois do snapshot: empresa 1 removida, 2 alterada e 3 criada
+    atual = [
+        MockEmpresa(2, "CyberGuard Pro", "Drones para monitoramento de lavouras"),
+        MockEmpresa(3, "NutriOne", "Plataforma para nutricionistas"),
+    ]
+    engine = se_tfidf.SearchEngine.load(str(tmp_path), atual)
+    engine.COMPACTION_RATIO = 2.0
+
+    assert set(engine.row_by_id) == {2, 3}
+    # As linhas reconciliadas vão juntas para o bloco delta: a base continua mapeada do disco
+    assert engine.delta_vectors.shape[0] == 2
+    for matrix in (engine.base_vectors, engine.postings):
+        for array in (matrix.data, matrix.indices, matrix.indptr):
+            assert mapeado_em_memoria(array)
+    assert engine.optimized_search("logística agrícola") == []
+    assert [c.id for c in engine.optimized_search("drones lavouras")] == [2]
+    assert [c.id for c in engine.optimized_search("nutricionistas")] == [3]
+    # Termos que só existem nas linhas reconciliadas também entram no corretor
+    corrected, corrections = engine.correct_query("nutrisionistas")
+    assert corrections == {"nutrisionistas": "nutricionistas"}
+    assert [c.id for c in engine.optimized_search(corrected)] == [3]
+
+
+def test_snapshot_anexado_corrige_com_palavras_reais(tmp_path, monkeypatch):
+    corpus = [
+        MockEmpresa(1, "AgroSense BR", "Plataforma de agricultura de precisão"),
+        MockEmpresa(2, "MedOnline", "Telemedicina para clínicas"),
+    ]
+    se_tfidf.SearchEngine(corpus).save(str(tmp_path), se_tfidf.corpus_fingerprint(corpus))
+
+    # Outro processo: o dicionário de radicais do fit não existe nele
+    monkeypatch.setattr(tokenizer, "_stem_dictionary", {})
+    engine = se_tfidf.SearchEngine.load(str(tmp_path), corpus, se_tfidf.corpus_fingerprint(corpus))
+
+    corrected, corrections = engine.correct_query("plataforna de agricultra e telemedicna")
+    assert corrections == {"plataforna": "plataforma", "agricultra": "agricultura", "telemedicna": "telemedicina"}
+    assert corrected == "plataforma de agricultura e telemedicina"
+
+
+def test_escritas_de_um_worker_chegam_nos_outros(tmp_path, monkeypatch):
+    corpus = [
+        MockEmpresa(1, "AgroSense BR", "Plataforma de IA para logística agrícola"),
+        MockEmpresa(2, "CyberGuard Pro", "Software de segurança com machine learning"),
+    ]
+    monkeypatch.setattr(se_tfidf, "search_engine_instance", None)
+    worker_a = RebuildCoordinator(session_factory=lambda: FakeSession(corpus), index_dir=str(tmp_path))
+    worker_b = RebuildCoordinator(session_factory=lambda: FakeSession(corpus), index_dir=str(tmp_path))
+    assert worker_a.rebuild("startup")
+    assert worker_b.rebuild("startup")
+    engine_b = se_tfidf.search_engine_instance
+    engine_b.COMPACTION_RATIO = 2.0
+
+    # O worker A cria a empresa 3 e apaga a 1 (no banco) e anota as escritas
+    corpus.append(MockEmpresa(3, "NutriOne", "Plataforma para nutricionistas"))
+    worker_a.share_write(3)
+    del corpus[0]
+    worker_a.share_write(1)
+
+    assert worker_b.replay_writes() == 2
+    assert [c.id for c in engine_b.optimized_search("nutricionistas")] == [3]
+    assert 1 not in engine_b.row_by_id
+    # As próprias escritas não são re-aplicadas e o log não é lido duas vezes
+    worker_b.share_write(2)
+    assert worker_b.replay_writes() == 0
+
+
+def test_log_de_escritas_rotaciona_sem_perder_linhas(tmp_path):
+    log = SharedWriteLog(str(tmp_path), max_bytes=8)
+    position = log.position()
+    log.append("a", 1)
+    log.append("a", 2)
+    entries, position, complete = log.read_since(position)
+    assert (entries, complete) == ([("a", 1), ("a", 2)], True)
+
+    # O segmento passou de max_bytes: as escritas seguintes vão para um segmento novo
+    log.append("b", 3)
+    log.append("b", 4)
+    assert len(log._segments()) == 2
+    entries, position, complete = log.read_since(position)
+    assert (entries, complete) == ([("b", 3), ("b", 4)], True)
+
+    # Duas rotações sem leitura: o leitor fica sabendo que perdeu escritas
+    for company_id in range(5, 11):
+        log.append("c", company_id)
+    assert log.read_since(position)[2] is False
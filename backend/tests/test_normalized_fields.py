@@ -0,0 +1,58 @@
+import pytest
+from unidecode import unidecode
+from fuzzywuzzy import fuzz
+
+from ..app.normalized_fields import NormalizedFieldStore
+
+
+class MockEmpresa:
+    def __init__(self, id, nome_da_empresa, solucao, setor_principal="Saúde", setor_secundario="Bem-estar", tag=None):
+        self.id = id
+        self.nome_da_empresa = nome_da_empresa
+        self.solucao = solucao
+        self.setor_principal = setor_principal
+        self.setor_secundario = setor_secundario
+        self.tag = tag
+
+
+def test_store_reaproveita_e_detecta_mudanca():
+    store = NormalizedFieldStore()
+    empresa = MockEmpresa(1, "NutriOne", "Plataforma para nutricionistas", tag="Saúde")
+
+    campos = store.get(empresa)
+    assert campos.nome == "nutrione"
+    assert campos.tag == "saude"
+    # Sem mudança nos campos crus: o mesmo objeto é devolvido
+    assert store.get(empresa) is campos
+
+    empresa.nome_da_empresa = "NutriTwo"
+    assert store.get(empresa).nome == "nutritwo"
+
+    store.remove(1)
+    assert store.get_by_id(1) is None
+
+
+def test_fuzzy_scores_em_lote():
+    """
+    O re-rank em lote (rapidfuzz cdist) devolve os mesmos scores do fuzzywuzzy
+    (a menos do arredondamento) para nome, contexto e tag.
+    """
+    store = NormalizedFieldStore()
+    empresas = [
+        MockEmpresa(1, "AgroSense BR", "Plataforma de IA para otimização de logística agrícola", "Agrotech", "IA", tag="agro"),
+        MockEmpresa(2, "NutriOne", "Sou um nutricionista focado em desporto.", tag=None),
+    ]
+    store.bulk_load(empresas)
+    query = "Plataforma agro de IA"
+
+    nome, contexto, tag = store.fuzzy_scores(query, [2, 1, 404])
+
+    q = unidecode(query).lower()
+    for i, e in enumerate(empresas[::-1]):
+        contexto_raw = f"{e.solucao} {e.setor_principal} {e.setor_secundario}{e.tag}"
+        assert nome[i] == pytest.approx(fuzz.token_set_ratio(unidecode(e.nome_da_empresa).lower(), q), abs=0.5)
+        assert contexto[i] == pytest.approx(fuzz.token_set_ratio(unidecode(contexto_raw).lower(), q), abs=0.5)
+        assert tag[i] == pytest.approx(fuzz.token_set_ratio(unidecode(f"{e.tag}").lower(), q), abs=0.5)
+
+    # Id desconhecido pontua 0
+    assert (nome[2], contexto[2], tag[2]) == (0, 0, 0)
@@ -0,0 +1,107 @@
+import time
+from ..app.search_cache import LRUTTLCache, SearchCache
+from ..app import crud, schemas, search_engine
+from ..app.normalized_fields import normalized_store
+from ..app.search_cache import search_cache
+
+
+def make_empresa(id, nome="NutriOne", fase="Seed"):
+    return schemas.Empresa(
+        id=id, nome_da_empresa=nome, endereco="A", cnpj="44.444.444/0001-44", ano_de_fundacao=2024,
+        setor_principal="Saúde", setor_secundario="Nutrição", fase_da_startup=fase, colaboradores="1-10",
+        publico_alvo="B2C", modelo_de_negocio="SaaS", recebeu_investimento="Não", negocios_no_exterior="Não",
+        faturamento="R$ 0", patente="Não", ja_pivotou="Não", comunidades="MTI",
+        solucao="Plataforma de software para nutricionistas",
+    )
+
+
+def test_lru_evicta_o_menos_usado_e_expira_por_ttl():
+    cache = LRUTTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)  # "b" é o menos usado
+
+    assert cache.get("b") is None
+    assert cache.stats()["evictions"] == 1
+
+    curto = LRUTTLCache(maxsize=2, ttl=0.01)
+    curto.set("a", 1)
+    time.sleep(0.02)
+    assert curto.get("a") is None
+    assert curto.stats()["expirations"] == 1
+
+
+def test_chave_normaliza_query_e_hidrata_por_id():
+    cache = SearchCache(maxsize=10, company_maxsize=1, ttl=60)
+    key = cache.make_key("tfidf", "Saúde!", None, 5)
+    assert key == cache.make_key("tfidf", "  saude ", None, 5)
+
+    cache.set(key, [make_empresa(1), make_empresa(2)])
+    # O cache por id só guarda 1 empresa: a outra vem do loader
+    carregados = []
+    def loader(ids):
+        carregados.extend(ids)
+        return [make_empresa(i) for i in ids]
+
+    assert [e.id for e in cache.get(key, loader=loader)] == [1, 2]
+    assert carregados == [1]
+    assert cache.stats()["resultados"]["hits"] == 1
+
+
+def test_crud_invalida_o_cache(monkeypatch):
+    """
+    Mudança em campo de busca limpa os resultados; mudança de telefone não.
+    """
+    monkeypatch.setattr(search_engine, "search_engine_instance", None)
+    monkeypatch.setattr(normalized_store, "refresh", lambda company: None)
+    monkeypatch.setattr(search_engine, "SearchEngine", lambda *args, **kwargs: None)
+
+    class FakeSession:
+        def commit(self):
+            pass
+        def refresh(self, obj):
+            pass
+
+    db = FakeSession()
+    empresa = make_empresa(7)
+    key = search_cache.make_key("tfidf", "nutricionistas", None, 5)
+
+    search_cache.set(key, [empresa])
+    crud.update_empresa_telefone_contato(db, empresa, "(81) 99999-9999")
+    assert search_cache.results.get(key) == (7,)
+
+    crud.update_empresa(db, empresa, schemas.EmpresaUpdate(fase_da_startup="Operação"))
+    assert search_cache.results.get(key) is None
+
+
+def test_busca_anterior_a_escrita_nao_grava_resultado_velho():
+    cache = SearchCache(maxsize=10, company_maxsize=10, ttl=60)
+    key = cache.make_key("tfidf", "nutricionistas", None, 5)
+
+    # A busca lê a geração, uma escrita invalida no meio e a busca termina depois
+    generation = cache.generation
+    cache.invalidate(1)
+    resultado = cache.set(key, [make_empresa(1)], generation=generation)
+
+    assert [e.id for e in resultado] == [1]
+    assert cache.results.get(key) is None
+    assert cache.companies.get(1) is None
+
+    cache.set(key, [make_empresa(1)], generation=cache.generation)
+    assert cache.results.get(key) == (1,)
+
+
+def test_hidratacao_durante_invalidacao_nao_volta_para_o_cache():
+    cache = SearchCache(maxsize=10, company_maxsize=10, ttl=60)
+    key = cache.make_key("tfidf", "nutricionistas", None, 5)
+    cache.set(key, [make_empresa(1)])
+    cache.companies.pop(1)
+
+    # A escrita invalida a empresa enquanto o loader lê a versão antiga do banco
+    def loader(ids):
+        cache.invalidate(1, search_relevant=False)
+        return [make_empresa(i) for i in ids]
+
+    assert [e.id for e in cache.get(key, loader=loader)] == [1]
+    assert cache.companies.get(1) is None
@@ -0,0 +1,190 @@
+import pytest
+from ..app.search_engine import SearchEngine
+from ..app import search_engine as se_tfidf
+from ..app import crud, schemas
+
+
+# --- MOCK CLASS ---
+# Definida localmente para não depender do models.py e evitar erro de 'id'
+class MockEmpresa:
+    def __init__(self, id, nome_da_empresa, solucao, setor_principal, setor_secundario, fase_da_startup="Operação", tag="Placeholder", **kwargs):
+        self.id = id
+        self.nome_da_empresa = nome_da_empresa
+        self.solucao = solucao
+        self.setor_principal = setor_principal
+        self.setor_secundario = setor_secundario
+        self.fase_da_startup = fase_da_startup
+        self.tag = tag
+
+
+def build_engine():
+    engine = SearchEngine([
+        MockEmpresa(1, "AgroSense BR", "Plataforma de IA para otimização de logística agrícola", "Agrotech", "Inteligência Artificial"),
+        MockEmpresa(2, "CyberGuard Pro", "Software de segurança proativa que utiliza machine learning", "Segurança da Informação", "SaaS"),
+        MockEmpresa(3, "ProtoMesh 3D", "Serviço de impressão 3D industrial e prototipagem rápida", "Manufatura Aditiva", "Engenharia"),
+    ])
+    # Com 3 documentos qualquer escrita passaria do limiar: a compactação
+    # em background é desligada e testada de forma síncrona
+    engine.COMPACTION_RATIO = 2.0
+    return engine
+
+
+def test_add_company_aparece_na_busca():
+    engine = build_engine()
+    engine.add_company(MockEmpresa(4, "AgroDrone", "Drones para monitoramento de logística agrícola", "Agrotech", "Drones"))
+
+    ids = [c.id for c in engine.optimized_search("logística agrícola")]
+    assert 4 in ids
+    assert 1 in ids
+
+
+def test_update_company_substitui_linha():
+    engine = build_engine()
+    engine.update_company(MockEmpresa(3, "GuardMesh", "Software de segurança com machine learning", "Segurança da Informação", "SaaS"))
+
+    # A linha antiga vira tombstone e não aparece mais
+    assert 3 not in [c.id for c in engine.optimized_search("impressão industrial e prototipagem")]
+    assert 3 in [c.id for c in engine.optimized_search("segurança machine learning")]
+    assert engine.tombstones.sum() == 1
+
+
+def test_update_company_sem_mudar_texto_troca_objeto():
+    engine = build_engine()
+    engine.update_company(MockEmpresa(2, "CyberGuard Pro", "Software de segurança proativa que utiliza machine learning", "Segurança da Informação", "SaaS", fase_da_startup="Seed"), text_changed=False)
+
+    # Nenhuma linha nova: só o objeto guardado (usado no filtro de fase) foi trocado
+    assert engine.company_vectors.shape[0] == 3
+    assert [c.id for c in engine.optimized_search("machine learning", fase="Seed")] == [2]
+
+
+def test_remove_company_e_compactacao():
+    engine = build_engine()
+    engine.remove_company(1)
+    assert 1 not in [c.id for c in engine.optimized_search("logística agrícola")]
+
+    # Executa a compactação de forma síncrona (sem depender da thread)
+    assert engine.compact()
+    assert engine.company_vectors.shape[0] == 2
+    assert not engine.tombstones.any()
+    assert set(engine.row_by_id) == {2, 3}
+    assert [c.id for c in engine.optimized_search("impressão 3D industrial")] == [3]
+
+
+def test_indice_vazio_recebe_primeiro_documento():
+    engine = SearchEngine([])
+    engine.add_company(MockEmpresa(10, "FinPay", "Pagamentos instantâneos para pequenos negócios", "Fintech", "Pagamentos"))
+
+    assert [c.id for c in engine.optimized_search("pagamentos")] == [10]
+
+
+def test_crud_alimenta_indice(monkeypatch):
+    """
+    create/update/delete do crud atualizam o search_engine_instance global.
+    """
+    engine = build_engine()
+    monkeypatch.setattr(se_tfidf, "search_engine_instance", engine)
+
+    class FakeSession:
+        def add(self, obj):
+            obj.id = 99
+        def commit(self):
+            pass
+        def refresh(self, obj):
+            pass
+        def delete(self, obj):
+            pass
+
+    db = FakeSession()
+    empresa = crud.create_empresa(db, schemas.EmpresaCreate(
+        nome_da_empresa="NutriOne", endereco="A", cnpj="44.444.444/0001-44", ano_de_fundacao=2024,
+        setor_principal="Saúde", setor_secundario="Nutrição", fase_da_startup="Seed", colaboradores="1-10",
+        publico_alvo="B2C", modelo_de_negocio="SaaS", recebeu_investimento="Não", negocios_no_exterior="Não",
+        faturamento="R$ 0", patente="Não", ja_pivotou="Não", comunidades="MTI",
+        solucao="Plataforma de software para nutricionistas",
+    ))
+    assert 99 in [c.id for c in engine.optimized_search("nutricionistas")]
+
+    crud.update_empresa(db, empresa, schemas.EmpresaUpdate(solucao="Impressão 3D de próteses"))
+    assert 99 not in [c.id for c in engine.optimized_search("nutricionistas")]
+
+    crud.delete_empresa(db, empresa)
+    assert 99 not in engine.row_by_id
+
+
+def test_listas_invertidas_iguais_ao_cosseno():
+    """
+    Os scores das listas invertidas (CSC + delta) batem com o cosseno da matriz inteira.
+    """
+    from sklearn.metrics.pairwise import cosine_similarity
+
+    engine = build_engine()
+    engine.add_company(MockEmpresa(4, "AgroDrone", "Drones para monitoramento de logística agrícola", "Agrotech", "Drones"))
+
+    query_vector = engine.tfidf_vectorizer.transform(["logistica agricola com drones"])
+    candidates, scores = engine._candidate_scores(query_vector, engine.company_vectors, engine.postings, engine.delta_postings)
+    expected = cosine_similarity(query_vector, engine.company_vectors).ravel()
+
+    assert set(candidates) == set(expected.nonzero()[0])
+    assert scores == pytest.approx(expected[candidates])
+
+
+def test_filtro_de_fase_por_codigo():
+    engine = build_engine()
+    engine.add_company(MockEmpresa(4, "AgroDrone", "Drones para monitoramento de logística agrícola", "Agrotech", "Drones", fase_da_startup="Seed"))
+
+    assert [c.id for c in engine.optimized_search("logística agrícola", fase="Seed")] == [4]
+    # Fase que não existe no índice: nenhum código, nenhum resultado
+    assert engine.optimized_search("logística agrícola", fase="Série Z") == []
+
+
+def test_indice_nao_guarda_as_empresas_e_hidrata_o_top_k():
+    import gc
+    import weakref
+
+    empresas = [
+        MockEmpresa(1, "AgroSense BR", "Plataforma de IA para otimização de logística agrícola", "Agrotech", "Inteligência Artificial"),
+        MockEmpresa(2, "CyberGuard Pro", "Software de segurança proativa que utiliza machine learning", "Segurança da Informação", "SaaS", fase_da_startup="Seed"),
+    ]
+    refs = [weakref.ref(e) for e in empresas]
+    engine = SearchEngine(empresas)
+    del empresas
+    gc.collect()
+    # Só colunas (id, fase, hash) e campos normalizados: nenhuma empresa fica presa ao índice
+    assert all(ref() is None for ref in refs)
+
+    # Sem loader: registros leves com id e fase
+    resultado = engine.optimized_search("machine learning")
+    assert [(c.id, c.fase_da_startup) for c in resultado] == [(2, "Seed")]
+
+    # Com loader: uma única chamada, só com os ids do top-k final
+    chamadas = []
+    def loader(ids):
+        chamadas.append(ids)
+        return [f"empresa {i}" for i in ids]
+    assert engine.optimized_search("logística agrícola", loader=loader) == ["empresa 1"]
+    assert chamadas == [[1]]
+
+
+def test_search_many_igual_a_busca_individual():
+    engine = build_engine()
+    # Linha nova (delta) e linha removida (tombstone) também entram no produto em lote
+    engine.add_company(MockEmpresa(4, "AgroDrone", "Drones para monitoramento de logística agrícola", "Agrotech", "Drones", fase_da_startup="Seed"))
+    engine.remove_company(3)
+    engine.BATCH_CHUNK_SIZE = 2
+
+    queries = ["logística agrícola", "segurança machine learning", "impressão 3D", "xyz", "logística agrícola"]
+    results = engine.search_many(queries)
+
+    assert list(results) == ["logística agrícola", "segurança machine learning", "impressão 3D", "xyz"]
+    for query in results:
+        assert results[query] == engine.optimized_search(query)
+    assert [c.id for c in engine.search_many(["logística agrícola"], fase="Seed")["logística agrícola"]] == [4]
+
+    # Com loader: uma única hidratação para todas as queries
+    calls = []
+    def loader(ids):
+        calls.append(ids)
+        return [MockEmpresa(i, f"Empresa {i}", "", "", "") for i in ids]
+    hydrated = engine.search_many(queries, loader=loader)
+    assert len(calls) == 1
+    assert [c.id for c in hydrated["logística agrícola"]] == [c.id for c in results["logística agrícola"]]
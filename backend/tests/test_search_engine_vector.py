@@ -0,0 +1,177 @@
+from ..app.search_engine_vector import SearchEngineVector
+from ..app.vector_planner import PhaseStats, SurvivalStats, VectorPlan
+
+
+class FakeDialect:
+    def __init__(self, name):
+        self.name = name
+
+
+class FakeBind:
+    def __init__(self, name):
+        self.dialect = FakeDialect(name)
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def all(self):
+        return self.rows
+
+
+class FakeSession:
+    """Guarda os comandos SQL executados (sem banco)."""
+    def __init__(self, dialect="postgresql", rows_for_ef=None):
+        self.bind = FakeBind(dialect)
+        self.executed = []
+        # ef_search atual -> nº de linhas que sobrevivem ao filtro de fase
+        self.rows_for_ef = rows_for_ef or (lambda ef, exact: [])
+        self.ef_search = None
+
+    def get_bind(self):
+        return self.bind
+
+    def execute(self, statement):
+        sql = str(statement)
+        self.executed.append(sql)
+        if sql.startswith("SET LOCAL hnsw.ef_search"):
+            self.ef_search = int(sql.rsplit(" ", 1)[1])
+        exact = "+ :param_1" in sql
+        return FakeResult(self.rows_for_ef(self.ef_search, exact))
+
+
+def test_parametros_ann_com_set_local_no_postgres():
+    engine = SearchEngineVector()
+    db = FakeSession()
+    engine._set_ann_params(db, candidate_limit=15, ef_search=100, probes=10)
+
+    assert db.executed == ["SET LOCAL hnsw.ef_search = 100", "SET LOCAL ivfflat.probes = 10"]
+
+
+def test_ef_search_nunca_menor_que_o_limit_da_consulta():
+    engine = SearchEngineVector()
+    db = FakeSession()
+    engine._set_ann_params(db, candidate_limit=60, ef_search=20)
+
+    assert db.executed[0] == "SET LOCAL hnsw.ef_search = 60"
+
+
+def test_sem_parametros_ann_fora_do_postgres():
+    db = FakeSession("sqlite")
+    SearchEngineVector()._set_ann_params(db, candidate_limit=15, ef_search=100, probes=10)
+
+    assert db.executed == []
+
+
+def stats(rows_by_phase, partial=()):
+    phase_stats = PhaseStats()
+    phase_stats.rows_by_phase = rows_by_phase
+    phase_stats.total_rows = sum(rows_by_phase.values())
+    phase_stats.partial_index_phases = frozenset(partial)
+    return phase_stats
+
+
+def test_planner_escolhe_estrategia_pela_seletividade():
+    phase_stats = stats({"Seed": 300, "Operação": 60000, "Tração": 40000}, partial={"Tração"})
+
+    assert phase_stats.plan(None, 15, 40).strategy == "ann"
+    # Fase pequena (ou desconhecida): distância exata só nas linhas da fase
+    assert phase_stats.plan("Seed", 15, 40).strategy == "exato"
+    assert phase_stats.plan("Ideação", 15, 40).strategy == "exato"
+    assert phase_stats.plan("Tração", 15, 40) == VectorPlan("indice_parcial", ef_search=40, phase_rows=40000)
+    # Operação = 60% das linhas: ef_search >= 15 / 0.6 * 1.5
+    plan = phase_stats.plan("Operação", 15, 40)
+    assert plan.strategy == "ann_overfetch"
+    assert plan.ef_search == 40
+    plan = stats({"Operação": 6000, "Outras": 594000}).plan("Operação", 15, 40)
+    assert plan.strategy == "ann_overfetch"
+    assert plan.ef_search == 1000
+
+
+def test_overfetch_dobra_ef_search_ate_achar_candidatos():
+    # Só ef_search >= 160 devolve 15 linhas da fase
+    db = FakeSession(rows_for_ef=lambda ef, exact: [object()] * (15 if ef >= 160 else 4))
+    engine = SearchEngineVector(phase_stats=stats({}))
+    candidates = engine._fetch_candidates(db, [0.0] * 3, "Operação", 15, VectorPlan("ann_overfetch", ef_search=40, phase_rows=60000), None)
+
+    assert len(candidates) == 15
+    assert [sql for sql in db.executed if sql.startswith("SET LOCAL hnsw")] == [
+        "SET LOCAL hnsw.ef_search = 40", "SET LOCAL hnsw.ef_search = 80", "SET LOCAL hnsw.ef_search = 160",
+    ]
+
+
+def test_overfetch_termina_na_busca_exata_no_teto():
+    db = FakeSession(rows_for_ef=lambda ef, exact: [object()] * (15 if exact else 2))
+    engine = SearchEngineVector(phase_stats=stats({}))
+    candidates = engine._fetch_candidates(db, [0.0] * 3, "Operação", 15, VectorPlan("ann_overfetch", ef_search=1000, phase_rows=60000), None)
+
+    assert len(candidates) == 15
+    assert len([sql for sql in db.executed if sql.startswith("SELECT")]) == 2
+
+
+def test_rerank_sql_pontua_no_banco_e_devolve_so_o_limit():
+    empresa = object()
+    engine = SearchEngineVector(rerank_mode="sql")
+    db = FakeSession(rows_for_ef=lambda ef, exact: [(empresa, 0.9, 80.0, 40.0, 0.0, 316.0)])
+
+    assert engine.optimized_search_vector(db, "Nutrição App", limit=5) == [empresa]
+
+    sql = db.executed[-1]
+    # Fuzzy com pg_trgm nas mesmas expressões dos índices GIN de trigramas
+    assert "word_similarity" in sql
+    assert "<% startups_normalizar(startups.nome_da_empresa)" in sql
+    assert "ORDER BY scored.score_final DESC" in sql
+    # ANN com o pool maior do modo sql
+    assert db.ef_search == 5 * SearchEngineVector.SQL_CANDIDATE_OVERFETCH
+
+
+def test_rerank_sql_so_no_postgres():
+    engine = SearchEngineVector(rerank_mode="sql")
+    db = FakeSession("sqlite")
+
+    assert engine.optimized_search_vector(db, "Nutrição App", limit=5) == []
+    assert all("word_similarity" not in sql for sql in db.executed)
+
+
+class MockEmpresa:
+    def __init__(self, id, nome):
+        self.id = id
+        self.nome_da_empresa = nome
+        self.solucao = "sem relação"
+        self.setor_principal = "Outro"
+        self.setor_secundario = ""
+        self.tag = ""
+        self.fase_da_startup = "Operação"
+
+
+def test_survival_stats_ajusta_a_primeira_banda():
+    survival = SurvivalStats(default_rate=1 / 3)
+    assert survival.initial_fetch("agro", 5) == 15
+
+    for _ in range(20):
+        survival.record("plataforma de crédito rural", fetched=50, survived=2)
+    # Queries longas aprovam ~4%: a primeira banda já vem maior (com o piso de 5%)
+    assert survival.initial_fetch("software de gestão escolar", 5) == 100
+    # Outros tamanhos de query não são afetados
+    assert survival.initial_fetch("agro", 5) == 15
+
+
+def test_bandas_de_distancia_ate_achar_candidatos_aprovados():
+    # Banda 1 inteira reprovada no score final; banda 2 traz os aprovados
+    far = [(MockEmpresa(i, f"Longe {i}"), 0.95) for i in range(15)]
+    near = [(MockEmpresa(100 + i, f"Perto {i}"), 0.2) for i in range(30)]
+    # O HNSW da segunda banda passa pelas 15 linhas já vistas + 30 novas (ef_search 45)
+    db = FakeSession(rows_for_ef=lambda ef, exact: near if ef >= 45 else far)
+    survival = SurvivalStats(default_rate=1 / 3)
+    engine = SearchEngineVector(survival_stats=survival)
+
+    results = engine.optimized_search_vector(db, "consulta sem nome", limit=5)
+
+    assert [empresa.id for empresa in results] == [100, 101, 102, 103, 104]
+    selects = [sql for sql in db.executed if sql.startswith("SELECT")]
+    assert len(selects) == 2
+    # Banda seguinte: keyset na distância, sem os empates já vistos
+    assert ">=" in selects[1] and "NOT IN" in selects[1]
+    assert db.ef_search == 45
+    assert survival.rate("consulta sem nome") == 30 / 45
@@ -0,0 +1,77 @@
+import numpy as np
+
+from ..app import embedding_service
+from ..app.search_engine_vector_memory import SearchEngineVectorMemory
+
+
+class MockEmpresa:
+    def __init__(self, id, nome, solucao, setor, fase="Operação", tag=""):
+        self.id = id
+        self.nome_da_empresa = nome
+        self.solucao = solucao
+        self.setor_principal = setor
+        self.setor_secundario = ""
+        self.fase_da_startup = fase
+        self.tag = tag
+        self.embedding_vector = embedding_service.generate_embedding(self)
+
+
+def _empresas():
+    return [
+        MockEmpresa(1, "NutriOne", "plataforma de nutrição com nutricionistas online", "Saúde"),
+        MockEmpresa(2, "AgroData", "sensores para agricultura de precisão", "Agro", fase="Tração"),
+        MockEmpresa(3, "FinCheck", "análise de crédito para pequenas empresas", "Finanças"),
+        MockEmpresa(4, "NutriKids", "cardápios de nutrição infantil para escolas", "Saúde", fase="Ideação"),
+    ]
+
+
+def test_matriz_normalizada_e_cosseno_igual_ao_calculo_direto():
+    empresas = _empresas()
+    engine = SearchEngineVectorMemory(empresas)
+
+    norms = np.sqrt(engine.matrix.multiply(engine.matrix).sum(axis=1)).A1
+    assert np.allclose(norms, 1.0, atol=1e-5)
+
+    query = "plataforma de nutrição"
+    q = embedding_service.vectorizer.transform([query]).toarray().ravel()
+    dense = np.vstack([np.asarray(e.embedding_vector, dtype=np.float64) for e in empresas])
+    expected = dense @ q / (np.linalg.norm(dense, axis=1) * np.linalg.norm(q))
+    got = engine.matrix @ (q / np.linalg.norm(q)).astype(np.float32)
+    assert np.allclose(got, expected, atol=1e-5)
+
+    assert engine.search_ids(query, limit=5)[0] == 1
+
+
+def test_filtro_de_fase():
+    engine = SearchEngineVectorMemory(_empresas())
+
+    assert engine.search_ids("nutrição", fase="Ideação", limit=5) == [4]
+    assert engine.search_ids("nutrição", fase="Fase Inexistente", limit=5) == []
+
+
+def test_upsert_e_remove_mantem_a_matriz_em_dia():
+    engine = SearchEngineVectorMemory(_empresas())
+
+    engine.upsert(MockEmpresa(5, "DroneAgro", "drones para pulverização agrícola", "Agro"))
+    assert engine.search_ids("drones pulverização", limit=5)[0] == 5
+
+    # Atualização: a linha antiga vira tombstone e a nova entra no fim
+    engine.upsert(MockEmpresa(5, "DroneAgro", "drones para pulverização agrícola", "Agro", fase="Tração"))
+    assert engine.search_ids("drones pulverização", fase="Operação", limit=5) == []
+    assert engine.search_ids("drones pulverização", fase="Tração", limit=5)[0] == 5
+
+    engine.remove(5)
+    engine.remove(1)
+    assert 5 not in engine.search_ids("drones pulverização", limit=5)
+    assert 1 not in engine.search_ids("plataforma de nutrição", limit=5)
+    # Compactação: as linhas mortas saem da matriz
+    assert not engine.tombstones.any()
+    assert sorted(engine.ids.tolist()) == [2, 3, 4]
+
+
+def test_motor_vazio_recebe_a_primeira_empresa():
+    engine = SearchEngineVectorMemory([])
+    assert engine.search_ids("nutrição", limit=5) == []
+
+    engine.upsert(_empresas()[0])
+    assert engine.search_ids("plataforma de nutrição", limit=5) == [1]
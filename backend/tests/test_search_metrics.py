@@ -0,0 +1,62 @@
+from ..app.search_engine import SearchEngine
+from ..app.search_metrics import SearchTrace, SearchMetrics
+
+
+# --- MOCK CLASS ---
+class MockEmpresa:
+    def __init__(self, id, nome_da_empresa, solucao, setor_principal, setor_secundario, fase_da_startup="Operação", tag="Placeholder", **kwargs):
+        self.id = id
+        self.nome_da_empresa = nome_da_empresa
+        self.solucao = solucao
+        self.setor_principal = setor_principal
+        self.setor_secundario = setor_secundario
+        self.fase_da_startup = fase_da_startup
+        self.tag = tag
+
+
+ENGINE = SearchEngine([
+    MockEmpresa(1, "AgroSense BR", "Plataforma de IA para otimização de logística agrícola", "Agrotech", "Inteligência Artificial", fase_da_startup="Scale-up"),
+    MockEmpresa(2, "CyberGuard Pro", "Software de segurança proativa que utiliza machine learning", "Segurança da Informação", "SaaS", fase_da_startup="Seed"),
+    MockEmpresa(3, "ProtoMesh 3D", "Serviço de impressão 3D industrial e prototipagem rápida", "Manufatura Aditiva", "Engenharia"),
+])
+
+
+def test_trace_registra_etapas_contadores_e_candidatos():
+    trace = SearchTrace("tfidf", explain=True)
+    results = ENGINE.optimized_search("plataforma de ia agrícola", trace=trace)
+
+    assert [c.id for c in results] == [1]
+    assert {"vetorizacao", "candidatos", "filtros", "fuzzy", "ranking"} <= set(trace.stages)
+    assert trace.counts["resultados"] == 1
+    assert trace.counts["candidatos"] >= 1
+    # Componentes do score por candidato, ordenados pelo score final
+    assert trace.candidates[0]["empresa_id"] == 1
+    assert trace.candidates[0]["aprovado"] is True
+    assert set(trace.candidates[0]) == {"empresa_id", "tfidf", "fuzzy_nome", "fuzzy_contexto", "score_final", "aprovado"}
+    assert "vetorizacao;dur=" in trace.server_timing()
+
+
+def test_trace_sem_explain_nao_guarda_candidatos_e_conta_corte_de_fase():
+    trace = SearchTrace("tfidf")
+    assert ENGINE.optimized_search("plataforma de ia agrícola", fase="Seed", trace=trace) == []
+
+    assert trace.candidates == []
+    assert trace.counts["corte_fase"] >= 1
+
+
+def test_metrics_agrega_por_motor():
+    metrics = SearchMetrics()
+    for query in ("logística agrícola", "machine learning"):
+        trace = SearchTrace("hybrid")
+        child = trace.child("tfidf")
+        with trace.stage("fusao"):
+            ENGINE.optimized_search(query, trace=child)
+        metrics.record(trace)
+
+    snapshot = metrics.snapshot()
+    assert snapshot["hybrid"]["requests"] == 2
+    assert snapshot["hybrid"]["stages"]["fusao"]["count"] == 2
+    assert snapshot["tfidf"]["requests"] == 2
+    assert snapshot["tfidf"]["counters"]["resultados"] == 2
+    stage = snapshot["tfidf"]["stages"]["vetorizacao"]
+    assert stage["max_ms"] >= stage["avg_ms"] > 0
@@ -123,7 +123,7 @@ def get_ground_truth_ids_direct(all_companies: List[models_app.Empresa], case: D
 @pytest.mark.parametrize("case", SEARCH_TEST_CASES, ids=[c["description"] for c in SEARCH_TEST_CASES])
 def test_optimized_search_logic_metrics(case: Dict[str, Any]):
     
-    expected_ids = get_ground_truth_ids_direct(TEST_ENGINE.all_companies_list, case)
+    expected_ids = get_ground_truth_ids_direct(MOCK_COMPANIES, case)
     
     if not expected_ids:
         pytest.skip(f"Ground Truth VAZIO para o caso: {case['description']}. Pulando teste.")
@@ -0,0 +1,64 @@
+from ..app.search_engine import SearchEngine
+from ..app.spelling import SymmetricDeleteIndex
+
+
+# --- MOCK CLASS ---
+class MockEmpresa:
+    def __init__(self, id, nome_da_empresa, solucao, setor_principal, setor_secundario, fase_da_startup="Operação", tag="Placeholder", **kwargs):
+        self.id = id
+        self.nome_da_empresa = nome_da_empresa
+        self.solucao = solucao
+        self.setor_principal = setor_principal
+        self.setor_secundario = setor_secundario
+        self.fase_da_startup = fase_da_startup
+        self.tag = tag
+
+
+ENGINE = SearchEngine([
+    MockEmpresa(1, "PayFlow", "Meios de pagamento para pequenos negócios", "Fintech", "Pagamentos"),
+    MockEmpresa(2, "AgroSense BR", "Monitoramento de agricultura de precisão com sensores", "Agrotech", "Agricultura"),
+    MockEmpresa(3, "CyberGuard Pro", "Software de segurança proativa que utiliza machine learning", "Segurança da Informação", "SaaS"),
+])
+
+
+def test_symmetric_delete_acha_termo_mais_proximo():
+    index = SymmetricDeleteIndex({"fintech": 3, "agricultur": 2, "agricol": 5})
+
+    assert index.lookup("fintec") == "fintech"
+    assert index.lookup("agricultr") == "agricultur"
+    assert index.lookup("fintech") == "fintech"
+    # Fora da distância máxima: nenhuma sugestão
+    assert index.lookup("logistic") is None
+    assert index.lookup("fintc", max_distance=1) is None
+
+
+def test_query_com_erro_e_corrigida_e_encontra_resultados():
+    assert ENGINE.optimized_search("fintec") == []
+
+    corrected, corrections = ENGINE.correct_query("fintec")
+    assert corrections == {"fintec": "fintech"}
+    assert [c.id for c in ENGINE.optimized_search(corrected)] == [1]
+
+    corrected, corrections = ENGINE.correct_query("Agricultra de precisão")
+    assert corrections == {"agricultra": "agricultura"}
+    assert corrected == "agricultura de precisao"
+    assert 2 in [c.id for c in ENGINE.optimized_search(corrected)]
+
+
+def test_query_sem_erro_nao_muda():
+    assert ENGINE.correct_query("Segurança com Machine Learning") == ("Segurança com Machine Learning", {})
+
+
+def test_termos_novos_entram_no_corretor():
+    engine = SearchEngine([
+        MockEmpresa(1, "PayFlow", "Meios de pagamento para pequenos negócios", "Fintech", "Pagamentos"),
+        MockEmpresa(2, "AgroSense BR", "Monitoramento de agricultura de precisão com sensores", "Agrotech", "Agricultura"),
+    ])
+    assert engine.correct_query("fintec")[1] == {"fintec": "fintech"}
+
+    # O vocabulário cresce além das colunas da matriz CSC (linhas delta)
+    engine.COMPACTION_RATIO = 2.0
+    engine.add_company(MockEmpresa(3, "SkyDrone", "Pulverização com drones", "Agrotech", "Drones"))
+    corrected, corrections = engine.correct_query("pulverizacao com dronnes")
+    assert corrections == {"dronnes": "drones"}
+    assert [c.id for c in engine.optimized_search(corrected)] == [3]
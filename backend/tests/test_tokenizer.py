@@ -0,0 +1,42 @@
+import pytest
+from unidecode import unidecode
+from nltk.tokenize import wordpunct_tokenize
+
+from ..app import tokenizer, embedding_service, search_engine
+
+
+def tokenizer_original(text):
+    # Lógica anterior (wordpunct_tokenize + stem a cada token), usada como referência
+    tokens = wordpunct_tokenize(unidecode(text).lower())
+    final_tokens = []
+    for t in tokens:
+        if t in tokenizer.stop_words_pt or len(t) <= 1:
+            continue
+        if t.isalpha():
+            final_tokens.append(tokenizer.stemmer.stem(t))
+        elif t.isalnum():
+            final_tokens.append(t)
+    return final_tokens
+
+
+TEXTOS = [
+    "Plataforma de IA para otimização de logística agrícola",
+    "ProtoMesh 3D: impressão 3d_industrial, xpto1 e A1!",
+    "Empresa de Tecnologia LTDA - soluções em São Paulo",
+    "quero_busco ... __ a b cd",
+    "",
+]
+
+
+@pytest.mark.parametrize("texto", TEXTOS)
+def test_tokens_iguais_ao_tokenizer_original(texto):
+    assert tokenizer.custom_tokenizer(texto) == tokenizer_original(texto)
+
+
+def test_dicionario_de_radicais_e_vetorizadores_compartilhados():
+    tokenizer.build_stem_dictionary(["Logística agrícola inteligente"])
+    assert tokenizer.stem("logistica") == tokenizer.stemmer.stem("logistica")
+
+    # TF-IDF e HashingVectorizer usam a mesma função
+    assert embedding_service.vectorizer.tokenizer is tokenizer.custom_tokenizer
+    assert search_engine.custom_tokenizer is tokenizer.custom_tokenizer
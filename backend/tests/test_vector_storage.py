@@ -0,0 +1,35 @@
+import numpy as np
+from pgvector import SparseVector
+from pgvector.vector import Vector as PgVector
+
+from ..app import embedding_service, vector_storage
+
+
+def test_embedding_no_formato_configurado(monkeypatch):
+    # Padrão: vector denso (array float32, sem lista de floats)
+    monkeypatch.setattr(vector_storage, "EMBEDDING_STORAGE", "vector")
+    dense = embedding_service.generate_query_embedding("logística agrícola")
+    assert isinstance(dense, np.ndarray) and dense.dtype == np.float32 and dense.shape == (1024,)
+
+    monkeypatch.setattr(vector_storage, "EMBEDDING_STORAGE", "sparsevec")
+    sparse = embedding_service.generate_query_embedding("logística agrícola")
+    assert isinstance(sparse, SparseVector)
+    assert sparse.dimensions() == 1024
+    # Só os valores diferentes de zero, nas mesmas posições do vetor denso
+    assert sparse.indices() == [i for i, value in enumerate(dense) if value]
+    assert vector_storage.column_sql() == "sparsevec(1024)"
+
+
+
+def test_parametro_vetorial_em_texto_do_pgvector():
+    values = np.zeros(1024, dtype=np.float32)
+    values[[3, 900]] = [0.5, 0.25]
+
+    process = vector_storage.EmbeddingVector(1024).bind_processor(None)
+    text = process(values)
+    # Mesmo valor que o conversor do pgvector, sem passar por uma lista de floats
+    assert np.array_equal(PgVector._from_db(text), values)
+    assert process([0.0] * 1024) == PgVector._to_db([0.0] * 1024, 1024)
+
+    sparse = vector_storage.EmbeddingSparseVec(1024).bind_processor(None)(values)
+    assert sparse == "{4:0.5,901:0.25}/1024"
@@ -9,6 +9,8 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(
 
 from backend.app.models import Empresa
 from backend.app import embedding_service
+from backend.app.vector_storage import column_sql
+from backend.app.tokenizer import build_stem_dictionary
 
 def setup_and_import(csv_file_path, dbname, user, password, host, port, table_name):
     """
@@ -36,7 +38,7 @@ def setup_and_import(csv_file_path, dbname, user, password, host, port, table_na
             
             if not check_col:
                 print(f"Criando coluna 'embedding_vector' na tabela '{table_name}'...")
-                conn.execute(text(f"ALTER TABLE {table_name} ADD COLUMN embedding_vector vector(1024);"))
+                conn.execute(text(f"ALTER TABLE {table_name} ADD COLUMN embedding_vector {column_sql()};"))
             
             print(f"Limpando dados antigos da tabela '{table_name}'...")
             conn.execute(text(f"TRUNCATE TABLE {table_name} RESTART IDENTITY CASCADE;"))
@@ -76,6 +78,8 @@ def setup_and_import(csv_file_path, dbname, user, password, host, port, table_na
             
             if total_pendentes > 0:
                 print(f"Processando tokens para {total_pendentes} empresas...")
+                # Stemming feito uma vez por palavra distinta, não por ocorrência
+                build_stem_dictionary(embedding_service.embedding_text(e) for e in empresas_pendentes)
                 for i, empresa in enumerate(empresas_pendentes, 1):
                     # Gera a matriz de 1024 posições
                     vetor = embedding_service.generate_embedding(empresa)